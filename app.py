@@ -1,13 +1,14 @@
 import streamlit as st
 import os
-import tempfile
-import shutil
 from pathlib import Path
-import time
-import threading
-from utils.downloader import YouTubeDownloader
+from utils.downloader import YouTubeDownloader, preload_yt_dlp
 from utils.validators import validate_youtube_url
 from utils.file_manager import FileManager
+from utils.job_queue import get_job_scheduler, COMPLETED, FINISHED_STATES
+from utils.progress import format_bytes
+from utils.search_service import get_search_service, normalize_query
+from utils.thumbnail_cache import get_thumbnail_cache, thumbnail_url_for
+from utils.download_service import make_download_spec, submit_download, resume_unfinished_jobs
 
 
 # Initialize session state
@@ -82,24 +83,40 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def main():
+    # Pick up downloads interrupted by a crash or restart
+    resumed = resume_unfinished_jobs()
+    if resumed and not st.session_state.get('resumed_notice_shown'):
+        st.session_state['resumed_notice_shown'] = True
+        st.info(f"Resumed {len(resumed)} interrupted download(s) in the background.")
     # --- YouTube Search Section ---
     st.header("🔎 Search YouTube Video")
     if 'search_results' not in st.session_state:
         st.session_state['search_results'] = []
     if 'search_query' not in st.session_state:
         st.session_state['search_query'] = ''
+    if 'search_page' not in st.session_state:
+        st.session_state['search_page'] = 0
+
+    def run_search(search_query, page):
+        try:
+            results = get_search_service().get_page(search_query, page)
+            if page > 0 and not results:
+                st.info("No more results.")
+                return
+            st.session_state['search_results'] = results
+            st.session_state['search_query'] = search_query
+            st.session_state['search_page'] = page
+        except Exception as e:
+            st.error(f"Search failed: {e}")
+            st.session_state['search_results'] = []
 
     def on_search_entered():
         search_query = st.session_state['yt_search_input']
         if isinstance(search_query, str) and search_query.strip():
-            try:
-                from utils.downloader import search_youtube
-                results = search_youtube(search_query, max_results=5)
-                st.session_state['search_results'] = results
-                st.session_state['search_query'] = search_query
-            except Exception as e:
-                st.error(f"Search failed: {e}")
-                st.session_state['search_results'] = []
+            # Enter and the Search button can both fire for one query
+            if normalize_query(search_query) == normalize_query(st.session_state['search_query']) and st.session_state['search_results']:
+                return
+            run_search(search_query, 0)
 
     search_query = st.text_input(
         "Search for a video",
@@ -113,17 +130,17 @@ def main():
     # Show search results
     if st.session_state['search_results']:
         st.markdown("**Select a video below:**")
+        # Thumbnails are fetched once per video and served from the local cache
+        thumb_urls = [thumbnail_url_for(entry) for entry in st.session_state['search_results']]
+        thumb_paths = get_thumbnail_cache().get_many(
+            [(entry.get('id'), thumb_url) for entry, thumb_url in zip(st.session_state['search_results'], thumb_urls)], 100
+        )
         for i, entry in enumerate(st.session_state['search_results']):
             cols = st.columns([1, 4, 3])
             with cols[0]:
-                thumb_url = entry.get('thumbnail')
-                if not thumb_url and 'thumbnails' in entry and isinstance(entry['thumbnails'], list) and entry['thumbnails']:
-                    # Use the last thumbnail (usually the largest)
-                    thumb_url = entry['thumbnails'][-1].get('url') if isinstance(entry['thumbnails'][-1], dict) else entry['thumbnails'][-1]
-                if thumb_url and thumb_url.startswith("//"):
-                    thumb_url = "https:" + thumb_url
-                if thumb_url:
-                    st.image(thumb_url, width=100)
+                thumb = thumb_paths[i] or thumb_urls[i]
+                if thumb:
+                    st.image(thumb, width=100)
             with cols[1]:
                 st.markdown(f"**{entry.get('title', 'No Title')}**")
                 st.caption(entry.get('uploader', ''))
@@ -143,6 +160,17 @@ def main():
                             </svg>
                         </a>
                     """, unsafe_allow_html=True)
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.session_state['search_page'] > 0 and st.button("◀ Previous", key="search_prev_btn"):
+                run_search(st.session_state['search_query'], st.session_state['search_page'] - 1)
+                st.rerun()
+        with col_page:
+            st.caption(f"Page {st.session_state['search_page'] + 1}")
+        with col_next:
+            if st.button("Next ▶", key="search_next_btn"):
+                run_search(st.session_state['search_query'], st.session_state['search_page'] + 1)
+                st.rerun()
     # --- End YouTube Search Section ---
 
     # URL Input Section
@@ -178,6 +206,8 @@ def main():
     if 'save_location' not in st.session_state or st.session_state.get('save_location') is None:
         st.session_state['save_location'] = default_save_location
 
+    render_batch_section(download_type)
+
     # URL Validation and Video Info
     proceed_to_download = False
     if do_not_confirm and url:
@@ -194,6 +224,8 @@ def main():
                 downloader = YouTubeDownloader()
                 video_info = downloader.get_video_info(url)
                 if video_info:
+                    # The format ladder replaces the raw format list in session memory
+                    video_info.pop('formats', None)
                     st.session_state['video_info'] = video_info
                 else:
                     st.error("❌ Failed to fetch video information. Please check the URL.")
@@ -210,7 +242,8 @@ def main():
         col1, col2 = st.columns([1, 2])
         with col1:
             if video_info.get('thumbnail'):
-                st.image(video_info['thumbnail'], width=200)
+                thumb_path = get_thumbnail_cache().get(video_info.get('id'), video_info['thumbnail'], 200)
+                st.image(thumb_path or video_info['thumbnail'], width=200)
         with col2:
             st.markdown(f"**Title:** {video_info.get('title', 'N/A')}")
             st.markdown(f"**Duration:** {video_info.get('duration_string', 'N/A')}")
@@ -227,42 +260,13 @@ def main():
         # Video Quality Selection
         selected_video_format = None
         convert_to_whatsapp = False
+        add_branding = False
+        encoder_profile = 'balanced'
         if download_type == "Video + Audio":
             st.subheader("🎬 Video Quality")
-            available_formats = video_info.get('formats', [])
-            # Group by resolution (height), pick best (largest filesize, or best vcodec)
-            best_formats = {}
-            for fmt in available_formats:
-                if fmt.get('vcodec') != 'none' and fmt.get('height'):
-                    height = fmt.get('height')
-                    filesize = fmt.get('filesize') or 0
-                    vcodec = fmt.get('vcodec', '')
-                    ext = fmt.get('ext', '')
-                    key = height
-                    if key not in best_formats or (filesize > (best_formats[key].get('filesize') or 0)):
-                        best_formats[key] = fmt
-            # Prepare dropdown options, sorted by height descending
-            sorted_heights = sorted(best_formats.keys(), reverse=True)
-            video_formats = []
-            for height in sorted_heights:
-                fmt = best_formats[height]
-                label = f"{height}p"
-                if fmt.get('fps', 30) > 30:
-                    label += f" {fmt.get('fps', 30)}fps"
-                if fmt.get('filesize'):
-                    size_mb = fmt['filesize'] / (1024 * 1024)
-                    label += f" (~{size_mb:.1f}MB)"
-                label += f" ({fmt.get('ext', '').upper()})"
-                video_formats.append({
-                    'label': label,
-                    'format_id': fmt.get('format_id'),
-                    'height': height,
-                    'fps': fmt.get('fps', 30),
-                    'filesize': fmt.get('filesize'),
-                    'ext': fmt.get('ext', '')
-                })
-            if video_formats:
-                video_quality_labels = [fmt['label'] for fmt in video_formats]
+            ladder = video_info['format_ladder']
+            if ladder:
+                video_quality_labels = ladder.labels
                 default_index = 0  # Top-most (highest) resolution
                 if 'video_quality' not in st.session_state:
                     st.session_state['video_quality'] = video_quality_labels[default_index]
@@ -273,9 +277,17 @@ def main():
                     help="Higher quality means larger file size",
                     key="video_quality_selectbox"
                 )
-                selected_video_format = next(fmt for fmt in video_formats if fmt['label'] == st.session_state['video_quality'])
+                selected_video_format = ladder.by_label(st.session_state['video_quality'])
                 # WhatsApp conversion checkbox
                 convert_to_whatsapp = st.checkbox("Convert to WhatsApp shareable format (MP4, 720p, H.264/AAC)", value=False, key="whatsapp_convert_checkbox")
+                if convert_to_whatsapp:
+                    encoder_profile = st.selectbox(
+                        "Encoding profile",
+                        YouTubeDownloader.get_encoder_profiles(),
+                        index=YouTubeDownloader.get_encoder_profiles().index('balanced'),
+                        help="Faster profiles finish sooner with slightly larger or lower quality files",
+                        key="encoder_profile_selectbox"
+                    )
                 # Branding checkbox
                 add_branding = st.checkbox("Add branding intro/outro (Vibe Coder)", value=False, key="branding_checkbox")
             else:
@@ -314,74 +326,33 @@ def main():
         if download_type == "Video + Audio" and not selected_video_format:
             st.error("No video format selected. Please select a video quality.")
         elif auto_download_triggered or (not do_not_confirm and st.button("Download", type="primary", use_container_width=True)):
-            with st.spinner("Downloading, please wait..."):
-                st.session_state['download_progress'] = 0
-                st.session_state['download_status'] = "Starting download..."
-                st.session_state['download_complete'] = False
-                st.session_state['download_path'] = None
-                def progress_callback(progress_data):
-                    if 'percent' in progress_data:
-                        percent = progress_data['percent']
-                        if percent:
-                            st.session_state['download_progress'] = min(percent, 100)
-                            st.session_state['download_status'] = f"Downloading... {percent:.1f}%"
-                    if 'status' in progress_data:
-                        if progress_data['status'] == 'downloading':
-                            st.session_state['download_status'] = "Downloading..."
-                        elif progress_data['status'] == 'finished':
-                            st.session_state['download_status'] = "Processing and finalizing..."
-                downloader = YouTubeDownloader()
-                file_manager = FileManager()
-                temp_dir = file_manager.create_temp_directory()
-                output_path = None
-                try:
-                    if download_type == "Video + Audio":
-                        if not selected_video_format:
-                            st.error("No video format selected. Please select a video quality.")
-                            return
-                        # Download video
-                        output_path = downloader.download_video(
-                            url,
-                            temp_dir,
-                            selected_video_format['format_id'],
-                            progress_callback
-                        )
-                        # Optionally convert to WhatsApp format
-                        if convert_to_whatsapp and output_path:
-                            whatsapp_path = downloader.convert_to_whatsapp_mp4(output_path)
-                            if whatsapp_path:
-                                output_path = whatsapp_path
-                        # Optionally add branding
-                        if 'add_branding' in locals() and add_branding and output_path:
-                            intro_path = 'intro.mp4'
-                            outro_path = 'outro.mp4'
-                            branded_path = downloader.add_branding_to_video(output_path, intro_path, outro_path)
-                            if branded_path:
-                                output_path = branded_path
-                    else:
-                        output_path = downloader.download_audio(
-                            url,
-                            temp_dir,
-                            audio_format.lower(),
-                            audio_quality,
-                            progress_callback
-                        )
-                    # Move file to user-specified location
-                    if output_path:
-                        dest_folder = Path(st.session_state['save_location'])
-                        dest_folder.mkdir(parents=True, exist_ok=True)
-                        dest_path = dest_folder / Path(output_path).name
-                        shutil.move(output_path, dest_path)
-                        st.session_state['download_path'] = str(dest_path)
-                        st.session_state['download_progress'] = 100
-                        st.session_state['download_status'] = "Download completed!"
-                        st.session_state['download_complete'] = True
-                    else:
-                        st.session_state['download_status'] = "Download failed!"
-                        st.session_state['download_progress'] = 0
-                except Exception as e:
-                    st.session_state['download_status'] = f"Error: {str(e)}"
-                    st.session_state['download_progress'] = 0
+            st.session_state['download_progress'] = 0
+            st.session_state['download_status'] = "Starting download..."
+            st.session_state['download_complete'] = False
+            st.session_state['download_path'] = None
+            if download_type == "Video + Audio":
+                spec = make_download_spec(
+                    url, st.session_state['save_location'],
+                    format_id=selected_video_format.format_id,
+                    height=selected_video_format.height,
+                    whatsapp=convert_to_whatsapp,
+                    branding=add_branding,
+                    encoder_profile=encoder_profile,
+                    video_id=video_info.get('id'),
+                    title=video_info.get('title')
+                )
+            else:
+                spec = make_download_spec(
+                    url, st.session_state['save_location'], audio_only=True,
+                    audio_format=audio_format.lower(), audio_quality=audio_quality,
+                    video_id=video_info.get('id'),
+                    title=video_info.get('title')
+                )
+            st.session_state['download_job_id'] = submit_download(spec)
+        if st.session_state.get('download_job_id'):
+            render_download_job(st.session_state['download_job_id'])
+        elif st.session_state.get('download_error'):
+            st.error(f"❌ {st.session_state.pop('download_error')}")
         # Show download status and file path
         if st.session_state['download_complete'] and st.session_state['download_path']:
             st.success("✅ Download completed successfully!")
@@ -410,118 +381,96 @@ def main():
                 reset_session_state()
                 st.rerun()
 
-def start_video_download(url, video_format, audio_format, audio_quality):
-    """Start video download"""
-    try:
-        st.session_state['download_progress'] = 1
-        st.session_state['download_status'] = "Starting download..."
-        st.session_state['download_complete'] = False
-        
-        # Show initial progress
-        st.rerun()
-        
-        downloader = YouTubeDownloader()
-        file_manager = FileManager()
-        
-        # Create temporary directory
-        temp_dir = file_manager.create_temp_directory()
-        
-        # Progress callback
-        def progress_callback(progress_data):
-            if 'percent' in progress_data:
-                percent = progress_data['percent']
-                if percent:
-                    st.session_state['download_progress'] = min(percent, 100)
-                    st.session_state['download_status'] = f"Downloading... {percent:.1f}%"
-            
-            if 'status' in progress_data:
-                if progress_data['status'] == 'downloading':
-                    st.session_state['download_status'] = "Downloading video..."
-                elif progress_data['status'] == 'finished':
-                    st.session_state['download_status'] = "Processing and finalizing..."
-        
-        # Download video
-        output_path = downloader.download_video(
-            url, 
-            temp_dir, 
-            video_format['format_id'],
-            progress_callback
-        )
-        
-        if output_path:
-            st.session_state['download_path'] = output_path
-            st.session_state['download_progress'] = 100
-            st.session_state['download_status'] = "Download completed!"
-            st.session_state['download_complete'] = True
-        else:
-            st.session_state['download_status'] = "Download failed!"
-            st.session_state['download_progress'] = 0
-            
-    except Exception as e:
-        st.session_state['download_status'] = f"Error: {str(e)}"
-        st.session_state['download_progress'] = 0
+    # The page is laid out by now; load yt-dlp in the background before the first URL arrives
+    preload_yt_dlp()
 
-def start_audio_download(url, audio_format, audio_quality):
-    """Start audio download"""
-    try:
-        st.session_state['download_progress'] = 1
-        st.session_state['download_status'] = "Starting audio download..."
-        st.session_state['download_complete'] = False
-        
-        # Show initial progress
-        st.rerun()
-        
-        downloader = YouTubeDownloader()
-        file_manager = FileManager()
-        
-        # Create temporary directory
-        temp_dir = file_manager.create_temp_directory()
-        
-        # Progress callback
-        def progress_callback(progress_data):
-            if 'percent' in progress_data:
-                percent = progress_data['percent']
-                if percent:
-                    st.session_state['download_progress'] = min(percent, 100)
-                    st.session_state['download_status'] = f"Downloading... {percent:.1f}%"
-            
-            if 'status' in progress_data:
-                if progress_data['status'] == 'downloading':
-                    st.session_state['download_status'] = "Downloading audio..."
-                elif progress_data['status'] == 'finished':
-                    st.session_state['download_status'] = "Processing and converting..."
-        
-        # Download audio
-        output_path = downloader.download_audio(
-            url, 
-            temp_dir, 
-            audio_format.lower(),
-            audio_quality,
-            progress_callback
-        )
-        
-        if output_path:
-            st.session_state['download_path'] = output_path
-            st.session_state['download_progress'] = 100
-            st.session_state['download_status'] = "Download completed!"
+@st.fragment(run_every=1)
+def render_download_job(job_id, job_key='download_job_id', result_key='download_path', error_key='download_error'):
+    """Poll the job scheduler and show progress until the job finishes"""
+    scheduler = get_job_scheduler()
+    status = scheduler.get_status(job_id)
+    if status is None:
+        del st.session_state[job_key]
+        return
+    st.session_state['download_progress'] = status['progress']
+    st.session_state['download_status'] = status['status']
+    if status['state'] in FINISHED_STATES:
+        del st.session_state[job_key]
+        if status['state'] == COMPLETED:
+            st.session_state[result_key] = status['result']
             st.session_state['download_complete'] = True
         else:
-            st.session_state['download_status'] = "Download failed!"
             st.session_state['download_progress'] = 0
-            
-    except Exception as e:
-        st.session_state['download_status'] = f"Error: {str(e)}"
-        st.session_state['download_progress'] = 0
-
-def start_video_download_thread(url, video_format, audio_format, audio_quality):
-    def download_task():
-        start_video_download(url, video_format, audio_format, audio_quality)
-    threading.Thread(target=download_task, daemon=True).start()
+            st.session_state[error_key] = status['status']
+        st.rerun()
+    st.progress(int(status['progress']), text=status['status'])
+    if status['downloaded_bytes']:
+        st.caption(f"{format_bytes(status['downloaded_bytes'])} of {format_bytes(status['total_bytes'])}")
+    if st.button("Cancel", key=f"cancel_{job_id}"):
+        scheduler.cancel(job_id)
 
-def start_audio_download_thread(url, audio_format, audio_quality):
-    def download_task():
-        start_audio_download(url, audio_format, audio_quality)
-    threading.Thread(target=download_task, daemon=True).start()
+def render_batch_section(download_type):
+    """Playlist / multi-URL downloads, run as one scheduler job"""
+    with st.expander("📚 Batch / Playlist Download"):
+        batch_urls = st.text_area(
+            "Playlist URL or one video URL per line",
+            key="batch_urls_input",
+            help="Playlists are expanded without fetching each video up front"
+        )
+        col_videos, col_fragments, col_quality = st.columns(3)
+        with col_videos:
+            max_concurrent_videos = st.number_input("Parallel videos", min_value=1, max_value=8, value=3, key="batch_parallel_videos")
+        with col_fragments:
+            concurrent_fragments = st.number_input(
+                "Fragments per video", min_value=1, max_value=16, value=4, key="batch_fragments",
+                help="Parallel fragment downloads for DASH/HLS formats; progressive formats ignore this"
+            )
+        with col_quality:
+            max_height = st.selectbox("Max quality", ["Best", "1080p", "720p", "480p", "360p"], key="batch_max_quality")
+        if st.button("Download All", use_container_width=True, key="batch_download_btn") and batch_urls.strip():
+            downloader = YouTubeDownloader()
+            file_manager = FileManager()
+            save_location = st.session_state['save_location']
+            # Stage next to the destination so finalising is a rename, not a copy
+            temp_dir = file_manager.create_staging_directory(save_location, prefix="youtube_batch_")
+            audio_only = download_type == "Audio Only"
+            scheduler = get_job_scheduler()
+            format_id = None if max_height == "Best" else f"bestvideo[height<={max_height[:-1]}]"
+            def download(job):
+                def batch_progress(summary):
+                    job.check_cancelled()
+                    speed_mb = summary['throughput'] / (1024 * 1024)
+                    job.update(
+                        progress=summary['percent'],
+                        status_message=f"{summary['completed']}/{summary['total']} done, {summary['failed_count']} failed ({speed_mb:.1f} MB/s)"
+                    )
+                summary = downloader.download_batch(
+                    batch_urls, temp_dir, format_id=format_id, audio_only=audio_only,
+                    max_concurrent_videos=int(max_concurrent_videos),
+                    concurrent_fragments=int(concurrent_fragments),
+                    progress_callback=batch_progress,
+                    download_slot=scheduler.download_slot
+                )
+                return summary['files']
+            def finalize(files):
+                dest_folder = Path(save_location)
+                for path in files:
+                    file_manager.finalize_file(path, str(dest_folder / Path(path).name))
+                file_manager.remove_staging_directory(temp_dir)
+                return f"{len(files)} file(s) saved to {dest_folder}"
+            # Each entry takes its own scheduler download slot
+            st.session_state['batch_job_id'] = scheduler.submit(
+                download,
+                finalize=finalize,
+                description=f"Batch: {batch_urls.splitlines()[0]}",
+                manages_slots=True
+            )
+        if st.session_state.get('batch_job_id'):
+            render_download_job(st.session_state['batch_job_id'], 'batch_job_id', 'batch_result', 'batch_error')
+        elif st.session_state.get('batch_error'):
+            st.error(f"❌ {st.session_state.pop('batch_error')}")
+        elif st.session_state.get('batch_result'):
+            st.success(f"✅ {st.session_state['batch_result']}")
 
 def reset_session_state():
     """Reset all session state variables"""
@@ -0,0 +1,128 @@
+"""Cold-start import cost of the app's modules, measured with python -X importtime.
+
+Each target is imported in a fresh interpreter several times; the report
+gives the median import time, whether yt-dlp was loaded, and the heaviest
+modules. The ydl_ready targets also time building the first YoutubeDL.
+
+    python scripts/bench_imports.py --repeat 5 --output imports.json --baseline previous.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules app.py imports before it draws anything (streamlit itself excluded)
+APP_MODULES = [
+    'utils.downloader', 'utils.validators', 'utils.file_manager', 'utils.job_queue', 'utils.progress',
+    'utils.search_service', 'utils.thumbnail_cache', 'utils.download_service',
+]
+
+BUILD_YDL = (
+    "import time; started = time.perf_counter(); "
+    "from utils.downloader import YouTubeDownloader; import yt_dlp; "
+    "yt_dlp.YoutubeDL(YouTubeDownloader().ydl_opts_base); "
+    "print('READY', time.perf_counter() - started)"
+)
+
+# name -> (code run in the fresh interpreter, extra environment)
+TARGETS = {
+    'app_modules': ('import ' + ', '.join(APP_MODULES), {}),
+    'cli': ('import utils.cli', {}),
+    'yt_dlp': ('import yt_dlp', {}),
+    'ydl_ready': (BUILD_YDL, {}),
+    'ydl_ready_all_extractors': (BUILD_YDL, {'YTD_EXTRACTORS': 'default'}),
+}
+
+
+def parse_importtime(stderr):
+    """Return {module: (self_us, cumulative_us, depth)} from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def run_target(code, env):
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code + "; import sys; print('YT_DLP', 'yt_dlp' in sys.modules)"],
+        cwd=ROOT, env={**os.environ, **env}, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    modules = parse_importtime(proc.stderr)
+    result = {
+        'import_s': sum(self_us for self_us, _, _ in modules.values()) / 1e6,
+        'modules': len(modules),
+        'yt_dlp_loaded': 'YT_DLP True' in proc.stdout,
+        'heaviest': sorted(((name, cumulative / 1e6) for name, (_, cumulative, depth) in modules.items() if depth <= 1),
+                           key=lambda item: -item[1])[:8],
+    }
+    ready = next((line for line in proc.stdout.splitlines() if line.startswith('READY ')), None)
+    if ready:
+        result['ready_s'] = float(ready.split()[1])
+    return result
+
+
+def summarize(runs):
+    summary = {
+        'median_import_s': statistics.median(run['import_s'] for run in runs),
+        'min_import_s': min(run['import_s'] for run in runs),
+        'modules': runs[-1]['modules'],
+        'yt_dlp_loaded': runs[-1]['yt_dlp_loaded'],
+        'heaviest': runs[-1]['heaviest'],
+    }
+    if 'ready_s' in runs[-1]:
+        summary['median_ready_s'] = statistics.median(run['ready_s'] for run in runs)
+    return summary
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['targets']
+    for name, summary in results.items():
+        if name in baseline:
+            before = baseline[name]['median_import_s']
+            change = (summary['median_import_s'] - before) / before * 100 if before else 0.0
+            print(f"{name:<26} {before * 1000:8.1f}ms -> {summary['median_import_s'] * 1000:8.1f}ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target', action='append', choices=list(TARGETS), help='Measure only these targets')
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.target or TARGETS:
+        code, env = TARGETS[name]
+        # The first run warms the OS file cache and writes .pyc files; it is not counted
+        run_target(code, env)
+        summary = summarize([run_target(code, env) for _ in range(args.repeat)])
+        results[name] = summary
+        print(f"{name:<26} import {summary['median_import_s'] * 1000:7.1f}ms  {summary['modules']:4d} modules"
+              + (f"  first YoutubeDL after {summary['median_ready_s'] * 1000:.1f}ms" if 'median_ready_s' in summary else '')
+              + ('  (loads yt_dlp)' if summary['yt_dlp_loaded'] else ''))
+        for module, seconds in summary['heaviest'][:3]:
+            print(f"    {module:<40} {seconds * 1000:7.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat, 'targets': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
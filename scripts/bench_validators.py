@@ -0,0 +1,48 @@
+"""Throughput of the URL validators on bulk lists: python scripts/bench_validators.py [count]"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.validators import validate_many, normalize_many, _validate_stripped
+
+URL_FORMS = [
+    "https://www.youtube.com/watch?v={id}",
+    "https://youtube.com/watch?list=PL0123456789&v={id}&t=42",
+    "https://youtu.be/{id}",
+    "https://m.youtube.com/watch?v={id}",
+    "https://www.youtube.com/shorts/{id}",
+    "https://music.youtube.com/watch?v={id}",
+    "https://vimeo.com/{id}",
+    "https://www.youtube.com/channel/{id}",
+]
+ID_CHARS = string.ascii_letters + string.digits + "_-"
+
+
+def make_urls(count, unique):
+    rng = random.Random(0)
+    ids = ["".join(rng.choice(ID_CHARS) for _ in range(11)) for _ in range(count if unique else 100)]
+    return [rng.choice(URL_FORMS).format(id=ids[i % len(ids)]) for i in range(count)]
+
+
+def bench(label, fn, urls):
+    _validate_stripped.cache_clear()
+    started = time.perf_counter()
+    fn(urls)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {len(urls) / elapsed:>12,.0f} URLs/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    unique = make_urls(count, unique=True)
+    repeated = make_urls(count, unique=False)
+    bench("validate_many (unique URLs)", validate_many, unique)
+    bench("validate_many (repeated URLs)", validate_many, repeated)
+    bench("normalize_many (unique URLs)", normalize_many, unique)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Offline benchmarks for the download and post-processing pipeline.
+
+Generates test media with ffmpeg (testsrc + sine), serves it from a local
+HTTP server that yt-dlp reads through its generic extractor, and times each
+YouTubeDownloader stage. Every scenario runs in its own process so peak RSS
+is per scenario. Results are written as JSON; pass --baseline to compare
+against an earlier run.
+
+    python scripts/benchmark_pipeline.py --duration 20 --repeat 3 --output bench.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The local sample is served to yt-dlp's generic extractor, which the app does not load by default
+os.environ.setdefault('YTD_EXTRACTORS', 'generic')
+
+SCENARIOS = [
+    'get_video_info',
+    'download_video',
+    'download_audio',
+    'convert_to_whatsapp_mp4',
+    'convert_to_whatsapp_mp4_transcode',
+    'add_branding_to_video',
+]
+
+
+def generate_media(media_dir, duration):
+    """Write the served sample plus local inputs for the post-processing scenarios"""
+    def ffmpeg(output, seconds, video_args, audio_args):
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'lavfi', '-i', f'testsrc=duration={seconds}:size=1280x720:rate=30',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+            *video_args, *audio_args, '-shortest', os.path.join(media_dir, output),
+        ], check=True)
+
+    h264 = ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p']
+    aac = ['-c:a', 'aac', '-b:a', '128k']
+    ffmpeg('sample.mp4', duration, h264, aac)
+    # Not WhatsApp-compatible, so conversion has to encode
+    ffmpeg('sample_mpeg4.mkv', duration, ['-c:v', 'mpeg4', '-q:v', '5'], aac)
+    ffmpeg('intro.mp4', 2, h264, aac)
+    ffmpeg('outro.mp4', 2, h264, aac)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # yt-dlp probes the file and hangs up mid-response; that is expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(directory):
+    """Serve directory over HTTP on a free local port; returns (server, base_url)"""
+    server = QuietServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def make_downloader():
+    from utils.downloader import YouTubeDownloader
+    from utils.metadata_cache import MetadataCache
+    return YouTubeDownloader(metadata_cache=MetadataCache(db_path=':memory:'))
+
+
+def run_once(name, downloader, context, work_dir):
+    """Run one iteration of a scenario; returns (bytes processed, detail)"""
+    url = context['base_url'] + '/sample.mp4'
+    media = context['media_dir']
+    if name == 'get_video_info':
+        info = downloader.get_video_info(url)
+        return None, {'formats': len(info.get('formats') or []) if info else 0}
+    if name == 'download_video':
+        path = downloader.download_video(url, work_dir)
+        return os.path.getsize(path) if path else None, {}
+    if name == 'download_audio':
+        path = downloader.download_audio(url, work_dir, 'mp3')
+        return os.path.getsize(path) if path else None, {'plan': (downloader.last_audio_plan or {}).get('transcode')}
+    if name.startswith('convert_to_whatsapp_mp4'):
+        source = 'sample_mpeg4.mkv' if name.endswith('_transcode') else 'sample.mp4'
+        input_path = os.path.join(work_dir, source)
+        shutil.copy(os.path.join(media, source), input_path)
+        path = downloader.convert_to_whatsapp_mp4(input_path)
+        return os.path.getsize(input_path) if path else None, {'strategy': downloader.last_whatsapp_strategy}
+    if name == 'add_branding_to_video':
+        input_path = os.path.join(work_dir, 'sample.mp4')
+        shutil.copy(os.path.join(media, 'sample.mp4'), input_path)
+        path = downloader.add_branding_to_video(
+            input_path, os.path.join(media, 'intro.mp4'), os.path.join(media, 'outro.mp4')
+        )
+        return os.path.getsize(path) if path else None, {'strategy': downloader.last_branding_strategy}
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def run_scenario(name, context, repeat):
+    """Child-process entry point: time repeat iterations and report resource usage"""
+    downloader = make_downloader()
+    runs = []
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='bench_')
+        try:
+            started = time.perf_counter()
+            processed, detail = run_once(name, downloader, context, work_dir)
+            elapsed = time.perf_counter() - started
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        runs.append({'seconds': elapsed, 'bytes': processed, 'ok': processed is not None or name == 'get_video_info',
+                     **detail})
+    return {
+        'runs': runs,
+        # ru_maxrss is in KB on Linux
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'children_peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def summarize(result):
+    seconds = [run['seconds'] for run in result['runs']]
+    summary = {
+        'median_s': statistics.median(seconds),
+        'min_s': min(seconds),
+        'max_s': max(seconds),
+        'failures': sum(1 for run in result['runs'] if not run['ok']),
+        'peak_rss_kb': result['peak_rss_kb'],
+        'children_peak_rss_kb': result['children_peak_rss_kb'],
+    }
+    sizes = [run['bytes'] for run in result['runs'] if run['bytes']]
+    if sizes:
+        summary['throughput_bytes_per_s'] = statistics.median(sizes) / summary['median_s']
+    return {**summary, 'runs': result['runs']}
+
+
+def compare(results, baseline_path):
+    """Print the median-latency change of each scenario against a baseline run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+    for name, summary in results.items():
+        if name in baseline:
+            before = baseline[name]['median_s']
+            change = (summary['median_s'] - before) / before * 100 if before else 0.0
+            print(f"{name:<36} {before:8.3f}s -> {summary['median_s']:8.3f}s ({change:+.1f}%)")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=int, default=20, help='Length of the generated sample in seconds')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Run only these scenarios')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--context', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        result = run_scenario(args.run_scenario, json.loads(args.context), args.repeat)
+        print('BENCHMARK_RESULT ' + json.dumps(result))
+        return 0
+
+    if not shutil.which('ffmpeg'):
+        print("ffmpeg is required to generate the benchmark media", file=sys.stderr)
+        return 1
+    media_dir = tempfile.mkdtemp(prefix='bench_media_')
+    server = None
+    try:
+        generate_media(media_dir, args.duration)
+        server, base_url = serve(media_dir)
+        context = {'base_url': base_url, 'media_dir': media_dir}
+        results = {}
+        for name in args.scenario or SCENARIOS:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run-scenario', name,
+                 '--context', json.dumps(context), '--repeat', str(args.repeat)],
+                capture_output=True, text=True
+            )
+            line = next((l for l in proc.stdout.splitlines() if l.startswith('BENCHMARK_RESULT ')), None)
+            if line is None:
+                print(f"{name}: failed\n{proc.stderr[-2000:]}", file=sys.stderr)
+                continue
+            results[name] = summarize(json.loads(line[len('BENCHMARK_RESULT '):]))
+            summary = results[name]
+            throughput = summary.get('throughput_bytes_per_s')
+            print(f"{name:<36} median {summary['median_s']:.3f}s"
+                  + (f"  {throughput / (1024 * 1024):.1f} MB/s" if throughput else '')
+                  + f"  rss {summary['peak_rss_kb'] / 1024:.0f}MB (ffmpeg {summary['children_peak_rss_kb'] / 1024:.0f}MB)"
+                  + (f"  {summary['failures']} failed" if summary['failures'] else ''))
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'media': {'duration_s': args.duration, 'size': '1280x720', 'fps': 30},
+        'repeat': args.repeat,
+        'scenarios': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+from utils.api_server import ApiServer
+from utils.downloader import YouTubeDownloader
+from utils.job_queue import JobScheduler
+from utils.metadata_cache import MetadataCache
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\n"
+                 f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), content
+
+
+def test_job_status_and_file_routes(tmp_path):
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    saved = tmp_path / "video.mp4"
+    saved.write_bytes(b"not really a video")
+    job_id = scheduler.submit(lambda job: str(saved))
+    downloader = YouTubeDownloader(metadata_cache=MetadataCache(db_path=str(tmp_path / "m.sqlite3")))
+
+    async def scenario():
+        server = await ApiServer(port=0, scheduler=scheduler, downloader=downloader).start()
+        try:
+            status, content = await request(server.port, "GET", "/health")
+            assert status == 200 and json.loads(content)["status"] == "ok"
+            status, content = await request(server.port, "GET", f"/jobs/{job_id}")
+            assert status == 200 and json.loads(content)["result"] == str(saved)
+            status, content = await request(server.port, "GET", f"/jobs/{job_id}/file")
+            assert status == 200 and content == b"not really a video"
+            status, content = await request(server.port, "GET", f"/jobs/{job_id}/trace")
+            assert status == 200 and json.loads(content)["job_id"] == job_id
+            status, content = await request(server.port, "GET", "/metrics")
+            assert status == 200 and b"# TYPE ytd_stage_total counter" in content
+            status, _ = await request(server.port, "GET", "/jobs/unknown")
+            assert status == 404
+            status, content = await request(server.port, "POST", "/jobs", {"url": "https://example.com/x"})
+            assert status == 400 and "error" in json.loads(content)
+        finally:
+            await server.close()
+
+    scheduler.shutdown()
+    asyncio.run(scenario())
+
+
+def test_bad_input_is_rejected_with_400(tmp_path):
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    job_id = scheduler.submit(lambda job: None)
+    downloader = YouTubeDownloader(metadata_cache=MetadataCache(db_path=str(tmp_path / "m.sqlite3")))
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+    async def scenario():
+        server = await ApiServer(port=0, scheduler=scheduler, downloader=downloader,
+                                 default_save_location=str(tmp_path / "downloads")).start()
+        try:
+            for save_location in ("/etc", "../outside", "nested/../../outside"):
+                status, content = await request(server.port, "POST", "/jobs", {"url": url, "save_location": save_location})
+                assert status == 400 and "save_location" in json.loads(content)["error"]
+            for field, value in (("height", "720"), ("height", True), ("height", 0), ("audio_format", 3),
+                                 ("audio_format", "wav"), ("priority", "high"), ("priority", -1),
+                                 ("encoder_profile", "turbo"), ("whatsapp", "yes")):
+                status, content = await request(server.port, "POST", "/jobs", {"url": url, field: value})
+                assert status == 400 and field in json.loads(content)["error"]
+            status, content = await request(server.port, "POST", "/jobs", {"url": 42})
+            assert status == 400
+            status, _ = await request(server.port, "GET", "/search?q=cats&page=two")
+            assert status == 400
+            status, _ = await request(server.port, "GET", f"/jobs/{job_id}/events?since=-1")
+            assert status == 400
+
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(b"POST /jobs HTTP/1.1\r\nHost: test\r\nContent-Length: lots\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            assert response.startswith(b"HTTP/1.1 400 ")
+        finally:
+            await server.close()
+
+    scheduler.shutdown()
+    asyncio.run(scenario())
+    assert not (tmp_path / "outside").exists()
+
+
+def test_valid_job_is_submitted_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+    import utils.api_server as api_server_module
+    submitted = []
+
+    def fake_submit_download(spec, scheduler=None):
+        submitted.append((spec, threading.current_thread() is threading.main_thread()))
+        return "job-1"
+
+    monkeypatch.setattr(api_server_module, "submit_download", fake_submit_download)
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    downloader = YouTubeDownloader(metadata_cache=MetadataCache(db_path=str(tmp_path / "m.sqlite3")))
+
+    async def scenario():
+        server = await ApiServer(port=0, scheduler=scheduler, downloader=downloader,
+                                 default_save_location=str(tmp_path)).start()
+        try:
+            status, content = await request(server.port, "POST", "/jobs", {
+                "url": "https://youtu.be/dQw4w9WgXcQ", "save_location": "music", "audio_only": True,
+                "audio_format": "FLAC", "priority": 1.5, "height": None,
+            })
+            assert status == 202 and json.loads(content) == {"id": "job-1"}
+        finally:
+            await server.close()
+
+    scheduler.shutdown()
+    asyncio.run(scenario())
+    [(spec, on_loop_thread)] = submitted
+    assert not on_loop_thread
+    assert spec["save_location"] == str(tmp_path / "music") and spec["priority"] == 1.5
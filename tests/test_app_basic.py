@@ -81,9 +81,12 @@ def test_youtube_search_results():
         # Click the Search button
         page.click('button:has-text("Search")')
         # Wait for results to load (results should have thumbnails and URLs)
-        page.wait_for_selector('img[src*="ytimg.com"]', timeout=20000)
+        # Thumbnails are served from the local cache via Streamlit's /media/ route,
+        # or straight from ytimg.com when the cache could not fetch them
+        thumbnail_selector = 'img[src*="/media/"], img[src*="ytimg.com"]'
+        page.wait_for_selector(thumbnail_selector, timeout=20000)
         # Assert at least one result is present
-        thumbnails = page.query_selector_all('img[src*="ytimg.com"]')
+        thumbnails = page.query_selector_all(thumbnail_selector)
         assert len(thumbnails) > 0, "No search result thumbnails found."
         # Wait for at least one code block to appear
         page.wait_for_selector('div[data-testid="stCode"]', timeout=20000)
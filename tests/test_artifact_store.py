@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from utils.artifact_store import ArtifactStore, DirectPipeline
+from utils.file_manager import FileManager, StagingJanitor, STAGING_DIR_NAME
+
+
+def test_pipeline_is_served_from_store_on_repeat(tmp_path):
+    store = ArtifactStore(root=str(tmp_path / "store"))
+    calls = []
+
+    def download(job, output_dir):
+        calls.append("download")
+        path = os.path.join(output_dir, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(b"x" * 10)
+        return path
+
+    def convert(path):
+        calls.append("convert")
+        output = os.path.splitext(path)[0] + "_whatsapp.mp4"
+        with open(output, "wb") as f:
+            f.write(b"y" * 5)
+        return output
+
+    for _ in range(2):
+        pipeline = store.cached_pipeline("dQw4w9WgXcQ", "22", download, [("whatsapp", convert)])
+        path = pipeline.download(None)
+        for step in pipeline.steps:
+            path = step(path) or path
+        delivered = pipeline.deliver(path, str(tmp_path / "Downloads"))
+
+    assert calls == ["download", "convert"]
+    assert os.path.basename(delivered) == "video_whatsapp.mp4"
+    with open(delivered, "rb") as f:
+        assert f.read() == b"y" * 5
+
+
+def test_lru_eviction_respects_size_cap(tmp_path):
+    store = ArtifactStore(root=str(tmp_path / "store"), max_bytes=15)
+    for name in ("a", "b"):
+        source = tmp_path / f"{name}.bin"
+        source.write_bytes(b"z" * 10)
+        store.put(store.make_key(name, "best"), str(source))
+    assert store.get(store.make_key("a", "best")) is None
+    assert store.get(store.make_key("b", "best")) is not None
+    assert store.get_stats()["evictions"] == 1
+
+
+def test_eviction_spares_new_and_held_artifacts(tmp_path):
+    store = ArtifactStore(root=str(tmp_path / "store"), max_bytes=5)
+    held_key, big_key = store.make_key("held", "best"), store.make_key("big", "best")
+    source = tmp_path / "held.bin"
+    source.write_bytes(b"z" * 4)
+    store.hold(held_key)
+    held = store.put(held_key, str(source))
+    source = tmp_path / "big.bin"
+    source.write_bytes(b"z" * 10)
+    # Larger than the whole store, but the caller still gets a file to deliver
+    big = store.put(big_key, str(source))
+    assert os.path.isfile(big) and os.path.isfile(held)
+    store.release(held_key)
+    store.evict()
+    assert store.get(held_key) is None and store.get(big_key) is None
+
+
+def test_put_returns_artifact_published_concurrently(tmp_path):
+    store = ArtifactStore(root=str(tmp_path / "store"))
+    key = store.make_key("dQw4w9WgXcQ", "22")
+    key_dir = store._key_dir(key)
+    lookup = store._artifact_in
+    calls = []
+
+    def racing_lookup(path):
+        # Another process publishes between the miss and the rename
+        if not calls:
+            calls.append(path)
+            os.makedirs(path)
+            with open(os.path.join(path, "theirs.mp4"), "wb") as f:
+                f.write(b"theirs")
+            return None
+        return lookup(path)
+
+    store._artifact_in = racing_lookup
+    source = tmp_path / "ours.mp4"
+    source.write_bytes(b"ours")
+    assert store.put(key, str(source)) == os.path.join(key_dir, "theirs.mp4")
+    assert os.listdir(store.staging_root) == []
+
+
+def run_direct_pipeline(tmp_path, destination):
+    def download(job, output_dir):
+        path = os.path.join(output_dir, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(b"x" * 10)
+        return path
+
+    pipeline = DirectPipeline(download, [("noop", lambda path: path)], str(destination),
+                              file_manager=FileManager(janitor=StagingJanitor(
+                                  registry_path=str(tmp_path / "registry.json"), temp_root=str(tmp_path))))
+    path = pipeline.download(None)
+    staged_inode = os.stat(path).st_ino
+    for step in pipeline.steps:
+        path = step(path) or path
+    return pipeline, pipeline.deliver(path, str(destination)), staged_inode
+
+
+def test_direct_pipeline_stages_beside_destination_and_renames(tmp_path):
+    destination = tmp_path / "Downloads"
+    pipeline, delivered, staged_inode = run_direct_pipeline(tmp_path, destination)
+    assert pipeline.staging_dir.startswith(str(destination / STAGING_DIR_NAME))
+    assert delivered == str(destination / "video.mp4")
+    # Renamed, not copied, and no staging directories left in the user's folder
+    assert os.stat(delivered).st_ino == staged_inode
+    assert os.listdir(destination) == ["video.mp4"]
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs a second filesystem")
+def test_cross_filesystem_destination_is_not_cached(tmp_path):
+    store = ArtifactStore(root=str(tmp_path / "store"))
+    other_fs = tempfile.mkdtemp(dir="/dev/shm")
+    try:
+        if store.shares_filesystem(other_fs):
+            pytest.skip("/dev/shm is on the same filesystem here")
+        assert store.shares_filesystem(str(tmp_path))
+        destination = os.path.join(other_fs, "Downloads")
+        _, delivered, staged_inode = run_direct_pipeline(tmp_path, destination)
+        assert os.stat(delivered).st_ino == staged_inode
+        assert os.listdir(destination) == ["video.mp4"]
+    finally:
+        shutil.rmtree(other_fs, ignore_errors=True)
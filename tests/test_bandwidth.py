@@ -0,0 +1,75 @@
+import pytest
+
+from utils.bandwidth import BandwidthManager, is_fragmented, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("500K") == 500 * 1024
+    assert parse_rate("2.5M") == int(2.5 * 1024 ** 2)
+    assert parse_rate("1048576") == 1048576
+    assert parse_rate("") is None and parse_rate(None) is None
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+
+def test_unlimited_manager_leaves_params_alone():
+    manager = BandwidthManager()
+    params = {}
+    with manager.lease() as lease:
+        lease.attach(params)
+        assert params["ratelimit"] is None
+
+
+def test_shares_follow_priority_and_rebalance_on_release():
+    manager = BandwidthManager(total_rate=300_000, min_rate=1)
+    video, audio = {}, {}
+    big = manager.lease(1.0, "video")
+    big.attach(video)
+    assert video["ratelimit"] == 300_000
+    small = manager.lease(2.0, "audio")
+    small.attach(audio)
+    assert (video["ratelimit"], audio["ratelimit"]) == (100_000, 200_000)
+    small.release()
+    assert video["ratelimit"] == 300_000
+    small.release()
+    assert manager.get_stats()["active"][0]["name"] == "video"
+
+
+def test_underused_share_goes_to_other_jobs():
+    manager = BandwidthManager(total_rate=300_000, min_rate=1)
+    slow, fast = manager.lease(), manager.lease()
+    slow_params = {}
+    slow.attach(slow_params)
+    # The server only gives this job 40 KB/s, so it keeps just that plus headroom
+    slow.observe(40_000)
+    assert slow.rate == 50_000
+    assert fast.rate == 250_000
+    manager.set_total_rate(None)
+    assert slow_params["ratelimit"] is None
+
+
+def test_throttled_rate_stays_below_the_allocated_rate():
+    manager = BandwidthManager(total_rate=100_000, min_rate=1, throttled_rate=80_000)
+    params = {}
+    with manager.lease() as lease:
+        lease.attach(params)
+        assert params["throttledratelimit"] == 50_000
+
+
+def test_rate_is_split_across_fragment_workers_only_for_fragmented_formats():
+    manager = BandwidthManager(total_rate=400_000, min_rate=1, throttled_rate=80_000)
+    params = {"concurrent_fragment_downloads": 4}
+    with manager.lease() as lease:
+        lease.attach(params)
+        # Progressive downloads use one connection, so they keep the whole share
+        assert params["ratelimit"] == 400_000
+        lease.set_fragmented(True)
+        assert params["ratelimit"] == 100_000
+        assert params["throttledratelimit"] == 50_000
+
+
+def test_is_fragmented():
+    assert is_fragmented({"protocol": "http_dash_segments"})
+    assert is_fragmented({"protocol": "m3u8_native"})
+    assert is_fragmented({"protocol": "https", "fragments": [{"url": "a"}]})
+    assert not is_fragmented({"protocol": "https"})
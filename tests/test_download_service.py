@@ -0,0 +1,62 @@
+import os
+
+from utils import download_service
+from utils.artifact_store import ArtifactStore
+from utils.download_service import make_download_spec, resume_unfinished_jobs, submit_download
+from utils.file_manager import FileManager, StagingJanitor
+from utils.job_journal import JobJournal, COMPLETED
+from utils.job_queue import JobScheduler
+
+
+class CrashedScheduler:
+    """Accepts jobs and never runs them, like a process killed right after queueing"""
+
+    def submit(self, *args, **kwargs):
+        return "lost"
+
+
+def make_file_manager(tmp_path):
+    temp_root = tmp_path / "tmp"
+    temp_root.mkdir(exist_ok=True)
+    return FileManager(janitor=StagingJanitor(registry_path=str(tmp_path / "registry.json"),
+                                              temp_root=str(temp_root), max_age_hours=0, min_idle_seconds=0))
+
+
+def test_interrupted_direct_job_resumes_into_its_pinned_staging_dir(tmp_path, monkeypatch):
+    journal = JobJournal(db_path=str(tmp_path / "jobs.sqlite3"))
+    store = ArtifactStore(root=str(tmp_path / "store"))
+    # A save location on another filesystem than the store
+    store.shares_filesystem = lambda path: False
+    downloads = []
+
+    def fake_download_audio(self, url, output_dir, audio_format, quality, progress_callback=None, priority=1.0):
+        downloads.append((output_dir, sorted(os.listdir(output_dir))))
+        path = os.path.join(output_dir, "song.mp3")
+        with open(path, "wb") as f:
+            f.write(b"audio")
+        return path
+
+    monkeypatch.setattr(download_service.YouTubeDownloader, "download_audio", fake_download_audio)
+    save_location = str(tmp_path / "Downloads")
+    spec = make_download_spec("https://youtu.be/dQw4w9WgXcQ", save_location, audio_only=True)
+    submit_download(spec, CrashedScheduler(), journal, store, file_manager=make_file_manager(tmp_path))
+    [entry] = journal.unfinished()
+    staging_dir = entry["staging_path"]
+    with open(os.path.join(staging_dir, "song.mp3.part"), "wb") as f:
+        f.write(b"partial")
+
+    # The restarted process sweeps everything idle before it gets round to resuming
+    file_manager = make_file_manager(tmp_path)
+    file_manager.janitor.sweep()
+    assert os.path.exists(os.path.join(staging_dir, "song.mp3.part"))
+
+    monkeypatch.setattr(download_service, "_resumed", None)
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    [job_id] = resume_unfinished_jobs(scheduler, journal, store, file_manager=file_manager)
+    scheduler.shutdown()
+
+    assert downloads == [(staging_dir, ["song.mp3.part"])]
+    assert scheduler.get_status(job_id)["result"] == os.path.join(save_location, "song.mp3")
+    assert journal.get(entry["id"])["state"] == COMPLETED
+    assert os.listdir(save_location) == ["song.mp3"]
+    assert file_manager.janitor._pinned == {}
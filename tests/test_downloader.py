@@ -0,0 +1,388 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils.downloader import SEGMENT_LENGTH, SEGMENT_MIN_DURATION, YouTubeDownloader
+from utils.metadata_cache import MetadataCache
+
+
+def make_downloader(tmp_path):
+    return YouTubeDownloader(metadata_cache=MetadataCache(db_path=str(tmp_path / "metadata.sqlite3")))
+
+
+def test_download_batch_aggregates_progress(tmp_path):
+    downloader = make_downloader(tmp_path)
+
+    def fake_download_video(url, output_dir, format_id=None, progress_callback=None, info=None, concurrent_fragments=None):
+        assert concurrent_fragments == 2
+        progress_callback({'status': 'downloading', 'percent': 50.0, 'downloaded_bytes': 500, 'filename': url})
+        if url.endswith('bbbbbbbbbbb'):
+            return None
+        return f"{output_dir}/{url[-11:]}.mp4"
+
+    downloader.download_video = fake_download_video
+    updates = []
+    summary = downloader.download_batch(
+        "https://youtu.be/aaaaaaaaaaa\nhttps://youtu.be/bbbbbbbbbbb\nhttps://youtu.be/aaaaaaaaaaa",
+        str(tmp_path),
+        max_concurrent_videos=2,
+        concurrent_fragments=2,
+        progress_callback=updates.append,
+    )
+    assert summary['total'] == 2
+    assert summary['files'] == [f"{tmp_path}/aaaaaaaaaaa.mp4"]
+    assert summary['failed'] == ["https://youtu.be/bbbbbbbbbbb"]
+    assert summary['downloaded_bytes'] == 1000
+    assert updates[-1]['percent'] == 100.0
+
+
+def test_download_batch_holds_a_slot_per_entry(tmp_path):
+    downloader = make_downloader(tmp_path)
+    held = []
+
+    class Slot:
+        def __enter__(self):
+            held.append(True)
+
+        def __exit__(self, *exc):
+            return False
+
+    downloader.download_video = lambda url, output_dir, *args, **kwargs: f"{output_dir}/{url[-11:]}.mp4"
+    downloader.download_batch(
+        "https://youtu.be/aaaaaaaaaaa\nhttps://youtu.be/bbbbbbbbbbb", str(tmp_path), download_slot=Slot
+    )
+    assert len(held) == 2
+
+
+def test_plan_whatsapp_conversion_picks_cheapest_path(tmp_path):
+    downloader = make_downloader(tmp_path)
+    h264_720 = {'codec_type': 'video', 'codec_name': 'h264', 'pix_fmt': 'yuv420p', 'width': 1280, 'height': 720}
+    vp9_1080 = {'codec_type': 'video', 'codec_name': 'vp9', 'pix_fmt': 'yuv420p', 'width': 1920, 'height': 1080}
+    aac = {'codec_type': 'audio', 'codec_name': 'aac'}
+    opus = {'codec_type': 'audio', 'codec_name': 'opus'}
+    cases = [
+        ([h264_720, aac], 'remux'),
+        ([h264_720, opus], 'audio_transcode'),
+        ([vp9_1080, aac], 'video_transcode'),
+        ([vp9_1080, opus], 'full_reencode'),
+        (None, 'full_reencode'),
+    ]
+    for streams, expected in cases:
+        downloader.probe_media = lambda path, streams=streams: streams
+        assert downloader.plan_whatsapp_conversion("video.mkv") == expected
+
+
+def test_plan_post_processing_fuses_whatsapp_and_branding(tmp_path):
+    downloader = make_downloader(tmp_path)
+    intro = tmp_path / "intro.mp4"
+    intro.write_bytes(b"")
+    vp9 = [{'codec_type': 'video', 'codec_name': 'vp9', 'width': 1920, 'height': 1080}, {'codec_type': 'audio', 'codec_name': 'opus'}]
+    h264 = [{'codec_type': 'video', 'codec_name': 'h264', 'pix_fmt': 'yuv420p', 'width': 1280, 'height': 720,
+             'profile': 'High', 'level': 31, 'extradata_hash': 'SHA256:00'},
+            {'codec_type': 'audio', 'codec_name': 'aac'}]
+
+    downloader.probe_media = lambda path: vp9
+    assert downloader.plan_post_processing("v.webm") == 'none'
+    assert downloader.plan_post_processing("v.webm", whatsapp=True) == 'whatsapp'
+    assert downloader.plan_post_processing("v.webm", intro_path=str(intro)) == 'branding'
+    assert downloader.plan_post_processing("v.webm", True, str(intro)) == 'fused'
+
+    downloader.probe_media = lambda path: h264
+    assert downloader.plan_post_processing("v.mp4", True, str(intro)) == 'whatsapp_copy_branding'
+    # Without the parameter-set hash a stream-copy join cannot be proven safe
+    h264[0].pop('extradata_hash')
+    assert downloader.plan_post_processing("v.mp4", True, str(intro)) == 'fused'
+
+
+def test_plan_audio_download_remuxes_matching_codec(tmp_path):
+    downloader = make_downloader(tmp_path)
+    formats = [
+        {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 129.5},
+        {'format_id': '251', 'ext': 'webm', 'vcodec': 'none', 'acodec': 'opus', 'abr': 160},
+        {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'abr': 96},
+    ]
+    aac = downloader.plan_audio_download(formats, 'aac', 'Best Available')
+    assert (aac['format'], aac['postprocessors'], aac['ext'], aac['transcode']) == ('140', [], 'm4a', False)
+
+    ogg = downloader.plan_audio_download(formats, 'ogg', 'Best Available')
+    assert ogg['format'] == '251' and not ogg['transcode']
+    assert ogg['postprocessors'] == [{'key': 'FFmpegVideoRemuxer', 'preferedformat': 'ogg'}]
+
+    mp3 = downloader.plan_audio_download(formats, 'mp3', '128kbps')
+    assert mp3['format'] == '140' and mp3['transcode']
+    assert mp3['postprocessors'][0]['preferredquality'] == '128'
+
+
+def test_yt_dlp_is_imported_on_first_use():
+    code = ("import sys, utils.downloader, utils.download_service, utils.search_service; "
+            "assert 'yt_dlp' not in sys.modules")
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_only_youtube_extractors_are_loaded(tmp_path):
+    import yt_dlp
+    ydl = yt_dlp.YoutubeDL(make_downloader(tmp_path).ydl_opts_base)
+    assert ydl.get_info_extractor("Youtube").suitable("https://youtu.be/aaaaaaaaaaa")
+    assert ydl._ies and all(name.startswith("Youtube") for name in ydl._ies)
+
+
+def h264_streams(extradata_hash="sps-a", profile="High", level=40):
+    return [
+        {"codec_type": "video", "codec_name": "h264", "profile": profile, "level": level, "refs": 3,
+         "extradata_hash": extradata_hash, "width": 1280, "height": 720, "r_frame_rate": "30/1",
+         "pix_fmt": "yuv420p", "time_base": "1/15360"},
+        {"codec_type": "audio", "codec_name": "aac", "sample_rate": "44100", "channels": 2},
+    ]
+
+
+def stub_branding(monkeypatch, tmp_path, asset_hash):
+    """Fake ffmpeg/ffprobe: every command writes its output file; normalised clips report asset_hash"""
+    import utils.downloader as downloader_module
+    cache_dir = tmp_path / "branding_cache"
+    monkeypatch.setattr(downloader_module, "BRANDING_CACHE_DIR", str(cache_dir))
+    commands = []
+
+    def fake_run_command(cmd, check=True):
+        commands.append(cmd)
+        with open(cmd[-1], "wb") as f:
+            f.write(b"media")
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+    monkeypatch.setattr(downloader_module, "run_command", fake_run_command)
+    downloader = make_downloader(tmp_path)
+    downloader.probe_media = lambda path: h264_streams(
+        asset_hash if path.startswith(str(cache_dir)) else "sps-a"
+    )
+    for name in ("main.mp4", "intro.mp4", "outro.mp4"):
+        (tmp_path / name).write_bytes(b"media")
+    return downloader, commands
+
+
+def test_branding_copies_when_parameter_sets_match(tmp_path, monkeypatch):
+    downloader, commands = stub_branding(monkeypatch, tmp_path, asset_hash="sps-a")
+    result = downloader.add_branding_to_video(
+        str(tmp_path / "main.mp4"), str(tmp_path / "intro.mp4"), str(tmp_path / "outro.mp4")
+    )
+    assert result == str(tmp_path / "main_branded.mp4")
+    assert downloader.last_branding_strategy == "concat_copy"
+    normalise = commands[0]
+    assert normalise[normalise.index("-profile:v") + 1] == "high"
+    assert normalise[normalise.index("-level:v") + 1] == "4.0"
+    assert normalise[normalise.index("-refs") + 1] == "3"
+    assert "concat" in commands[-1] and "copy" in commands[-1]
+
+
+def test_branding_reencodes_when_parameter_sets_differ(tmp_path, monkeypatch):
+    downloader, commands = stub_branding(monkeypatch, tmp_path, asset_hash="sps-b")
+    downloader.add_branding_to_video(
+        str(tmp_path / "main.mp4"), str(tmp_path / "intro.mp4"), str(tmp_path / "outro.mp4")
+    )
+    assert downloader.last_branding_strategy == "concat_filter"
+    assert "-filter_complex" in commands[-1]
+
+
+def test_branding_reencodes_without_parameter_set_hash(tmp_path, monkeypatch):
+    downloader, commands = stub_branding(monkeypatch, tmp_path, asset_hash="sps-a")
+    downloader.probe_media = lambda path: h264_streams(extradata_hash=None)
+    downloader.add_branding_to_video(str(tmp_path / "main.mp4"), str(tmp_path / "intro.mp4"), None)
+    assert downloader.last_branding_strategy == "concat_filter"
+    assert len(commands) == 1
+
+
+def test_normalised_branding_asset_is_cached(tmp_path, monkeypatch):
+    downloader, commands = stub_branding(monkeypatch, tmp_path, asset_hash="sps-a")
+    profile = downloader.branding_profile(str(tmp_path / "main.mp4"))
+    first = downloader._normalized_branding_asset(str(tmp_path / "intro.mp4"), profile)
+    second = downloader._normalized_branding_asset(str(tmp_path / "intro.mp4"), profile)
+    assert first == second and os.path.isfile(first)
+    assert len(commands) == 1
+    # No temporary encode output is left behind
+    assert os.listdir(os.path.dirname(first)) == [os.path.basename(first)]
+
+
+def test_encoder_args_follow_profile(tmp_path):
+    downloader = YouTubeDownloader(metadata_cache=MetadataCache(db_path=":memory:"), encoder_profile="fast")
+    assert downloader._video_encoder_args() == [
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "26", "-pix_fmt", "yuv420p", "-threads", "0",
+    ]
+    downloader.encoder_profile = "unknown"
+    assert downloader._video_encoder_args(threads=2)[3] == "fast"
+    assert downloader._video_encoder_args(threads=2)[-1] == "2"
+
+
+def test_should_segment_only_long_videos_with_spare_workers(tmp_path):
+    downloader = make_downloader(tmp_path)
+    downloader.segment_workers = 4
+    for duration, expected in ((None, False), (120.0, False), (SEGMENT_MIN_DURATION, True)):
+        downloader.probe_duration = lambda path, duration=duration: duration
+        assert downloader._should_segment("v.mp4") is expected
+    downloader.segment_workers = 1
+    assert downloader._should_segment("v.mp4") is False
+
+
+def test_segmented_encode_commands_and_shared_slots(tmp_path, monkeypatch):
+    import threading
+    import time
+    import utils.downloader as downloader_module
+    monkeypatch.setattr(downloader_module, "_segment_encode_slots", threading.BoundedSemaphore(1))
+    commands = []
+    running = []
+    peak = []
+
+    def fake_run_command(cmd, check=True):
+        commands.append(cmd)
+        output = cmd[-1]
+        if "segment" in cmd:
+            for i in range(3):
+                open(output % i, "wb").close()
+        else:
+            running.append(cmd)
+            peak.append(len(running))
+            time.sleep(0.01)
+            open(output, "wb").close()
+            running.remove(cmd)
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+    monkeypatch.setattr(downloader_module, "run_command", fake_run_command)
+    downloader = make_downloader(tmp_path)
+    downloader.segment_workers = 3
+    output = str(tmp_path / "out.mp4")
+    assert downloader._encode_video_segments(str(tmp_path / "in.mp4"), output, "scale=640:-2") == output
+
+    split, *encodes, join = commands
+    assert split[split.index("-segment_time") + 1] == str(SEGMENT_LENGTH) and "copy" in split
+    assert len(encodes) == 3
+    for cmd in encodes:
+        assert cmd[cmd.index("-vf") + 1] == "scale=640:-2"
+        assert cmd[cmd.index("-threads") + 1] == str(max(1, (os.cpu_count() or 1) // 3))
+    assert join[join.index("-f") + 1] == "concat" and join[-1] == output
+    # Only one slot process-wide, so the three workers never encoded at the same time
+    assert max(peak) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("segments_")]
+
+
+@pytest.fixture
+def local_media_url(tmp_path):
+    """A tiny .mp4 served over HTTP, read by yt-dlp's generic extractor"""
+    import functools
+    import threading
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "sample.mp4").write_bytes(os.urandom(64 * 1024))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(served)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/sample.mp4"
+    server.shutdown()
+    server.server_close()
+
+
+def test_one_extraction_per_job(tmp_path, monkeypatch, local_media_url):
+    import yt_dlp
+    import utils.downloader as downloader_module
+    calls = []
+    extract_info = yt_dlp.YoutubeDL.extract_info
+
+    def counting_extract_info(self, *args, **kwargs):
+        calls.append(args[0] if args else kwargs.get("url"))
+        return extract_info(self, *args, **kwargs)
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", counting_extract_info)
+    # Key the local sample like a YouTube video so the metadata cache applies (YTD_EXTRACTORS=generic)
+    monkeypatch.setattr(downloader_module, "extract_video_id", lambda url: "localsample")
+    downloader = make_downloader(tmp_path)
+    downloader.ydl_opts_base["allowed_extractors"] = ["generic"]
+
+    info = downloader.get_video_info(local_media_url)
+    assert info and info["id"]
+    raw_info = downloader.metadata_cache.get("localsample", fresh_urls=True)
+    first = downloader.download_video(local_media_url, str(tmp_path / "a"), info=raw_info)
+    second = downloader.download_video(local_media_url, str(tmp_path / "b"))
+    assert os.path.getsize(first) == os.path.getsize(second) == 64 * 1024
+    assert calls == [local_media_url]
+
+
+def test_download_returns_the_post_processed_path(tmp_path, monkeypatch, local_media_url):
+    import yt_dlp
+    from yt_dlp.postprocessor.common import PostProcessor
+
+    class RenameToM4a(PostProcessor):
+        """Stands in for audio extraction: the final file has a different extension"""
+
+        def run(self, info):
+            renamed = os.path.splitext(info["filepath"])[0] + ".m4a"
+            os.replace(info["filepath"], renamed)
+            info["filepath"] = renamed
+            return [], info
+
+    init = yt_dlp.YoutubeDL.__init__
+
+    def init_with_rename(self, params=None, *args, **kwargs):
+        init(self, params, *args, **kwargs)
+        if not (params or {}).get("skip_download"):
+            self.add_post_processor(RenameToM4a(self), when="post_process")
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "__init__", init_with_rename)
+    downloader = make_downloader(tmp_path)
+    downloader.ydl_opts_base["allowed_extractors"] = ["generic"]
+    opts = {**downloader.ydl_opts_base, "outtmpl": str(tmp_path / "out" / "%(title)s.%(ext)s")}
+    info = downloader._extract_info(local_media_url, opts, use_cache=False)
+
+    path = downloader._download_with_info(opts, info)
+    assert path == str(tmp_path / "out" / "sample.m4a")
+    assert os.listdir(tmp_path / "out") == ["sample.m4a"]
+
+    # Nothing downloaded, so no post hook fires and nothing was recorded
+    with pytest.raises(Exception, match="without reporting"):
+        downloader._download_with_info({**opts, "skip_download": True}, info)
+
+
+def test_single_pass_pads_silent_clips_with_their_duration(tmp_path, monkeypatch):
+    downloader, commands = stub_branding(monkeypatch, tmp_path, asset_hash="sps-a")
+    silent = [h264_streams()[0]]
+    downloader.probe_media = lambda path: silent if path.endswith("intro.mp4") else h264_streams()
+    downloader.probe_duration = lambda path: 4.5
+    result = downloader._whatsapp_brand_single_pass(str(tmp_path / "main.mp4"), str(tmp_path / "intro.mp4"), None)
+    assert result == str(tmp_path / "main_whatsapp_branded.mp4")
+    cmd = commands[-1]
+    assert cmd[cmd.index("anullsrc=r=44100:cl=stereo") - 3:cmd.index("anullsrc=r=44100:cl=stereo") - 1] == ["-t", "4.5"]
+
+
+def test_single_pass_fails_when_a_silent_clip_has_no_duration(tmp_path, monkeypatch):
+    downloader, commands = stub_branding(monkeypatch, tmp_path, asset_hash="sps-a")
+    downloader.probe_media = lambda path: [h264_streams()[0]]
+    downloader.probe_duration = lambda path: None
+    assert downloader._whatsapp_brand_single_pass(str(tmp_path / "main.mp4"), None, None) is None
+    assert commands == []
+
+
+def test_single_pass_keeps_main_audio_when_probe_fails(tmp_path, monkeypatch):
+    downloader, commands = stub_branding(monkeypatch, tmp_path, asset_hash="sps-a")
+    downloader.probe_media = lambda path: None
+    downloader._whatsapp_brand_single_pass(str(tmp_path / "main.mp4"), None, None)
+    assert "anullsrc=r=44100:cl=stereo" not in commands[-1]
+
+
+def test_progressive_download_keeps_its_whole_bandwidth_share(tmp_path, local_media_url):
+    from utils.bandwidth import BandwidthManager
+    manager = BandwidthManager(total_rate=10 * 1024 ** 2, min_rate=1)
+    leases = []
+    lease = manager.lease
+    manager.lease = lambda *args: leases.append(lease(*args)) or leases[-1]
+    downloader = YouTubeDownloader(metadata_cache=MetadataCache(db_path=":memory:"), bandwidth=manager)
+    downloader.ydl_opts_base["allowed_extractors"] = ["generic"]
+    opts = {**downloader.ydl_opts_base, "outtmpl": str(tmp_path / "%(title)s.%(ext)s"),
+            "concurrent_fragment_downloads": 4}
+    info = downloader._extract_info(local_media_url, opts, use_cache=False)
+    seen = []
+    opts["progress_hooks"] = [lambda d: seen.append((leases[0].fragmented, leases[0]._params[0]["ratelimit"]))
+                              if d["status"] == "downloading" else None]
+    assert downloader._download_with_info(opts, info)
+    assert seen and set(seen) == {(False, 10 * 1024 ** 2)}
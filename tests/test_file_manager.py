@@ -0,0 +1,87 @@
+import os
+import time
+
+from utils.file_manager import FileManager, StagingJanitor, STAGING_DIR_NAME
+
+
+def make_janitor(tmp_path, **kwargs):
+    """A janitor that only sees tmp_path, never the real system temp dir"""
+    temp_root = tmp_path / "tmp"
+    temp_root.mkdir(exist_ok=True)
+    return StagingJanitor(registry_path=str(tmp_path / "registry.json"), temp_root=str(temp_root), **kwargs)
+
+
+def make_file_manager(tmp_path):
+    return FileManager(janitor=make_janitor(tmp_path))
+
+
+def test_staging_directory_is_finalised_by_rename(tmp_path):
+    file_manager = make_file_manager(tmp_path)
+    destination = tmp_path / "Downloads"
+    staging = file_manager.create_staging_directory(str(destination))
+    assert os.path.dirname(staging) == str(destination / STAGING_DIR_NAME)
+
+    source = os.path.join(staging, "video.mp4")
+    with open(source, "wb") as f:
+        f.write(b"data")
+    inode = os.stat(source).st_ino
+    target = str(destination / "video.mp4")
+    assert file_manager.finalize_file(source, target) == "rename"
+    assert os.stat(target).st_ino == inode
+    assert not os.path.exists(source)
+
+
+def test_shared_files_are_linked_not_moved(tmp_path):
+    file_manager = make_file_manager(tmp_path)
+    source = tmp_path / "artifact.mp4"
+    source.write_bytes(b"data")
+    target = tmp_path / "out" / "artifact.mp4"
+    assert file_manager.finalize_file(str(source), str(target), shared=True) in ("reflink", "hardlink")
+    assert source.exists() and target.read_bytes() == b"data"
+
+
+def test_janitor_reclaims_expired_directories_across_restarts(tmp_path):
+    janitor = make_janitor(tmp_path)
+    stale = tmp_path / "stale"
+    stale.mkdir()
+    (stale / "video.mp4.part").write_bytes(b"x" * 100)
+    janitor.register(str(stale))
+    old = time.time() - 48 * 3600
+    for path in (stale / "video.mp4.part", stale):
+        os.utime(path, (old, old))
+
+    # A new janitor (e.g. after a crash) picks the directory up from the registry
+    restarted = make_janitor(tmp_path)
+    assert str(stale) in restarted._directories
+    assert restarted.sweep() == 100
+    assert not stale.exists()
+    metrics = restarted.get_metrics()
+    assert metrics["bytes_reclaimed"] == 100 and metrics["directories_reclaimed"] == 1
+
+
+def test_janitor_keeps_pinned_directories(tmp_path):
+    janitor = make_janitor(tmp_path, max_age_hours=0)
+    pinned = tmp_path / "resumable"
+    pinned.mkdir()
+    janitor.register(str(pinned))
+    janitor.pin(str(pinned))
+    janitor.sweep()
+    assert pinned.exists()
+
+
+def test_janitor_adopts_leftovers_from_its_temp_root_only(tmp_path):
+    leftover = tmp_path / "tmp" / "youtube_download_crashed"
+    leftover.mkdir(parents=True)
+    (tmp_path / "tmp" / "unrelated").mkdir()
+    assert list(make_janitor(tmp_path)._directories) == [str(leftover)]
+
+
+def test_removing_last_staging_directory_drops_hidden_root(tmp_path):
+    manager = make_file_manager(tmp_path)
+    destination = tmp_path / "Downloads"
+    first = manager.create_staging_directory(str(destination))
+    second = manager.create_staging_directory(str(destination))
+    manager.remove_staging_directory(first)
+    assert (destination / STAGING_DIR_NAME).is_dir()
+    manager.remove_staging_directory(second)
+    assert os.listdir(destination) == []
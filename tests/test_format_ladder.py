@@ -0,0 +1,28 @@
+from utils.format_ladder import FormatLadder, get_format_ladder
+
+FORMATS = [
+    {"format_id": "140", "vcodec": "none", "acodec": "mp4a.40.2", "ext": "m4a", "abr": 128, "filesize": 1_000_000},
+    {"format_id": "251", "vcodec": "none", "acodec": "opus", "ext": "webm", "abr": 160, "filesize": 1_200_000},
+    {"format_id": "137", "vcodec": "avc1", "acodec": "none", "ext": "mp4", "height": 1080, "fps": 30, "filesize": 20 * 1024 * 1024},
+    {"format_id": "248", "vcodec": "vp9", "acodec": "none", "ext": "webm", "height": 1080, "fps": 30, "filesize_approx": 10 * 1024 * 1024},
+    {"format_id": "22", "vcodec": "avc1", "acodec": "mp4a.40.2", "ext": "mp4", "height": 720, "fps": 60, "filesize_approx": 5 * 1024 * 1024},
+    {"format_id": "sb0", "vcodec": "none", "acodec": "none", "ext": "mhtml"},
+]
+
+
+def test_ladder_picks_best_format_per_height_with_audio_pairing():
+    ladder = FormatLadder.from_formats("dQw4w9WgXcQ", FORMATS)
+    assert [entry.height for entry in ladder.entries] == [1080, 720]
+    top = ladder.best()
+    assert top.format_id == "137"
+    assert top.audio_format_id == "140"
+    assert top.estimated_size == 20 * 1024 * 1024 + 1_000_000
+    assert ladder.labels[1] == "720p 60fps (~5.0MB) (MP4)"
+    assert ladder.by_label(ladder.labels[1]).audio_format_id is None
+    assert ladder.audio_format_id == "251"
+
+
+def test_ladder_is_memoised_per_video_id():
+    ladder = get_format_ladder("memoisedId1", FORMATS)
+    assert get_format_ladder("memoisedId1", []) is ladder
+    assert not get_format_ladder(None, [])
@@ -0,0 +1,29 @@
+from utils.job_journal import JobJournal, COMPLETED, PENDING, RUNNING
+
+
+def test_unfinished_jobs_survive_reopen(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    journal = JobJournal(db_path=db_path)
+    spec = {"url": "https://youtu.be/dQw4w9WgXcQ", "audio_only": True}
+    running = journal.record(spec["url"], spec, staging_path=str(tmp_path / "job_a"), format_id="audio:mp3:best")
+    done = journal.record(spec["url"], spec)
+    journal.mark_running(running)
+    journal.mark_finished(done, COMPLETED, result="/saved/song.mp3")
+
+    reopened = JobJournal(db_path=db_path)
+    unfinished = reopened.unfinished()
+    assert [entry["id"] for entry in unfinished] == [running]
+    assert unfinished[0]["state"] == RUNNING
+    assert unfinished[0]["spec"] == spec
+    assert unfinished[0]["staging_path"] == str(tmp_path / "job_a")
+    assert reopened.get(done)["result"] == "/saved/song.mp3"
+
+
+def test_jobs_that_keep_crashing_are_not_resumed(tmp_path):
+    journal = JobJournal(db_path=str(tmp_path / "jobs.sqlite3"))
+    job = journal.record("https://youtu.be/dQw4w9WgXcQ", {})
+    assert journal.get(job)["state"] == PENDING
+    for _ in range(3):
+        journal.mark_running(job)
+    assert journal.unfinished(max_attempts=3) == []
+    assert journal.purge(max_age=0) == 0
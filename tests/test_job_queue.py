@@ -0,0 +1,91 @@
+import threading
+
+from utils.job_queue import JobScheduler, COMPLETED, CANCELLED, FAILED
+
+
+def test_job_runs_download_post_process_and_finalize():
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    job_id = scheduler.submit(
+        lambda job: "video.mp4",
+        post_process=[lambda path: path.replace(".mp4", "_whatsapp.mp4")],
+        finalize=lambda path: "/saved/" + path,
+    )
+    scheduler.shutdown()
+    status = scheduler.get_status(job_id)
+    assert status["state"] == COMPLETED
+    assert status["result"] == "/saved/video_whatsapp.mp4"
+
+
+def test_cancel_running_and_queued_jobs():
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_download(job):
+        started.set()
+        release.wait(5)
+        job.progress_callback({"percent": 50.0, "status": "downloading"})
+        return "never.mp4"
+
+    running = scheduler.submit(slow_download)
+    queued = scheduler.submit(lambda job: "queued.mp4")
+    started.wait(5)
+    assert scheduler.cancel(queued)
+    assert scheduler.cancel(running)
+    release.set()
+    scheduler.shutdown()
+    assert scheduler.get_status(queued)["state"] == CANCELLED
+    assert scheduler.get_status(running)["state"] == CANCELLED
+
+
+def test_failed_download_is_reported():
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    job_id = scheduler.submit(lambda job: None)
+    scheduler.shutdown()
+    assert scheduler.get_status(job_id)["state"] == FAILED
+
+
+def test_on_finish_receives_final_snapshot():
+    scheduler = JobScheduler(max_downloads=1, max_post_processing=1)
+    finished = []
+    scheduler.submit(lambda job: None, on_finish=finished.append)
+    scheduler.shutdown()
+    assert [status["state"] for status in finished] == [FAILED]
+
+
+def test_batch_entries_share_the_download_slots():
+    scheduler = JobScheduler(max_downloads=2, max_post_processing=1)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def transfer():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        threading.Event().wait(0.05)
+        with lock:
+            active[0] -= 1
+
+    def batch_entry():
+        with scheduler.download_slot():
+            transfer()
+
+    def batch(job):
+        threads = [threading.Thread(target=batch_entry) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return "batch"
+
+    def single(job):
+        transfer()
+        return "single.mp4"
+
+    batch_id = scheduler.submit(batch, manages_slots=True)
+    single_ids = [scheduler.submit(single) for _ in range(2)]
+    scheduler.shutdown()
+    assert scheduler.get_status(batch_id)["state"] == COMPLETED
+    assert all(scheduler.get_status(job_id)["state"] == COMPLETED for job_id in single_ids)
+    assert peak[0] == 2
@@ -0,0 +1,39 @@
+import time
+
+from utils.metadata_cache import MetadataCache
+
+
+def test_memory_and_disk_hits(tmp_path):
+    db_path = str(tmp_path / "metadata.sqlite3")
+    cache = MetadataCache(db_path=db_path)
+    cache.put("dQw4w9WgXcQ", {"id": "dQw4w9WgXcQ", "title": "Never Gonna Give You Up"})
+    assert cache.get("dQw4w9WgXcQ")["title"] == "Never Gonna Give You Up"
+    assert cache.get_stats()["memory_hits"] == 1
+
+    # A fresh instance only has the on-disk copy
+    reopened = MetadataCache(db_path=db_path)
+    assert reopened.get("dQw4w9WgXcQ")["id"] == "dQw4w9WgXcQ"
+    assert reopened.get_stats()["disk_hits"] == 1
+    assert reopened.get("unknown_id_") is None
+    assert reopened.get_stats()["misses"] == 1
+
+
+def test_lru_eviction_and_ttl(tmp_path):
+    cache = MetadataCache(db_path=str(tmp_path / "m.sqlite3"), memory_size=2, ttl=60)
+    for video_id in ("aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"):
+        cache.put(video_id, {"id": video_id})
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["memory_entries"] == 2
+
+    cache.ttl = -1
+    assert cache.get("ccccccccccc") is None
+    assert cache.get_stats()["expired"] == 1
+
+
+def test_signed_urls_expire_before_metadata(tmp_path):
+    cache = MetadataCache(db_path=str(tmp_path / "m.sqlite3"))
+    expire = int(time.time()) + 30
+    info = {"id": "dQw4w9WgXcQ", "formats": [{"url": f"https://example.googlevideo.com/videoplayback?expire={expire}"}]}
+    cache.put("dQw4w9WgXcQ", info)
+    assert cache.get("dQw4w9WgXcQ") is not None
+    assert cache.get("dQw4w9WgXcQ", fresh_urls=True) is None
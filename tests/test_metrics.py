@@ -0,0 +1,92 @@
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.metrics import (MetricsRegistry, Trace, activate_trace, instrumented, run_command, span,
+                           submit_with_context)
+
+
+def test_nested_spans_record_parent_and_exclusive_time():
+    trace = Trace("job")
+    with activate_trace(trace):
+        with span("download"):
+            with span("merge"):
+                pass
+    spans = {s["stage"]: s for s in trace.to_dict()["spans"]}
+    assert spans["merge"]["parent_id"] == spans["download"]["id"]
+    stage_seconds = trace.to_dict()["stage_seconds"]
+    assert stage_seconds["download"] <= spans["download"]["duration"]
+    assert stage_seconds["download"] >= 0
+
+
+def test_span_outside_a_trace_and_errors():
+    trace = Trace("job")
+    with span("orphan"):
+        pass
+    with activate_trace(trace):
+        with pytest.raises(ValueError):
+            with span("convert"):
+                raise ValueError("boom")
+    (recorded,) = trace.to_dict()["spans"]
+    assert recorded["status"] == "error" and recorded["error"] == "boom"
+
+
+def test_instrumented_marks_failures_and_records_file_size(tmp_path):
+    path = tmp_path / "out.mp4"
+    path.write_bytes(b"x" * 1000)
+
+    @instrumented("brand")
+    def produce(ok):
+        return str(path) if ok else None
+
+    trace = Trace("job")
+    with activate_trace(trace):
+        produce(True)
+        produce(False)
+    first, second = trace.to_dict()["spans"]
+    assert first["bytes"] == 1000 and first["status"] == "ok"
+    assert second["status"] == "failed"
+
+
+def test_run_command_charges_cpu_to_open_spans():
+    trace = Trace("job")
+    with activate_trace(trace):
+        with span("convert"):
+            result = run_command([sys.executable, "-c", "print(sum(range(10 ** 6)))"])
+            with pytest.raises(subprocess.CalledProcessError):
+                run_command([sys.executable, "-c", "import sys; sys.exit(3)"])
+    assert result.stdout.strip() == str(sum(range(10 ** 6))).encode()
+    (recorded,) = trace.to_dict()["spans"]
+    assert recorded["subprocesses"] == 2
+    assert recorded["cpu_user"] + recorded["cpu_system"] > 0
+
+
+def test_pool_workers_keep_the_callers_trace():
+    def segment():
+        with span("segment"):
+            pass
+
+    trace = Trace("job")
+    with ThreadPoolExecutor(max_workers=2) as pool, activate_trace(trace):
+        with span("encode_segments"):
+            for future in [submit_with_context(pool, segment) for _ in range(2)]:
+                future.result()
+    spans = trace.to_dict()["spans"]
+    parent = next(s for s in spans if s["stage"] == "encode_segments")
+    assert [s["parent_id"] for s in spans if s["stage"] == "segment"] == [parent["id"]] * 2
+
+
+def test_prometheus_rendering():
+    registry = MetricsRegistry(buckets=(1, 10))
+    trace = Trace("job")
+    with activate_trace(trace):
+        with span("download") as current:
+            current.add_bytes(2048)
+    for recorded in trace.spans:
+        registry.observe(recorded)
+    text = registry.render_prometheus()
+    assert 'ytd_stage_total{stage="download",status="ok"} 1' in text
+    assert 'ytd_stage_duration_seconds_bucket{stage="download",le="+Inf"} 1' in text
+    assert 'ytd_stage_bytes_total{stage="download"} 2048' in text
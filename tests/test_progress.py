@@ -0,0 +1,25 @@
+from utils.progress import ProgressChannel, format_eta
+
+
+def test_updates_are_coalesced_but_final_status_is_kept():
+    channel = ProgressChannel(capacity=4, min_interval=60)
+    assert channel.publish({"status": "downloading", "downloaded_bytes": 10, "total_bytes": 100}) is not None
+    for downloaded in range(20, 100, 10):
+        assert channel.publish({"status": "downloading", "downloaded_bytes": downloaded, "total_bytes": 100}) is None
+    finished = channel.publish({"status": "finished", "downloaded_bytes": 100, "total_bytes": 100})
+    assert finished["seq"] == 2
+    assert channel.dropped == 8
+    assert [event["seq"] for event in channel.events(since=1)] == [2]
+
+
+def test_speed_eta_and_bytes_across_files():
+    channel = ProgressChannel(min_interval=0)
+    channel.publish({"status": "downloading", "filename": "v.mp4", "downloaded_bytes": 0, "total_bytes": 1000})
+    event = channel.publish({"status": "downloading", "filename": "v.mp4", "downloaded_bytes": 500, "total_bytes": 1000})
+    assert event["speed"] > 0
+    assert event["eta"] is not None
+    channel.publish({"status": "finished", "filename": "v.mp4", "downloaded_bytes": 1000, "total_bytes": 1000})
+    event = channel.publish({"status": "downloading", "filename": "a.m4a", "downloaded_bytes": 50, "total_bytes": 200})
+    assert event["downloaded_bytes"] == 1050
+    assert event["total_bytes"] == 1200
+    assert format_eta(3725) == "1:02:05"
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from utils.search_service import SearchService
+
+
+def test_concurrent_identical_queries_share_one_search():
+    calls = []
+    release = threading.Event()
+
+    def slow_search(query, max_results=5, start=1):
+        calls.append((query, start))
+        release.wait(5)
+        return [{"id": f"{query}-{start + i}"} for i in range(max_results)]
+
+    service = SearchService(search=slow_search, page_size=2, prefetch=False)
+    results = []
+    threads = [threading.Thread(target=lambda q=q: results.append(service.get_page(q)))
+               for q in ("lofi beats", "  LoFi   Beats ", "lofi beats")]
+    for thread in threads:
+        thread.start()
+    while service.get_stats()["coalesced"] < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [("lofi beats", 1)]
+    assert results[0] == results[1] == results[2]
+    assert service.get_page("LOFI BEATS") == results[0]
+    assert service.get_stats()["hits"] == 1
+
+
+def test_next_page_is_prefetched():
+    calls = []
+
+    def search(query, max_results=5, start=1):
+        calls.append(start)
+        return [{"id": str(start + i)} for i in range(max_results)]
+
+    service = SearchService(search=search, page_size=3)
+    assert [entry["id"] for entry in service.get_page("cats")] == ["1", "2", "3"]
+    service.prefetch_page("cats", 1).result(5)
+    assert [entry["id"] for entry in service.get_page("cats", 1)] == ["4", "5", "6"]
+    assert calls[:2] == [1, 4]
+    assert service.get_stats()["prefetches"] >= 1
@@ -0,0 +1,33 @@
+import os
+
+from utils.thumbnail_cache import ThumbnailCache, thumbnail_url_for
+
+
+def test_thumbnail_is_fetched_once_per_video(tmp_path):
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return b"jpeg bytes"
+
+    url = thumbnail_url_for({"id": "dQw4w9WgXcQ"})
+    small = ThumbnailCache(root=str(tmp_path), fetch=fetch).get("dQw4w9WgXcQ", url, 100)
+    # A new instance (e.g. after a restart) is served from the files on disk
+    cache = ThumbnailCache(root=str(tmp_path), fetch=fetch)
+    assert cache.get("dQw4w9WgXcQ", url, 100) == small and os.path.isfile(small)
+    large = cache.get("dQw4w9WgXcQ", url, 200)
+    assert os.path.basename(small) == "100.jpg" and os.path.basename(large) == "200.jpg"
+    assert cache.get_many([("dQw4w9WgXcQ", url)], 90) == [small]
+    assert fetched == [url]
+    assert cache.get_stats() == {"hits": 3, "misses": 0, "errors": 0, "evictions": 0}
+    assert cache.get("../escape", url, 100) is None
+
+
+def test_least_recently_used_videos_are_evicted(tmp_path):
+    cache = ThumbnailCache(root=str(tmp_path), max_bytes=100, fetch=lambda url: b"x" * 40)
+    cache.get("aaaaaaaaaaa", "https://i.ytimg.com/a.jpg", 100)
+    os.utime(tmp_path / "aaaaaaaaaaa", (0, 0))
+    cache.get("bbbbbbbbbbb", "https://i.ytimg.com/b.jpg", 100)
+    assert not (tmp_path / "aaaaaaaaaaa").exists()
+    assert (tmp_path / "bbbbbbbbbbb" / "100.jpg").exists()
+    assert cache.get_stats()["evictions"] == 1
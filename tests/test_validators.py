@@ -0,0 +1,29 @@
+from utils.validators import validate_youtube_url, validate_many, normalize_many, extract_video_id
+
+
+def test_all_url_forms_share_one_matcher():
+    urls = [
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://youtube.com/watch?list=PL123&v=dQw4w9WgXcQ",
+        "https://youtu.be/dQw4w9WgXcQ?t=3",
+        "https://m.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://music.youtube.com/watch?v=dQw4w9WgXcQ",
+        " https://www.youtube.com/shorts/dQw4w9WgXcQ ",
+    ]
+    results = validate_many(urls)
+    assert all(result["valid"] and result["video_id"] == "dQw4w9WgXcQ" for result in results)
+    assert results[-1]["url_type"] == "shorts"
+    assert normalize_many(urls) == ["https://www.youtube.com/watch?v=dQw4w9WgXcQ"] * len(urls)
+
+
+def test_invalid_urls_keep_detailed_errors():
+    assert validate_youtube_url("youtube.com/watch?v=dQw4w9WgXcQ")["error"] == "URL must include http:// or https://"
+    assert validate_youtube_url("https://www.youtube.com/watch?v=short")["error"] == "Invalid YouTube video ID format"
+    assert validate_youtube_url("https://m.youtube.com/shorts/dQw4w9WgXcQ")["valid"] is False
+    assert normalize_many(["https://vimeo.com/1", ""]) == ["https://vimeo.com/1", ""]
+    assert extract_video_id(None) is None
+
+
+def test_memoised_results_cannot_be_mutated_by_callers():
+    validate_youtube_url("https://youtu.be/dQw4w9WgXcQ")["video_id"] = "tampered"
+    assert validate_youtube_url("https://youtu.be/dQw4w9WgXcQ")["video_id"] == "dQw4w9WgXcQ"
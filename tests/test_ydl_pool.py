@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+import yt_dlp
+
+from utils.ydl_pool import YoutubeDLPool
+
+
+class FakeYDL:
+    instances = []
+
+    def __init__(self, params):
+        self.params = dict(params)
+        self.closed = False
+        FakeYDL.instances.append(self)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def reset_instances():
+    FakeYDL.instances = []
+
+
+def test_sessions_are_reused_per_option_set():
+    pool = YoutubeDLPool(factory=FakeYDL)
+    with pool.session({"quiet": True, "outtmpl": "/a/%(title)s", "progress_hooks": [print]}) as first:
+        assert "progress_hooks" not in first.params and "outtmpl" not in first.params
+    with pool.session({"quiet": True, "outtmpl": "/b/%(title)s"}) as second:
+        assert second is first
+    with pool.session({"quiet": False}) as third:
+        assert third is not first
+    assert pool.get_stats() == {"created": 2, "reused": 1, "retired": 0, "idle": 2}
+
+
+def test_overrides_are_restored():
+    pool = YoutubeDLPool(factory=FakeYDL)
+    with pool.session({"quiet": True}, playlist_items="6-10") as ydl:
+        assert ydl.params["playlist_items"] == "6-10"
+    assert ydl.params["playlist_items"] is None
+
+
+def test_concurrent_borrowers_get_separate_instances():
+    pool = YoutubeDLPool(factory=FakeYDL)
+    inside = threading.Barrier(2)
+    borrowed = []
+
+    def borrow():
+        with pool.session({"quiet": True}) as ydl:
+            borrowed.append(ydl)
+            inside.wait(timeout=5)
+
+    threads = [threading.Thread(target=borrow) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert borrowed[0] is not borrowed[1]
+
+
+def test_unhealthy_worn_out_and_surplus_sessions_are_closed():
+    pool = YoutubeDLPool(max_size=1, max_uses=2, factory=FakeYDL)
+    with pytest.raises(yt_dlp.utils.DownloadError):
+        with pool.session({"quiet": True}):
+            raise yt_dlp.utils.DownloadError("Video unavailable")
+    with pytest.raises(OSError):
+        with pool.session({"quiet": True}) as broken:
+            raise OSError("connection reset")
+    assert broken.closed
+    # The second instance retires after max_uses; the third stays pooled
+    for _ in range(3):
+        with pool.session({"quiet": True}):
+            pass
+    assert [ydl.closed for ydl in FakeYDL.instances] == [True, True, False]
+    with pool.session({"a": 1}), pool.session({"b": 1}):
+        pass
+    assert pool.get_stats()["idle"] == 1
+
+
+def test_idle_sessions_expire():
+    pool = YoutubeDLPool(max_idle=0, factory=FakeYDL)
+    with pool.session({"quiet": True}) as first:
+        pass
+    with pool.session({"quiet": True}) as second:
+        assert second is not first
+    assert first.closed
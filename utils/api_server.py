@@ -0,0 +1,322 @@
+import asyncio
+import json
+import logging
+import math
+import os
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs
+from utils.downloader import AUDIO_TARGETS, ENCODER_PROFILES, YouTubeDownloader
+from utils.validators import validate_youtube_url
+from utils.job_queue import get_job_scheduler, COMPLETED
+from utils.download_service import make_download_spec, submit_download, resume_unfinished_jobs
+from utils.search_service import get_search_service
+from utils.metrics import get_metrics
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 64 * 1024
+FILE_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Fields a POST /jobs body may set, mapped onto make_download_spec arguments, with the JSON type each must have
+JOB_FIELDS = {
+    'save_location': (str, 'a string'), 'audio_only': (bool, 'a boolean'), 'format_id': (str, 'a string'),
+    'height': (int, 'an integer'), 'audio_format': (str, 'a string'), 'audio_quality': (str, 'a string'),
+    'whatsapp': (bool, 'a boolean'), 'branding': (bool, 'a boolean'), 'encoder_profile': (str, 'a string'),
+    'title': (str, 'a string'), 'priority': ((int, float), 'a number'),
+}
+
+
+class HttpError(Exception):
+    """Raised by a route handler to answer with an error status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ApiServer:
+    """Minimal asyncio HTTP/JSON front end for the download service.
+
+    Routes::
+
+        GET    /health                  liveness and scheduler stats
+        GET    /info?url=...            video metadata (formats included)
+        GET    /search?q=...&page=0
+        POST   /jobs                    {"url": ..., "save_location": ..., ...} -> 202 {"id": ...}
+                                        (save_location is relative to the default save location)
+        GET    /jobs                    every tracked job
+        GET    /jobs/<id>               job status
+        GET    /jobs/<id>/events?since= buffered progress events
+        GET    /jobs/<id>/file          the finished file
+        GET    /jobs/<id>/trace         per-stage spans of the job
+        GET    /metrics                 stage counters and timings in Prometheus text format
+        DELETE /jobs/<id>               cancel
+
+    Blocking yt-dlp calls run in the default executor; downloads run on the
+    shared JobScheduler, so a request never waits for a download.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, scheduler=None, downloader=None,
+                 default_save_location=None):
+        self.host = host
+        self.port = port
+        self.scheduler = scheduler or get_job_scheduler()
+        self.downloader = downloader or YouTubeDownloader()
+        self.default_save_location = default_save_location or os.path.join(os.path.expanduser('~'), 'Downloads')
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Port 0 asks the OS for a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            # HTTP/1.1 keep-alive: serve requests until the client closes
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    # The body cannot be framed, so the connection cannot be reused
+                    await self._send_json(writer, e.status, {'error': e.message}, False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    if method == 'GET' and urlparse(target).path.endswith('/file'):
+                        await self._send_file(writer, target, keep_alive)
+                    elif method == 'GET' and urlparse(target).path.rstrip('/') == '/metrics':
+                        await self._send_text(writer, get_metrics().render_prometheus(), keep_alive)
+                    else:
+                        status, payload = await self._dispatch(method, target, body)
+                        await self._send_json(writer, status, payload, keep_alive)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {'error': e.message}, keep_alive)
+                except Exception as e:
+                    logger.exception("Error handling %s %s", method, target)
+                    await self._send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}, False)
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Parse one request; returns None once the connection is closed"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise ConnectionError('Malformed request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = self._int_value(headers.get('content-length') or 0, 'Content-Length')
+        if length > MAX_BODY_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    async def _dispatch(self, method, target, body):
+        parsed = urlparse(target)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        parts = [part for part in parsed.path.split('/') if part]
+
+        if parts == ['health'] and method == 'GET':
+            return HTTPStatus.OK, {'status': 'ok', 'scheduler': self.scheduler.get_stats(),
+                                   'bandwidth': self.downloader.bandwidth.get_stats()}
+        if parts == ['info'] and method == 'GET':
+            return HTTPStatus.OK, await self._video_info(query.get('url'))
+        if parts == ['search'] and method == 'GET':
+            if not query.get('q'):
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Missing 'q' parameter")
+            page = self._int_value(query.get('page', 0), 'page')
+            entries = await self._run_blocking(get_search_service().get_page, query['q'], page)
+            return HTTPStatus.OK, {'results': entries, 'page': page}
+        if parts == ['jobs']:
+            if method == 'GET':
+                return HTTPStatus.OK, {'jobs': self.scheduler.list_jobs()}
+            if method == 'POST':
+                return HTTPStatus.ACCEPTED, {'id': await self._submit_job(self._parse_json(body))}
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job_id = parts[1]
+            status = self.scheduler.get_status(job_id)
+            if status is None:
+                raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown job {job_id}")
+            if len(parts) == 2 and method == 'GET':
+                return HTTPStatus.OK, status
+            if len(parts) == 2 and method == 'DELETE':
+                return HTTPStatus.OK, {'cancelled': self.scheduler.cancel(job_id)}
+            if parts[2:] == ['events'] and method == 'GET':
+                since = self._int_value(query.get('since', 0), 'since')
+                return HTTPStatus.OK, {'events': self.scheduler.get_progress_events(job_id, since)}
+            if parts[2:] == ['trace'] and method == 'GET':
+                return HTTPStatus.OK, self.scheduler.get_trace(job_id)
+        raise HttpError(HTTPStatus.NOT_FOUND, f"No route for {method} {parsed.path}")
+
+    async def _video_info(self, url):
+        validation = validate_youtube_url(url or '')
+        if not validation['valid']:
+            raise HttpError(HTTPStatus.BAD_REQUEST, validation['error'])
+        info = await self._run_blocking(self.downloader.get_video_info, url)
+        if not info:
+            raise HttpError(HTTPStatus.BAD_GATEWAY, "Failed to fetch video information")
+        info['format_ladder'] = info['format_ladder'].as_dicts()
+        return info
+
+    async def _submit_job(self, payload):
+        url = payload.get('url')
+        validation = validate_youtube_url(url if isinstance(url, str) else '')
+        if not validation['valid']:
+            raise HttpError(HTTPStatus.BAD_REQUEST, validation['error'])
+        options = self._job_options(payload)
+        options['save_location'] = self._save_location(options.get('save_location'))
+        spec = make_download_spec(url, video_id=validation.get('video_id'), **options)
+        # Journal writes and staging directory setup block
+        return await self._run_blocking(partial(submit_download, scheduler=self.scheduler), spec)
+
+    @staticmethod
+    def _job_options(payload):
+        """Type- and range-check the JOB_FIELDS of a POST /jobs body; null means the default"""
+        options = {}
+        for key, (types, description) in JOB_FIELDS.items():
+            value = payload.get(key)
+            if value is None:
+                continue
+            # bool is an int subclass, but true is not a height
+            if not isinstance(value, types) or (isinstance(value, bool) and types is not bool):
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"'{key}' must be {description}")
+            options[key] = value
+        if 'height' in options and options['height'] <= 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "'height' must be positive")
+        if 'priority' in options and not (math.isfinite(options['priority']) and options['priority'] > 0):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "'priority' must be a positive number")
+        if 'audio_format' in options and options['audio_format'].lower() not in AUDIO_TARGETS:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"'audio_format' must be one of {', '.join(AUDIO_TARGETS)}")
+        if 'encoder_profile' in options and options['encoder_profile'] not in ENCODER_PROFILES:
+            raise HttpError(HTTPStatus.BAD_REQUEST,
+                            f"'encoder_profile' must be one of {', '.join(ENCODER_PROFILES)}")
+        return options
+
+    def _save_location(self, requested):
+        """Resolve a requested save location, which must stay inside the default save location"""
+        root = os.path.realpath(self.default_save_location)
+        if not requested:
+            return root
+        if not isinstance(requested, str):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "'save_location' must be a string")
+        path = os.path.realpath(os.path.join(root, requested))
+        if os.path.commonpath([root, path]) != root:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"'save_location' must be inside {root}")
+        return path
+
+    async def _send_file(self, writer, target, keep_alive):
+        parts = [part for part in urlparse(target).path.split('/') if part]
+        status = self.scheduler.get_status(parts[1]) if len(parts) == 3 and parts[0] == 'jobs' else None
+        if status is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "Unknown job")
+        if status['state'] != COMPLETED or not status['result'] or not os.path.isfile(status['result']):
+            raise HttpError(HTTPStatus.CONFLICT, f"Job is {status['state']}, no file available")
+        path = status['result']
+        size = os.path.getsize(path)
+        name = os.path.basename(path).replace('"', '')
+        writer.write(self._head(HTTPStatus.OK, 'application/octet-stream', size, keep_alive,
+                                {'Content-Disposition': f'attachment; filename="{name}"'}))
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+    async def _send_json(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        writer.write(self._head(status, 'application/json', len(body), keep_alive) + body)
+        await writer.drain()
+
+    async def _send_text(self, writer, text, keep_alive):
+        body = text.encode('utf-8')
+        writer.write(self._head(HTTPStatus.OK, 'text/plain; version=0.0.4; charset=utf-8', len(body), keep_alive) + body)
+        await writer.drain()
+
+    @staticmethod
+    def _head(status, content_type, length, keep_alive, extra_headers=None):
+        status = HTTPStatus(status)
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {length}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines += [f"{name}: {value}" for name, value in (extra_headers or {}).items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    @staticmethod
+    def _parse_json(body):
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(payload, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        return payload
+
+    @staticmethod
+    def _int_value(value, name):
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer")
+        if number < 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"'{name}' must not be negative")
+        return number
+
+    @staticmethod
+    async def _run_blocking(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, partial(fn, *args))
+
+
+def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, default_save_location=None):
+    """Serve the API until interrupted, resuming any journaled jobs first"""
+    resumed = resume_unfinished_jobs()
+    if resumed:
+        print(f"Resumed {len(resumed)} interrupted download(s)")
+    server = ApiServer(host, port, default_save_location=default_save_location)
+
+    async def main():
+        await server.start()
+        print(f"Serving on http://{server.host}:{server.port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,349 @@
+import os
+import hashlib
+import json
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from utils.file_manager import FileManager, link_or_copy
+from utils.metrics import span
+
+DEFAULT_STORE_ROOT = str(Path.home() / ".cache" / "youtube_downloader" / "artifacts")
+
+class ArtifactStore:
+    """Content-addressed store of finished downloads and post-processed outputs.
+
+    Artifacts are keyed by (video id, format selector, post-processing recipe)
+    and kept under ``root`` up to ``max_bytes``, evicting the least recently
+    used first; artifacts held by a pipeline that has not delivered yet are
+    never evicted. Staging directories live under the same root so that
+    publishing into the store is a rename and staging a stored file for
+    further processing is a hardlink.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_ROOT, max_bytes=10 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, 'objects')
+        self.staging_root = os.path.join(root, 'staging')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.staging_root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pinned = set()
+        # key -> number of pipelines that may still read or deliver it
+        self._held = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes_evicted': 0, 'bytes_stored': 0}
+
+    @staticmethod
+    def make_key(video_id, format_key, recipe=()):
+        """Hash the identifying parts of an artifact into a store key"""
+        payload = json.dumps([video_id, format_key, list(recipe)], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the stored file path for key, or None on a miss"""
+        key_dir = self._key_dir(key)
+        path = self._artifact_in(key_dir)
+        with self._lock:
+            if path is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+        try:
+            # mtime of the key directory is the LRU clock
+            os.utime(key_dir)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key, source_path):
+        """Move a finished file into the store and return its stored path.
+        
+        If another process published the key first, its artifact is returned
+        and source_path is discarded.
+        """
+        key_dir = self._key_dir(key)
+        existing = self._artifact_in(key_dir)
+        if existing:
+            return existing
+        tmp_dir = os.path.join(self.staging_root, f"publish_{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            staged = os.path.join(tmp_dir, os.path.basename(source_path))
+            shutil.move(source_path, staged)
+            os.makedirs(os.path.dirname(key_dir), exist_ok=True)
+            # Publishing the whole directory keeps readers from seeing a partial file
+            try:
+                os.replace(tmp_dir, key_dir)
+            except OSError:
+                existing = self._artifact_in(key_dir)
+                if not existing:
+                    raise
+                return existing
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        stored = self._artifact_in(key_dir)
+        with self._lock:
+            self.stats['bytes_stored'] += os.path.getsize(stored) if stored else 0
+        # The caller is about to use this artifact, even if it alone exceeds max_bytes
+        self.evict(keep=(key,))
+        return stored
+
+    def fetch_or_create(self, key, create):
+        """Return the stored artifact for key, running create() -> path only on a miss.
+
+        Concurrent callers with the same key wait for the first one instead of
+        producing the same artifact twice.
+        """
+        with self._key_lock(key):
+            stored = self.get(key)
+            if stored:
+                return stored
+            path = create()
+            if not path or not os.path.exists(path):
+                return None
+            return self.put(key, path)
+
+    def materialize(self, stored_path, destination_path):
+        """Expose a stored artifact at destination_path without copying when possible"""
+        return link_or_copy(stored_path, destination_path)
+
+    def shares_filesystem(self, path):
+        """Whether path is on the store's filesystem, so files move between them by rename or hardlink"""
+        try:
+            return os.stat(path).st_dev == os.stat(self.root).st_dev
+        except OSError:
+            return False
+
+    def create_staging_directory(self, prefix='job_'):
+        """Create a work directory on the same filesystem as the store"""
+        path = os.path.join(self.staging_root, f"{prefix}{uuid.uuid4().hex}")
+        os.makedirs(path)
+        return path
+
+    def pin(self, path):
+        """Keep a staging directory with a journaled job in it from being pruned"""
+        with self._lock:
+            self._pinned.add(os.path.abspath(path))
+
+    def unpin(self, path):
+        with self._lock:
+            self._pinned.discard(os.path.abspath(path))
+
+    def hold(self, key):
+        """Protect key from eviction until release(key), e.g. between fetching and delivering it"""
+        with self._lock:
+            self._held[key] = self._held.get(key, 0) + 1
+
+    def release(self, key):
+        with self._lock:
+            count = self._held.get(key, 0) - 1
+            if count > 0:
+                self._held[key] = count
+            else:
+                self._held.pop(key, None)
+
+    def evict(self, keep=()):
+        """Delete least recently used artifacts until the store fits in max_bytes.
+        
+        Held keys and those in keep are skipped, so the store can stay over
+        the cap until they are released.
+        """
+        self._prune_staging()
+        with self._lock:
+            protected = set(self._held) | set(keep)
+        entries = []
+        total = 0
+        for shard in os.scandir(self.objects_dir):
+            if not shard.is_dir():
+                continue
+            for key_dir in os.scandir(shard.path):
+                size = sum(f.stat().st_size for f in os.scandir(key_dir.path) if f.is_file())
+                entries.append((key_dir.stat().st_mtime, size, key_dir.path))
+                total += size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.basename(path) in protected:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.stats['evictions'] += 1
+                self.stats['bytes_evicted'] += size
+        return total
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def cached_pipeline(self, video_id, format_key, download, steps=(), staging_dir=None):
+        """Wrap a download and its post-processing steps so every stage goes through the store"""
+        return CachedPipeline(self, video_id, format_key, download, steps, staging_dir)
+
+    def _prune_staging(self, max_age=24 * 3600):
+        """Remove staging directories abandoned by failed or cancelled jobs"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            pinned = set(self._pinned)
+        for entry in os.scandir(self.staging_root):
+            if os.path.abspath(entry.path) in pinned:
+                continue
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                continue
+
+    def _key_dir(self, key):
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def _artifact_in(self, key_dir):
+        try:
+            files = [f.path for f in os.scandir(key_dir) if f.is_file()]
+        except FileNotFoundError:
+            return None
+        return files[0] if files else None
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+
+class CachedPipeline:
+    """A download plus named post-processing steps, each stage cached in an ArtifactStore.
+
+    ``download(job, output_dir)`` and every ``step(path)`` work in a staging
+    directory; their outputs are published to the store. When a later stage
+    is already stored the pipeline starts from there, so a full hit does no
+    network or ffmpeg work at all. Passing the ``staging_dir`` of an
+    interrupted run lets the download continue from its partial files.
+    The pipeline holds its keys in the store until cleanup().
+    """
+
+    def __init__(self, store, video_id, format_key, download, steps=(), staging_dir=None):
+        if not video_id:
+            raise ValueError("A video id is required to cache a download")
+        self.store = store
+        self.download_fn = download
+        self.step_fns = [fn for _, fn in steps]
+        names = [name for name, _ in steps]
+        self.keys = [store.make_key(video_id, format_key, names[:i]) for i in range(len(names) + 1)]
+        for key in self.keys:
+            store.hold(key)
+        self._released = False
+        if staging_dir:
+            os.makedirs(staging_dir, exist_ok=True)
+        self.staging_dir = staging_dir or store.create_staging_directory()
+        self.start_stage = 0
+
+    def download(self, job):
+        # Resume from the deepest stage already in the store
+        for stage in range(len(self.keys) - 1, 0, -1):
+            stored = self.store.get(self.keys[stage])
+            if stored:
+                self.start_stage = stage
+                return stored
+        return self.store.fetch_or_create(self.keys[0], lambda: self.download_fn(job, self.staging_dir))
+
+    @property
+    def steps(self):
+        return [self._wrap_step(index, fn) for index, fn in enumerate(self.step_fns)]
+
+    def pin(self):
+        """Keep the staging directory while the journal may resume into it"""
+        self.store.pin(self.staging_dir)
+
+    def unpin(self):
+        self.store.unpin(self.staging_dir)
+
+    def deliver(self, stored_path, destination_folder):
+        """Link the final artifact into destination_folder and drop the staging directory"""
+        destination = os.path.join(destination_folder, os.path.basename(stored_path))
+        with span('finalise') as current:
+            current.attrs['method'] = self.store.materialize(stored_path, destination)
+            current.add_bytes(os.path.getsize(destination))
+        self.cleanup()
+        return destination
+
+    def cleanup(self):
+        self.store.unpin(self.staging_dir)
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        if not self._released:
+            self._released = True
+            for key in self.keys:
+                self.store.release(key)
+
+    def _wrap_step(self, index, fn):
+        def cached_step(path):
+            if index + 1 <= self.start_stage:
+                return path
+            def create():
+                # Work on a hardlink so ffmpeg's outputs land in staging, not in the store
+                staged = os.path.join(self.staging_dir, os.path.basename(path))
+                if not os.path.exists(staged):
+                    link_or_copy(path, staged)
+                return fn(staged)
+            return self.store.fetch_or_create(self.keys[index + 1], create)
+        return cached_step
+
+
+class DirectPipeline:
+    """A download plus post-processing steps staged next to the destination, bypassing the store.
+
+    Used when the save location is on another filesystem than the store:
+    publishing into the store and delivering from it would each copy the
+    whole file, so the job is staged on the destination's filesystem and
+    delivered with a rename. Nothing is cached.
+    """
+
+    def __init__(self, download, steps=(), destination_dir=None, staging_dir=None, file_manager=None):
+        self.download_fn = download
+        self.file_manager = file_manager or FileManager()
+        if staging_dir:
+            # Resuming: a restarted process has to track the directory again
+            os.makedirs(staging_dir, exist_ok=True)
+            self.file_manager.janitor.register(staging_dir)
+        self.staging_dir = staging_dir or self.file_manager.create_staging_directory(destination_dir, prefix='job_')
+        self.steps = [fn for _, fn in steps]
+
+    def pin(self):
+        """Keep the staging directory from the janitor while the journal may resume into it"""
+        self.file_manager.janitor.pin(self.staging_dir)
+
+    def unpin(self):
+        self.file_manager.janitor.unpin(self.staging_dir)
+
+    def download(self, job):
+        return self.download_fn(job, self.staging_dir)
+
+    def deliver(self, path, destination_folder):
+        """Rename the finished file into destination_folder and drop the staging directory"""
+        destination = os.path.join(destination_folder, os.path.basename(path))
+        if not self.file_manager.finalize_file(path, destination):
+            raise OSError(f"Could not deliver {path} to {destination_folder}")
+        self.cleanup()
+        return destination
+
+    def cleanup(self):
+        self.file_manager.remove_staging_directory(self.staging_dir)
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Return the process-wide ArtifactStore, capped by YTD_ARTIFACT_MAX_GB (default 10)"""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            max_gb = float(os.environ.get('YTD_ARTIFACT_MAX_GB', 10))
+            _shared_store = ArtifactStore(max_bytes=int(max_gb * 1024 ** 3))
+        return _shared_store
@@ -0,0 +1,220 @@
+import os
+import re
+import threading
+import time
+
+# No job is squeezed below this, so a crowded host still makes progress everywhere
+MIN_RATE = 32 * 1024
+
+# A lease is treated as limited by the server (not by us) when it uses less than this share of its rate
+UNDERUSE_RATIO = 0.75
+# Headroom given above the measured speed of such a lease, so it can climb back up
+DEMAND_HEADROOM = 1.25
+# Speed samples closer together than this do not trigger a rebalance
+REBALANCE_INTERVAL = 2.0
+
+# yt-dlp protocols fetched by its fragment downloader, where every worker has its own ratelimit
+FRAGMENTED_PROTOCOLS = ('http_dash_segments', 'http_dash_segments_generator', 'm3u8_native', 'ism', 'f4m')
+
+_RATE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?(?:/s)?\s*$', re.IGNORECASE)
+_RATE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(value):
+    """Parse a rate such as 500K, 2.5M or 1048576 into bytes per second; empty means unlimited"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else None
+    match = _RATE_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid rate: {value!r}")
+    rate = int(float(match.group(1)) * _RATE_UNITS[match.group(2).lower()])
+    return rate or None
+
+
+def is_fragmented(fmt):
+    """Whether yt-dlp downloads this format dict in fragments (DASH/HLS) rather than as one stream"""
+    return bool(fmt.get('fragments')) or fmt.get('protocol') in FRAGMENTED_PROTOCOLS
+
+
+class BandwidthLease:
+    """One job's share of the host bandwidth, pushed into the yt-dlp params it is attached to.
+
+    yt-dlp's HTTP downloader reads ratelimit from the params on every block, so
+    rebalancing reaches progressive downloads while they run. The DASH/HLS
+    fragment downloader copies the params when it starts and applies the
+    limit to each fragment worker separately: once set_fragmented(True) says
+    the selected formats are fragmented, the rate is divided by
+    concurrent_fragment_downloads, and stays fixed from the download's start.
+    """
+
+    def __init__(self, manager, priority, name):
+        self.manager = manager
+        self.priority = priority
+        self.name = name
+        self.rate = None
+        self.speed = None
+        self._params = []
+        self.fragmented = False
+        self._last_sample = 0.0
+        self.released = False
+
+    def attach(self, params):
+        """Keep ratelimit/throttledratelimit in this yt-dlp params dict in step with the lease"""
+        with self.manager._lock:
+            self._params.append(params)
+            self._apply(params)
+
+    def set_fragmented(self, fragmented):
+        """Record whether the selected formats are fragmented; call before the download starts"""
+        with self.manager._lock:
+            self.fragmented = fragmented
+            for params in self._params:
+                self._apply(params)
+
+    def observe(self, speed):
+        """Record the measured download speed; rebalances at most every REBALANCE_INTERVAL"""
+        if not speed:
+            return
+        now = time.monotonic()
+        with self.manager._lock:
+            self.speed = speed
+            if now - self._last_sample < REBALANCE_INTERVAL:
+                return
+            self._last_sample = now
+            self.manager._rebalance()
+
+    def progress_hook(self, d):
+        if d.get('status') == 'downloading':
+            self.observe(d.get('speed'))
+
+    def release(self):
+        self.manager.release(self)
+
+    def _apply(self, params):
+        rate = self.rate
+        if rate and self.fragmented:
+            # Every concurrent fragment worker is limited on its own
+            rate //= max(int(params.get('concurrent_fragment_downloads') or 1), 1)
+        params['ratelimit'] = rate
+        if self.manager.throttled_rate:
+            # Must stay under our own limit, or yt-dlp would take it for server throttling
+            params['throttledratelimit'] = (
+                min(self.manager.throttled_rate, rate // 2) if rate else self.manager.throttled_rate
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class BandwidthManager:
+    """Splits a host-wide download cap between active jobs in proportion to their priority.
+
+    Shares are recomputed whenever a job starts or finishes and as speeds are
+    measured: a job the server serves slower than its share keeps only what it
+    uses, and the rest goes to the others (weighted max-min fairness). With no
+    cap every lease is unlimited.
+    """
+
+    def __init__(self, total_rate=None, min_rate=MIN_RATE, throttled_rate=None):
+        self.total_rate = total_rate
+        self.min_rate = min_rate
+        self.throttled_rate = throttled_rate
+        self._lock = threading.Lock()
+        self._leases = []
+
+    def lease(self, priority=1.0, name=None):
+        """Register an active transfer and return its BandwidthLease"""
+        lease = BandwidthLease(self, max(float(priority or 1.0), 0.01), name)
+        with self._lock:
+            self._leases.append(lease)
+            self._rebalance()
+        return lease
+
+    def release(self, lease):
+        with self._lock:
+            if lease.released:
+                return
+            lease.released = True
+            self._leases.remove(lease)
+            lease._params.clear()
+            self._rebalance()
+
+    def set_total_rate(self, total_rate):
+        """Change the cap (bytes/second, None for unlimited) and rebalance running jobs"""
+        with self._lock:
+            self.total_rate = total_rate
+            self._rebalance()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'total_rate': self.total_rate,
+                'active': [
+                    {'name': lease.name, 'priority': lease.priority, 'rate': lease.rate, 'speed': lease.speed}
+                    for lease in self._leases
+                ],
+            }
+
+    def _rebalance(self):
+        """Water-fill the cap across leases; caller holds the lock"""
+        rates = self._allocate()
+        for lease in self._leases:
+            lease.rate = rates.get(id(lease))
+            for params in lease._params:
+                lease._apply(params)
+
+    def _allocate(self):
+        if not self.total_rate or not self._leases:
+            return {}
+        demands = {}
+        for lease in self._leases:
+            if lease.rate and lease.speed and lease.speed < lease.rate * UNDERUSE_RATIO:
+                demands[id(lease)] = lease.speed * DEMAND_HEADROOM
+        rates = {}
+        remaining = float(self.total_rate)
+        pending = list(self._leases)
+        # Leases that want less than their weighted share are settled first; repeat until none do
+        while pending:
+            weight = sum(lease.priority for lease in pending)
+            satisfied = [
+                lease for lease in pending
+                if demands.get(id(lease), float('inf')) <= remaining * lease.priority / weight
+            ]
+            if not satisfied:
+                break
+            for lease in satisfied:
+                rates[id(lease)] = demands[id(lease)]
+                remaining -= demands[id(lease)]
+                pending.remove(lease)
+        # Whatever is left goes to the unsettled leases, or back to everyone if all are settled
+        receivers = pending or self._leases
+        weight = sum(lease.priority for lease in receivers)
+        for lease in receivers:
+            rates[id(lease)] = rates.get(id(lease), 0.0) + remaining * lease.priority / weight
+        return {key: max(int(rate), self.min_rate) for key, rate in rates.items()}
+
+
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_bandwidth_manager():
+    """Return the process-wide BandwidthManager.
+
+    YTD_BANDWIDTH_LIMIT caps total download speed (e.g. 5M); YTD_THROTTLED_RATE
+    sets yt-dlp's throttling detection threshold.
+    """
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = BandwidthManager(
+                total_rate=parse_rate(os.environ.get('YTD_BANDWIDTH_LIMIT')),
+                throttled_rate=parse_rate(os.environ.get('YTD_THROTTLED_RATE')),
+            )
+        return _shared_manager
@@ -0,0 +1,129 @@
+"""Command line entry point: python -m utils.cli {info,search,download,serve} ..."""
+import argparse
+import json
+import os
+import sys
+import time
+from utils.downloader import YouTubeDownloader, search_youtube
+from utils.validators import validate_youtube_url
+from utils.job_queue import get_job_scheduler, COMPLETED, FINISHED_STATES
+from utils.download_service import make_download_spec, submit_download
+from utils.api_server import DEFAULT_HOST, DEFAULT_PORT, run_server
+from utils.bandwidth import get_bandwidth_manager, parse_rate
+
+
+def cmd_info(args):
+    info = YouTubeDownloader().get_video_info(args.url)
+    if not info:
+        print("Failed to fetch video information", file=sys.stderr)
+        return 1
+    info['format_ladder'] = info['format_ladder'].as_dicts()
+    if not args.formats:
+        info.pop('formats', None)
+    print(json.dumps(info, indent=2, default=str))
+    return 0
+
+
+def cmd_search(args):
+    for entry in search_youtube(args.query, args.max_results):
+        url = entry.get('url') or f"https://www.youtube.com/watch?v={entry.get('id')}"
+        print(f"{entry.get('title', 'Unknown')}\t{url}")
+    return 0
+
+
+def cmd_download(args):
+    scheduler = get_job_scheduler()
+    exit_code = 0
+    job_ids = []
+    for url in args.urls:
+        validation = validate_youtube_url(url)
+        if not validation['valid']:
+            print(f"{url}: {validation['error']}", file=sys.stderr)
+            exit_code = 1
+            continue
+        spec = make_download_spec(
+            url, args.output, audio_only=args.audio, format_id=args.format, height=args.height,
+            audio_format=args.audio_format, audio_quality=args.audio_quality,
+            whatsapp=args.whatsapp, branding=args.branding, encoder_profile=args.profile,
+            video_id=validation['video_id'], priority=args.priority
+        )
+        job_ids.append(submit_download(spec, scheduler=scheduler))
+    # Poll until every job finishes, printing a status line per change
+    last_status = {}
+    pending = list(job_ids)
+    while pending:
+        for job_id in list(pending):
+            status = scheduler.get_status(job_id)
+            if status['status'] != last_status.get(job_id):
+                last_status[job_id] = status['status']
+                print(f"[{job_id[:8]}] {status['description']}: {status['status']}", file=sys.stderr)
+            if status['state'] in FINISHED_STATES:
+                pending.remove(job_id)
+                if status['state'] == COMPLETED:
+                    print(status['result'])
+                else:
+                    exit_code = 1
+        time.sleep(0.5)
+    scheduler.shutdown()
+    return exit_code
+
+
+def cmd_serve(args):
+    run_server(args.host, args.port, default_save_location=args.output)
+    return 0
+
+
+def rate_argument(value):
+    try:
+        return parse_rate(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m utils.cli', description='Headless YouTube downloader')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info = subparsers.add_parser('info', help='Print video metadata as JSON')
+    info.add_argument('url')
+    info.add_argument('--formats', action='store_true', help='Include the full format list')
+    info.set_defaults(func=cmd_info)
+
+    search = subparsers.add_parser('search', help='Search YouTube')
+    search.add_argument('query')
+    search.add_argument('-n', '--max-results', type=int, default=5)
+    search.set_defaults(func=cmd_search)
+
+    download = subparsers.add_parser('download', help='Download one or more videos and print the saved paths')
+    download.add_argument('urls', nargs='+')
+    download.add_argument('-o', '--output', default=os.getcwd(), help='Save location')
+    download.add_argument('-f', '--format', help='yt-dlp format id for the video stream')
+    download.add_argument('--height', type=int, help='Maximum height used for WhatsApp conversion')
+    download.add_argument('--audio', action='store_true', help='Download audio only')
+    download.add_argument('--audio-format', default='mp3')
+    download.add_argument('--audio-quality', default='best')
+    download.add_argument('--whatsapp', action='store_true', help='Convert to WhatsApp shareable MP4')
+    download.add_argument('--branding', action='store_true', help='Add intro.mp4/outro.mp4 branding')
+    download.add_argument('--profile', default='balanced', choices=YouTubeDownloader.get_encoder_profiles())
+    download.add_argument('--priority', type=float, help='Bandwidth weight (default 1, 2 for audio)')
+    download.add_argument('--limit-rate', type=rate_argument, help='Total download speed cap, e.g. 2M')
+    download.set_defaults(func=cmd_download)
+
+    serve = subparsers.add_parser('serve', help='Run the HTTP/JSON API')
+    serve.add_argument('--host', default=DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('-o', '--output', help='Save location for submitted jobs; their save_location must stay inside it')
+    serve.add_argument('--limit-rate', type=rate_argument, help='Total download speed cap, e.g. 2M')
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'limit_rate', None):
+        get_bandwidth_manager().set_total_rate(args.limit_rate)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
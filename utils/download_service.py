@@ -0,0 +1,152 @@
+import os
+import threading
+from pathlib import Path
+from utils.downloader import YouTubeDownloader
+from utils.validators import validate_youtube_url
+from utils.job_queue import get_job_scheduler, COMPLETED, FAILED, CANCELLED
+from utils import job_journal
+from utils.job_journal import get_job_journal
+from utils.artifact_store import DirectPipeline, get_artifact_store
+
+BRANDING_INTRO = 'intro.mp4'
+BRANDING_OUTRO = 'outro.mp4'
+
+# Default bandwidth weight of audio-only jobs, so short audio downloads finish quickly next to large videos
+AUDIO_PRIORITY = 2.0
+
+# Scheduler end states mapped onto journal states
+JOURNAL_STATES = {COMPLETED: job_journal.COMPLETED, FAILED: job_journal.FAILED, CANCELLED: job_journal.CANCELLED}
+
+
+def make_download_spec(url, save_location, audio_only=False, format_id=None, height=None,
+                       audio_format='mp3', audio_quality='best', whatsapp=False, branding=False,
+                       encoder_profile='balanced', video_id=None, title=None, priority=None):
+    """Describe a single download as a plain dict that can be journaled and replayed"""
+    return {
+        'url': url,
+        'save_location': save_location,
+        'audio_only': audio_only,
+        'format_id': format_id,
+        'height': height,
+        'audio_format': audio_format,
+        'audio_quality': audio_quality,
+        'whatsapp': whatsapp,
+        'branding': branding,
+        'encoder_profile': encoder_profile,
+        'video_id': video_id or validate_youtube_url(url).get('video_id'),
+        'title': title or url,
+        'priority': priority or (AUDIO_PRIORITY if audio_only else 1.0),
+    }
+
+
+def submit_download(spec, scheduler=None, journal=None, store=None, journal_id=None, staging_dir=None,
+                    file_manager=None):
+    """Queue the download described by spec and return its scheduler job id.
+
+    The job is written to the journal before it is queued and its staging
+    directory pinned until it finishes; passing the journal_id and
+    staging_dir of an interrupted entry resumes it in place.
+    """
+    scheduler = scheduler or get_job_scheduler()
+    journal = journal or get_job_journal()
+    store = store or get_artifact_store()
+    downloader = YouTubeDownloader(encoder_profile=spec['encoder_profile'])
+    url = spec['url']
+    # Specs journaled before priorities existed have none
+    priority = spec.get('priority') or 1.0
+    steps = []
+    if not spec['audio_only']:
+        format_id = spec['format_id']
+        format_selector = None
+        if spec['whatsapp']:
+            # Prefer H.264/AAC streams so the conversion can be a remux
+            format_selector = downloader.whatsapp_format_selector(min(spec['height'] or 720, 720))
+        format_key = format_selector or format_id
+        def download(job, output_dir):
+            return downloader.download_video(url, output_dir, format_id, job.progress_callback,
+                                             format_selector=format_selector, priority=priority)
+        # WhatsApp conversion and branding run as one post-processing pass
+        if spec['whatsapp'] or spec['branding']:
+            intro_path = BRANDING_INTRO if spec['branding'] else None
+            outro_path = BRANDING_OUTRO if spec['branding'] else None
+            recipe = []
+            if spec['whatsapp']:
+                recipe.append(f"whatsapp:{spec['encoder_profile']}")
+            if spec['branding']:
+                recipe.append('branding:' + ':'.join(
+                    str(os.path.getmtime(asset)) if os.path.exists(asset) else '-' for asset in (intro_path, outro_path)
+                ))
+            steps.append(('+'.join(recipe), lambda path: downloader.post_process(
+                path, spec['whatsapp'], intro_path, outro_path, delete_input=True
+            )))
+    else:
+        audio_format = spec['audio_format'].lower()
+        format_key = f"audio:{audio_format}:{spec['audio_quality']}"
+        def download(job, output_dir):
+            return downloader.download_audio(url, output_dir, audio_format, spec['audio_quality'], job.progress_callback,
+                                             priority=priority)
+
+    save_location = spec['save_location']
+    os.makedirs(save_location, exist_ok=True)
+    if store.shares_filesystem(save_location):
+        # Identical (video, format, post-processing) requests are served from the artifact store
+        pipeline = store.cached_pipeline(spec['video_id'], format_key, download, steps, staging_dir=staging_dir)
+    else:
+        # Caching would copy the file across filesystems; stage beside the destination instead
+        pipeline = DirectPipeline(download, steps, save_location, staging_dir=staging_dir, file_manager=file_manager)
+    if journal_id is None:
+        journal_id = journal.record(url, spec, pipeline.staging_dir, format_key)
+    pipeline.pin()
+
+    def journaled_download(job):
+        journal.mark_running(journal_id)
+        return pipeline.download(job)
+
+    def finalize(stored_path):
+        # Link file into user-specified location
+        dest_folder = Path(spec['save_location'])
+        dest_folder.mkdir(parents=True, exist_ok=True)
+        return pipeline.deliver(stored_path, str(dest_folder))
+
+    def on_finish(status):
+        pipeline.unpin()
+        if status['state'] != COMPLETED:
+            pipeline.cleanup()
+        journal.mark_finished(journal_id, JOURNAL_STATES[status['state']], status['result'], status['error'])
+
+    return scheduler.submit(
+        journaled_download,
+        post_process=pipeline.steps,
+        finalize=finalize,
+        description=spec['title'],
+        on_finish=on_finish
+    )
+
+
+_resume_lock = threading.Lock()
+_resumed = None
+
+
+def resume_unfinished_jobs(scheduler=None, journal=None, store=None, file_manager=None):
+    """Requeue jobs the journal still shows as pending or running, once per process.
+
+    Their staging directories still hold yt-dlp's .part files, so the
+    downloads continue from where the previous process stopped.
+    """
+    global _resumed
+    with _resume_lock:
+        if _resumed is not None:
+            return _resumed
+        journal = journal or get_job_journal()
+        _resumed = []
+        for entry in journal.unfinished():
+            try:
+                job_id = submit_download(entry['spec'], scheduler, journal, store,
+                                         journal_id=entry['id'], staging_dir=entry['staging_path'],
+                                         file_manager=file_manager)
+                _resumed.append(job_id)
+            except Exception as e:
+                print(f"Error resuming job {entry['id']}: {str(e)}")
+                journal.mark_finished(entry['id'], job_journal.FAILED, error=str(e))
+        journal.purge()
+        return _resumed
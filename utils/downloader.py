@@ -1,14 +1,117 @@
-import yt_dlp
 import os
+import copy
+import hashlib
+import json
 import tempfile
-import subprocess
-import re
+import shutil
 from pathlib import Path
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from utils.validators import extract_video_id, is_youtube_playlist
+from utils.metadata_cache import get_metadata_cache
+from utils.format_ladder import get_format_ladder
+from utils.metrics import instrumented, run_command, span, submit_with_context
+from utils.bandwidth import get_bandwidth_manager, is_fragmented
+from utils.ydl_pool import get_ydl_pool
+
+# Intro/outro clips pre-encoded to match downloaded videos, reused across jobs
+BRANDING_CACHE_DIR = str(Path.home() / ".cache" / "youtube_downloader" / "branding")
+
+# libx264 speed/quality trade-offs; threads=0 lets x264 pick from the core count
+ENCODER_PROFILES = {
+    'fast': {'preset': 'veryfast', 'crf': 26, 'threads': 0},
+    'balanced': {'preset': 'fast', 'crf': 23, 'threads': 0},
+    'quality': {'preset': 'slow', 'crf': 20, 'threads': 0},
+}
+
+# Videos shorter than this are encoded in one process; splitting costs more than it saves
+SEGMENT_MIN_DURATION = 300
+SEGMENT_LENGTH = 60
+
+# Segment encodes running at once across every job in the process. The scheduler already
+# runs several post-processing jobs in parallel, so each job's segment workers share these
+# slots instead of each starting its own cpu/2 ffmpeg processes.
+_segment_encode_slots = threading.BoundedSemaphore(
+    int(os.environ.get('YTD_ENCODE_SLOTS') or max(1, (os.cpu_count() or 1) // 2))
+)
+
+WHATSAPP_SCALE = 'scale=w=1280:h=720:force_original_aspect_ratio=decrease'
+
+# Requested audio format -> codecs that can be remuxed into it, codec to transcode to, final extension
+AUDIO_TARGETS = {
+    'mp3': {'codecs': ('mp3',), 'codec': 'mp3', 'ext': 'mp3'},
+    'aac': {'codecs': ('aac',), 'codec': 'm4a', 'ext': 'm4a'},
+    'm4a': {'codecs': ('aac',), 'codec': 'm4a', 'ext': 'm4a'},
+    'ogg': {'codecs': ('opus', 'vorbis'), 'codec': 'vorbis', 'ext': 'ogg'},
+    'opus': {'codecs': ('opus',), 'codec': 'opus', 'ext': 'opus'},
+    'flac': {'codecs': ('flac',), 'codec': 'flac', 'ext': 'flac'},
+}
+
+# ffprobe H.264 profile names -> libx264 -profile:v values
+X264_PROFILES = {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high'}
+
+# yt-dlp postprocessors timed as pipeline stages
+YTDLP_POSTPROCESSOR_STAGES = {'Merger': 'merge', 'ExtractAudio': 'convert', 'VideoRemuxer': 'remux'}
+
+# Extractors each YoutubeDL loads: registering all ~1700 costs ~100ms per instance, the
+# YouTube ones a few ms. YTD_EXTRACTORS=default (comma-separated regexes) widens it.
+YOUTUBE_EXTRACTORS = ['youtube', 'youtube:.*']
+ALLOWED_EXTRACTORS = (
+    [name.strip() for name in os.environ['YTD_EXTRACTORS'].split(',')] if os.environ.get('YTD_EXTRACTORS')
+    else YOUTUBE_EXTRACTORS
+)
+
+_preload_lock = threading.Lock()
+_preload_started = False
+
+
+def preload_yt_dlp():
+    """Import yt-dlp on a background thread, once, so the first extraction does not wait for it.
+
+    yt-dlp is otherwise imported on first use; importing it takes a quarter
+    of a second, so callers start this after the UI has rendered.
+    """
+    global _preload_started
+    with _preload_lock:
+        if _preload_started:
+            return
+        _preload_started = True
+    threading.Thread(target=__import__, args=('yt_dlp',), daemon=True, name='yt-dlp-preload').start()
+
+
+class _SelectedFormatsHook:
+    """Duck-typed yt-dlp 'before_dl' post-processor that passes callback the selected format dicts.
+
+    Not a PostProcessor subclass: those report 'started' to the postprocessor
+    hooks, which would hand back the bandwidth lease before the download.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def set_downloader(self, downloader):
+        pass
+
+    def add_progress_hook(self, hook):
+        pass
+
+    def run(self, info):
+        self.callback(info.get('requested_formats') or [info])
+        return [], info
+
 
 class YouTubeDownloader:
-    def __init__(self):
+    extraction_count = 0
+    _extraction_count_lock = threading.Lock()
+
+    def __init__(self, metadata_cache=None, encoder_profile='balanced', segment_workers=None, bandwidth=None):
+        # Extracted info dicts are shared by every instance, keyed by video id, so
+        # the info fetched for the UI panel is reused by the download that follows.
+        self.metadata_cache = metadata_cache or get_metadata_cache()
+        # Host-wide download cap shared fairly between concurrent downloads
+        self.bandwidth = bandwidth or get_bandwidth_manager()
         self.ydl_opts_base = {
             'quiet': True,
             'no_warnings': True,
@@ -16,7 +119,15 @@ class YouTubeDownloader:
             'audioformat': 'best',
             'outtmpl': '%(title)s.%(ext)s',
             'restrictfilenames': True,
+            'allowed_extractors': ALLOWED_EXTRACTORS,
         }
+        self.last_whatsapp_strategy = None
+        self.last_branding_strategy = None
+        self.last_post_processing_plan = None
+        self.last_audio_plan = None
+        self.encoder_profile = encoder_profile
+        # Parallel segment encodes; 1 disables segmenting
+        self.segment_workers = segment_workers or max(1, (os.cpu_count() or 1) // 2)
     
     def get_video_info(self, url):
         """Extract video information without downloading"""
@@ -30,47 +141,41 @@ class YouTubeDownloader:
                 'noplaylist': True,  # Only single video
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False) or {}
-                
-                # Extract relevant information
-                video_info = {
-                    'title': info.get('title', 'Unknown'),
-                    'duration': info.get('duration', 0),
-                    'duration_string': self._format_duration(info.get('duration', 0)),
-                    'uploader': info.get('uploader', 'Unknown'),
-                    'view_count': info.get('view_count', 0),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'formats': info.get('formats', []),
-                    'description': info.get('description', ''),
-                    'upload_date': info.get('upload_date', ''),
-                    'webpage_url': info.get('webpage_url', url)
-                }
-                
-                return video_info
+            info = self._extract_info(url, ydl_opts) or {}
+            
+            # Extract relevant information
+            video_info = {
+                'id': info.get('id'),
+                'title': info.get('title', 'Unknown'),
+                'duration': info.get('duration', 0),
+                'duration_string': self._format_duration(info.get('duration', 0)),
+                'uploader': info.get('uploader', 'Unknown'),
+                'view_count': info.get('view_count', 0),
+                'thumbnail': info.get('thumbnail', ''),
+                'formats': info.get('formats', []),
+                # Compact per-height summary of the formats, memoised per video id
+                'format_ladder': get_format_ladder(info.get('id'), info.get('formats')),
+                'description': info.get('description', ''),
+                'upload_date': info.get('upload_date', ''),
+                'webpage_url': info.get('webpage_url', url)
+            }
+            
+            return video_info
                 
         except Exception as e:
             print(f"Error getting video info: {str(e)}")
             return None
     
-    def download_video(self, url, output_dir, format_id=None, progress_callback=None):
-        """Download video with specified format and convert to WhatsApp-compatible MP4"""
+    @instrumented('download')
+    def download_video(self, url, output_dir, format_id=None, progress_callback=None, info=None, concurrent_fragments=None,
+                       format_selector=None, priority=1.0):
+        """Download video with specified format and convert to WhatsApp-compatible MP4.
+        
+        priority weights this download's share of the bandwidth cap.
+        """
         try:
             # Create progress hook
-            def progress_hook(d):
-                if progress_callback:
-                    progress_data = {}
-                    if d['status'] == 'downloading':
-                        if 'total_bytes' in d and 'downloaded_bytes' in d:
-                            percent = (d['downloaded_bytes'] / d['total_bytes']) * 100
-                            progress_data['percent'] = percent
-                        elif '_percent_str' in d:
-                            percent_str = d['_percent_str'].strip('%')
-                            if percent_str.replace('.', '').isdigit():
-                                progress_data['percent'] = float(percent_str)
-                    
-                    progress_data['status'] = d['status']
-                    progress_callback(progress_data)
+            progress_hook = self._make_progress_hook(progress_callback)
             
             # Configure download options
             ydl_opts = {
@@ -82,77 +187,137 @@ class YouTubeDownloader:
                 'quiet': False,
                 'no_warnings': False,
                 'noplaylist': True,  # Only single video
+                'continuedl': True,  # Pick up .part files left by an interrupted run
             }
+            if concurrent_fragments:
+                ydl_opts['concurrent_fragment_downloads'] = concurrent_fragments
             
             # Set format if specified
-            if format_id:
+            if format_selector:
+                ydl_opts['format'] = format_selector
+            elif format_id:
                 # Use format that works with ffmpeg for merging
                 ydl_opts['format'] = f"{format_id}+bestaudio/best"
             else:
                 ydl_opts['format'] = 'best'
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Get info first to determine output filename
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    raise Exception("Failed to extract video info. The video may be unavailable or the URL is invalid.")
-                title = self._sanitize_filename(info.get('title', 'video'))
-                
-                # Download the video
-                ydl.download([url])
-                
-                # Find the downloaded file
-                downloaded_file = self._find_downloaded_file(output_dir, title)
-                return downloaded_file
+            # Reuse the info extracted for the UI panel instead of extracting again
+            if info is None:
+                info = self._extract_info(url, ydl_opts, fresh_urls=True)
+            if not info:
+                raise Exception("Failed to extract video info. The video may be unavailable or the URL is invalid.")
+            
+            # Download the video; yt-dlp reports where the final file ended up
+            return self._download_with_info(ydl_opts, info, priority)
                 
         except Exception as e:
             print(f"Error downloading video: {str(e)}")
             return None
 
+    @instrumented('convert')
     def convert_to_whatsapp_mp4(self, input_path):
-        """Convert a video to WhatsApp-compatible MP4 (H.264/AAC, max 720p) using ffmpeg"""
+        """Convert a video to WhatsApp-compatible MP4 (H.264/AAC, max 720p) using ffmpeg.
+        
+        Streams that are already compliant are copied instead of re-encoded; the
+        chosen strategy is recorded in self.last_whatsapp_strategy.
+        """
         try:
             output_path = os.path.splitext(input_path)[0] + '_whatsapp.mp4'
-            # ffmpeg command: re-encode to H.264/AAC, max 720p
-            cmd = [
-                'ffmpeg', '-y', '-i', input_path,
-                '-vf', 'scale=w=1280:h=720:force_original_aspect_ratio=decrease',
-                '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
-                '-c:a', 'aac', '-b:a', '128k',
-                '-movflags', '+faststart',
-                output_path
-            ]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            strategy = self.plan_whatsapp_conversion(input_path)
+            copy_video = strategy in ('remux', 'audio_transcode')
+            copy_audio = strategy in ('remux', 'video_transcode')
+            segmented = not copy_video and self._should_segment(input_path)
+            if segmented:
+                # Encode the video track across cores, then mux it with the original audio
+                video_path = os.path.splitext(input_path)[0] + '_whatsapp_video.mp4'
+                self._encode_video_segments(input_path, video_path, WHATSAPP_SCALE)
+                cmd = ['ffmpeg', '-y', '-i', video_path, '-i', input_path, '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy']
+            else:
+                cmd = ['ffmpeg', '-y', '-i', input_path, '-map', '0:v:0', '-map', '0:a:0?']
+                if copy_video:
+                    cmd += ['-c:v', 'copy']
+                else:
+                    # re-encode to H.264, max 720p
+                    cmd += ['-vf', WHATSAPP_SCALE, *self._video_encoder_args()]
+            if copy_audio:
+                cmd += ['-c:a', 'copy']
+            else:
+                cmd += ['-c:a', 'aac', '-b:a', '128k']
+            cmd += ['-movflags', '+faststart', output_path]
+            try:
+                run_command(cmd)
+            finally:
+                if segmented and os.path.exists(video_path):
+                    os.remove(video_path)
+            self.last_whatsapp_strategy = strategy + ('_segmented' if segmented else '')
+            print(f"WhatsApp conversion strategy: {self.last_whatsapp_strategy}")
             return output_path if os.path.exists(output_path) else None
         except Exception as e:
             print(f"Error converting to WhatsApp MP4: {str(e)}")
             return None
     
-    def download_audio(self, url, output_dir, audio_format='mp3', quality='best', progress_callback=None):
+    def plan_whatsapp_conversion(self, input_path):
+        """Pick the cheapest way to make a file WhatsApp-compatible.
+        
+        Returns 'remux' (copy both streams), 'audio_transcode', 'video_transcode'
+        or 'full_reencode'. Falls back to 'full_reencode' if ffprobe is unavailable.
+        """
+        streams = self.probe_media(input_path)
+        if not streams:
+            return 'full_reencode'
+        video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+        audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+        video_ok = bool(video) and (
+            video.get('codec_name') == 'h264'
+            and video.get('pix_fmt') in ('yuv420p', 'yuvj420p')
+            and (video.get('height') or 0) <= 720
+            and (video.get('width') or 0) <= 1280
+        )
+        # No audio track means there is nothing to transcode
+        audio_ok = audio is None or audio.get('codec_name') == 'aac'
+        if video_ok and audio_ok:
+            return 'remux'
+        if video_ok:
+            return 'audio_transcode'
+        if audio_ok:
+            return 'video_transcode'
+        return 'full_reencode'
+    
+    @instrumented('probe')
+    def probe_media(self, path):
+        """Return the stream list reported by ffprobe, or None if probing fails"""
+        try:
+            cmd = [
+                'ffprobe', '-v', 'error', '-print_format', 'json', '-show_data_hash', 'sha256',
+                '-show_entries', 'stream=index,codec_type,codec_name,profile,level,refs,extradata_hash,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels,channel_layout,duration',
+                path
+            ]
+            result = run_command(cmd)
+            return json.loads(result.stdout or b'{}').get('streams', [])
+        except Exception as e:
+            print(f"Error probing media: {str(e)}")
+            return None
+    
+    @staticmethod
+    def whatsapp_format_selector(max_height=720):
+        """yt-dlp format selector preferring streams that need no WhatsApp re-encode"""
+        return (
+            f"bestvideo[vcodec^=avc1][height<={max_height}]+bestaudio[acodec^=mp4a]"
+            f"/best[vcodec^=avc1][acodec^=mp4a][height<={max_height}]"
+            f"/bestvideo[height<={max_height}]+bestaudio/best[height<={max_height}]/best"
+        )
+    
+    @instrumented('download')
+    def download_audio(self, url, output_dir, audio_format='mp3', quality='best', progress_callback=None, info=None, concurrent_fragments=None,
+                       priority=1.0):
         """Download audio only with specified format and quality"""
         try:
             # Create progress hook
-            def progress_hook(d):
-                if progress_callback:
-                    progress_data = {}
-                    if d['status'] == 'downloading':
-                        if 'total_bytes' in d and 'downloaded_bytes' in d:
-                            percent = (d['downloaded_bytes'] / d['total_bytes']) * 100
-                            progress_data['percent'] = percent
-                        elif '_percent_str' in d:
-                            percent_str = d['_percent_str'].strip('%')
-                            if percent_str.replace('.', '').isdigit():
-                                progress_data['percent'] = float(percent_str)
-                    
-                    progress_data['status'] = d['status']
-                    progress_callback(progress_data)
+            progress_hook = self._make_progress_hook(progress_callback)
             
             # Configure audio download options
             ydl_opts = {
                 **self.ydl_opts_base,
-                'format': 'bestaudio/best',
-                'extractaudio': True,
-                'audioformat': audio_format,
                 'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
                 'progress_hooks': [progress_hook],
                 'socket_timeout': 30,
@@ -160,41 +325,234 @@ class YouTubeDownloader:
                 'quiet': False,
                 'no_warnings': False,
                 'noplaylist': True,  # Only single video
+                'continuedl': True,  # Pick up .part files left by an interrupted run
             }
+            if concurrent_fragments:
+                ydl_opts['concurrent_fragment_downloads'] = concurrent_fragments
             
-            # Set audio quality
-            if quality != 'best' and quality != 'Best Available':
-                if quality.endswith('kbps'):
-                    bitrate = quality.replace('kbps', '')
-                    ydl_opts['audioquality'] = bitrate
+            # Reuse the info extracted for the UI panel instead of extracting again
+            if info is None:
+                info = self._extract_info(url, ydl_opts, fresh_urls=True)
+            if not info:
+                raise Exception("Failed to extract video info. The video may be unavailable or the URL is invalid.")
             
-            # Add postprocessor for audio conversion
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': audio_format,
-                'preferredquality': quality.replace('kbps', '') if quality.endswith('kbps') else '192',
-            }]
+            # Prefer a stream that only needs remuxing into the requested container
+            plan = self.plan_audio_download(info.get('formats') or [], audio_format, quality)
+            ydl_opts['format'] = plan['format']
+            ydl_opts['postprocessors'] = plan['postprocessors']
+            self.last_audio_plan = plan
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Get info first to determine output filename
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    raise Exception("Failed to extract video info. The video may be unavailable or the URL is invalid.")
-                title = self._sanitize_filename(info.get('title', 'audio'))
-                
-                # Download the audio
-                ydl.download([url])
-                
-                # Find the downloaded file
-                downloaded_file = self._find_downloaded_file(output_dir, title, audio_format)
-                return downloaded_file
+            # Download the audio; yt-dlp reports where the final file ended up
+            return self._download_with_info(ydl_opts, info, priority)
                 
         except Exception as e:
             print(f"Error downloading audio: {str(e)}")
             return None
     
+    def plan_audio_download(self, formats, audio_format='mp3', quality='best'):
+        """Choose the audio stream and post-processing for an audio download.
+        
+        A stream whose codec already fits the requested container is picked
+        when one exists (AAC for m4a/aac, Opus/Vorbis for ogg) and only remuxed;
+        transcoding happens only when no such stream exists or for FLAC.
+        Returns a dict with 'format', 'postprocessors', 'ext' and 'transcode'.
+        """
+        audio_format = audio_format.lower()
+        target = AUDIO_TARGETS.get(audio_format, AUDIO_TARGETS['mp3'])
+        bitrate = quality.replace('kbps', '') if quality.endswith('kbps') else None
+        
+        audio_only = [
+            fmt for fmt in formats
+            if fmt.get('vcodec') == 'none' and fmt.get('acodec') not in (None, 'none') and fmt.get('format_id')
+        ]
+        matching = [fmt for fmt in audio_only if self._codec_family(fmt.get('acodec')) in target['codecs']]
+        candidates = matching or audio_only
+        chosen = self._best_audio_format(candidates, bitrate)
+        
+        if chosen and matching:
+            # Lossless: copy the stream into the requested container
+            postprocessors = []
+            if chosen.get('ext') != target['ext']:
+                postprocessors.append({'key': 'FFmpegVideoRemuxer', 'preferedformat': target['ext']})
+            return {
+                'format': chosen['format_id'],
+                'postprocessors': postprocessors,
+                'ext': target['ext'],
+                'transcode': False,
+            }
+        
+        return {
+            'format': chosen['format_id'] if chosen else 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': target['codec'],
+                'preferredquality': bitrate or '192',
+            }],
+            'ext': target['ext'],
+            'transcode': True,
+        }
+    
+    @staticmethod
+    def _codec_family(acodec):
+        """Normalise yt-dlp acodec strings such as 'mp4a.40.2' to a codec name"""
+        acodec = (acodec or '').lower()
+        if acodec.startswith('mp4a') or acodec == 'aac':
+            return 'aac'
+        return acodec.split('.')[0]
+    
+    @staticmethod
+    def _best_audio_format(formats, bitrate=None):
+        """Highest-bitrate format, or the highest one not above the requested bitrate"""
+        if not formats:
+            return None
+        def abr(fmt):
+            return fmt.get('abr') or fmt.get('tbr') or 0
+        if bitrate:
+            # Small tolerance: YouTube's 128k streams report slightly above 128
+            within = [fmt for fmt in formats if abr(fmt) <= float(bitrate) * 1.1]
+            if within:
+                return max(within, key=abr)
+        return max(formats, key=abr)
+    
+    @instrumented('brand')
     def add_branding_to_video(self, main_video_path, intro_path, outro_path):
-        """Concatenate intro, main, and outro videos into a single file using ffmpeg concat filter, re-encoding to ensure audio."""
+        """Concatenate intro, main, and outro videos into a single file.
+        
+        When the main video is H.264/AAC, the intro and outro are normalised once
+        to its profile (cached) and, if their H.264 parameter sets come out
+        identical to the main video's, the parts are joined with the concat
+        demuxer without re-encoding the main video. Otherwise everything goes
+        through the concat filter and is re-encoded. The strategy used is
+        recorded in self.last_branding_strategy.
+        """
+        profile = self.branding_profile(main_video_path)
+        if profile:
+            final_path = self._brand_with_concat_demuxer(main_video_path, intro_path, outro_path, profile)
+            if final_path:
+                self.last_branding_strategy = 'concat_copy'
+                return final_path
+        final_path = self._brand_with_concat_filter(main_video_path, intro_path, outro_path)
+        if final_path:
+            self.last_branding_strategy = 'concat_filter'
+        return final_path
+    
+    def branding_profile(self, video_path):
+        """Return the stream profile intro/outro must match for a stream-copy concat, or None"""
+        streams = self.probe_media(video_path)
+        if not streams:
+            return None
+        video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+        audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+        if not video or not audio:
+            return None
+        if video.get('codec_name') != 'h264' or audio.get('codec_name') != 'aac':
+            return None
+        # Stream copy keeps only the first part's SPS/PPS, so the parts must share them exactly
+        if not video.get('extradata_hash') or not video.get('profile') or not video.get('level'):
+            return None
+        time_base = video.get('time_base', '1/90000')
+        return {
+            'h264_profile': video['profile'],
+            'level': video['level'],
+            'refs': video.get('refs') or 1,
+            'extradata_hash': video['extradata_hash'],
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': video.get('r_frame_rate', '30/1'),
+            'pix_fmt': video.get('pix_fmt', 'yuv420p'),
+            'timescale': time_base.split('/')[-1],
+            'sample_rate': audio.get('sample_rate', '44100'),
+            'channels': audio.get('channels', 2),
+        }
+    
+    @instrumented('brand_asset')
+    def _normalized_branding_asset(self, asset_path, profile):
+        """Encode an intro/outro clip to the given profile once and reuse it afterwards"""
+        asset_path = os.path.abspath(asset_path)
+        stat = os.stat(asset_path)
+        # The main video's parameter-set hash is checked after encoding; it does not change the encode
+        encode_profile = {key: value for key, value in profile.items() if key != 'extradata_hash'}
+        fingerprint = json.dumps([asset_path, stat.st_size, stat.st_mtime, encode_profile], sort_keys=True)
+        digest = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16]
+        os.makedirs(BRANDING_CACHE_DIR, exist_ok=True)
+        output_path = os.path.join(BRANDING_CACHE_DIR, f"{Path(asset_path).stem}_{digest}.mp4")
+        if os.path.exists(output_path):
+            return output_path
+        
+        width, height = profile['width'], profile['height']
+        layout = 'mono' if str(profile['channels']) == '1' else 'stereo'
+        has_audio = any(stream.get('codec_type') == 'audio' for stream in (self.probe_media(asset_path) or []))
+        level = int(profile['level'])
+        cmd = ['ffmpeg', '-y', '-i', asset_path]
+        if not has_audio:
+            # Concat needs an audio track in every part
+            cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={profile['sample_rate']}:cl={layout}"]
+        cmd += [
+            '-map', '0:v:0', '-map', '0:a:0' if has_audio else '1:a:0',
+            '-vf', (
+                f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={profile['fps']}"
+            ),
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '23', '-pix_fmt', profile['pix_fmt'],
+            '-profile:v', X264_PROFILES.get(profile['h264_profile'], profile['h264_profile'].lower()),
+            '-level:v', f"{level // 10}.{level % 10}", '-refs', str(profile['refs']),
+            '-c:a', 'aac', '-b:a', '128k', '-ar', str(profile['sample_rate']), '-ac', str(profile['channels']),
+            '-video_track_timescale', str(profile['timescale']),
+            '-shortest', '-movflags', '+faststart',
+        ]
+        # Write to a unique temporary name so a crashed encode never looks like a cached
+        # asset and jobs normalising the same clip at once do not clobber each other
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp.mp4', dir=BRANDING_CACHE_DIR)
+        os.close(fd)
+        try:
+            run_command(cmd + [tmp_path])
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return output_path
+    
+    def _brand_with_concat_demuxer(self, main_video_path, intro_path, outro_path, profile):
+        """Join pre-normalised intro/outro with the main video using stream copy"""
+        list_path = None
+        try:
+            final_path = os.path.splitext(main_video_path)[0] + '_branded.mp4'
+            parts = []
+            for path in [intro_path, main_video_path, outro_path]:
+                if not path or not os.path.exists(path):
+                    continue
+                if path == main_video_path:
+                    parts.append(os.path.abspath(path))
+                    continue
+                asset = self._normalized_branding_asset(path, profile)
+                video = next((stream for stream in self.probe_media(asset) or []
+                              if stream.get('codec_type') == 'video'), {})
+                if video.get('extradata_hash') != profile['extradata_hash']:
+                    # Different SPS/PPS would decode the copied main video with the wrong parameters
+                    print("Branding clip parameter sets differ from the main video; re-encoding instead")
+                    return None
+                parts.append(asset)
+            list_path = os.path.splitext(main_video_path)[0] + '_concat.txt'
+            with open(list_path, 'w') as f:
+                for part in parts:
+                    escaped = part.replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            cmd = [
+                'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+                '-c', 'copy', '-movflags', '+faststart',
+                final_path
+            ]
+            run_command(cmd)
+            return final_path if os.path.exists(final_path) else None
+        except Exception as e:
+            print(f"Error adding branding with stream copy, falling back to re-encode: {str(e)}")
+            return None
+        finally:
+            if list_path and os.path.exists(list_path):
+                os.remove(list_path)
+    
+    def _brand_with_concat_filter(self, main_video_path, intro_path, outro_path):
+        """Concatenate intro, main, and outro videos using ffmpeg concat filter, re-encoding to ensure audio."""
         try:
             temp_dir = os.path.dirname(main_video_path)
             final_path = os.path.splitext(main_video_path)[0] + '_branded.mp4'
@@ -212,16 +570,393 @@ class YouTubeDownloader:
                 'ffmpeg', '-y', *input_files,
                 '-filter_complex', filter_complex,
                 '-map', '[outv]', '-map', '[outa]',
-                '-c:v', 'libx264', '-c:a', 'aac', '-b:a', '128k',
+                *self._video_encoder_args(), '-c:a', 'aac', '-b:a', '128k',
                 '-movflags', '+faststart',
                 final_path
             ]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            run_command(cmd)
             return final_path if os.path.exists(final_path) else None
         except Exception as e:
             print(f"Error adding branding: {str(e)}")
             return None
     
+    @staticmethod
+    def get_encoder_profiles():
+        """Names of the available encoder speed/quality profiles"""
+        return list(ENCODER_PROFILES)
+    
+    def _video_encoder_args(self, threads=None):
+        """libx264 arguments for the selected encoder profile"""
+        profile = ENCODER_PROFILES.get(self.encoder_profile, ENCODER_PROFILES['balanced'])
+        return [
+            '-c:v', 'libx264', '-preset', profile['preset'], '-crf', str(profile['crf']),
+            '-pix_fmt', 'yuv420p', '-threads', str(profile['threads'] if threads is None else threads),
+        ]
+    
+    def _should_segment(self, input_path):
+        """Whether a video is long enough for a parallel segmented encode to pay off"""
+        if self.segment_workers <= 1:
+            return False
+        duration = self.probe_duration(input_path)
+        return bool(duration) and duration >= SEGMENT_MIN_DURATION
+    
+    @instrumented('probe')
+    def probe_duration(self, path):
+        """Container duration in seconds according to ffprobe, or None"""
+        try:
+            cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path]
+            result = run_command(cmd)
+            return float(result.stdout.strip() or 0) or None
+        except Exception as e:
+            print(f"Error probing duration: {str(e)}")
+            return None
+    
+    @instrumented('encode_segments')
+    def _encode_video_segments(self, input_path, output_path, video_filter=None):
+        """Split the video track at keyframes, encode segments in parallel and join them with the concat demuxer"""
+        work_dir = tempfile.mkdtemp(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            # Stream-copy split only cuts at keyframes, so every segment decodes on its own
+            run_command([
+                'ffmpeg', '-y', '-i', input_path, '-map', '0:v:0', '-an', '-c', 'copy',
+                '-f', 'segment', '-segment_time', str(SEGMENT_LENGTH), '-reset_timestamps', '1',
+                os.path.join(work_dir, 'source_%05d.mkv')
+            ])
+            sources = sorted(f for f in os.listdir(work_dir) if f.startswith('source_'))
+            threads = max(1, (os.cpu_count() or 1) // self.segment_workers)
+            
+            def encode(name):
+                source = os.path.join(work_dir, name)
+                encoded = os.path.join(work_dir, name.replace('source_', 'encoded_').replace('.mkv', '.mp4'))
+                cmd = ['ffmpeg', '-y', '-i', source, '-an']
+                if video_filter:
+                    cmd += ['-vf', video_filter]
+                cmd += [*self._video_encoder_args(threads), '-video_track_timescale', '90000', encoded]
+                with _segment_encode_slots:
+                    run_command(cmd)
+                os.remove(source)
+                return encoded
+            
+            # Each worker drives its own ffmpeg process, so the encodes run on separate cores;
+            # the process-wide slots bound how many run at once across jobs
+            with ThreadPoolExecutor(max_workers=self.segment_workers, thread_name_prefix='encode') as pool:
+                encoded_parts = [future.result() for future in [submit_with_context(pool, encode, name) for name in sources]]
+            
+            list_path = os.path.join(work_dir, 'segments.txt')
+            with open(list_path, 'w') as f:
+                for part in encoded_parts:
+                    f.write(f"file '{os.path.basename(part)}'\n")
+            run_command([
+                'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path
+            ])
+            return output_path
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def plan_post_processing(self, input_path, whatsapp=False, intro_path=None, outro_path=None):
+        """Decide how to apply the selected post-processing options.
+        
+        Returns 'none', 'whatsapp', 'branding', 'whatsapp_copy_branding' (file is
+        already compliant, so branding is a stream-copy concat) or 'fused' (one
+        ffmpeg pass that scales, concatenates and encodes).
+        """
+        branding = any(path and os.path.exists(path) for path in (intro_path, outro_path))
+        if whatsapp and branding:
+            if self.plan_whatsapp_conversion(input_path) == 'remux' and self.branding_profile(input_path):
+                return 'whatsapp_copy_branding'
+            return 'fused'
+        if whatsapp:
+            return 'whatsapp'
+        if branding:
+            return 'branding'
+        return 'none'
+    
+    @instrumented('post_process')
+    def post_process(self, input_path, whatsapp=False, intro_path=None, outro_path=None, delete_input=False):
+        """Run WhatsApp conversion and/or branding on a downloaded file with as few encodes as possible.
+        
+        With both options selected the work is done in a single ffmpeg pass
+        instead of converting, writing a *_whatsapp.mp4 and encoding it again.
+        Intermediate files are removed as soon as they are no longer needed, and
+        the input too when delete_input is set.
+        """
+        plan = self.plan_post_processing(input_path, whatsapp, intro_path, outro_path)
+        self.last_post_processing_plan = plan
+        if plan == 'none':
+            return input_path
+        if plan == 'whatsapp':
+            output_path = self.convert_to_whatsapp_mp4(input_path)
+        elif plan == 'branding':
+            output_path = self.add_branding_to_video(input_path, intro_path, outro_path)
+        elif plan == 'whatsapp_copy_branding':
+            # Normalised intro/outro follow the compliant main video's profile
+            output_path = self.add_branding_to_video(input_path, intro_path, outro_path)
+        else:
+            output_path = self._whatsapp_brand_single_pass(input_path, intro_path, outro_path)
+        if output_path and delete_input and output_path != input_path and os.path.exists(input_path):
+            os.remove(input_path)
+        return output_path
+    
+    def _whatsapp_brand_single_pass(self, main_video_path, intro_path, outro_path):
+        """Scale intro/main/outro to a WhatsApp-compatible size, concatenate and encode in one ffmpeg run.
+        
+        Fails rather than padding a silent part with audio of unknown length.
+        """
+        try:
+            final_path = os.path.splitext(main_video_path)[0] + '_whatsapp_branded.mp4'
+            # None (probe failed) is kept so the main video is not mistaken for a silent one
+            streams = self.probe_media(main_video_path)
+            video = next((stream for stream in streams or [] if stream.get('codec_type') == 'video'), {})
+            width, height = self._fit_within(video.get('width'), video.get('height'), 1280, 720)
+            fps = video.get('r_frame_rate') or '30/1'
+            if fps in ('0/0', '0/1'):
+                fps = '30/1'
+            
+            input_args = []
+            filter_parts = []
+            concat_inputs = []
+            idx = 0
+            part = 0
+            for path in [intro_path, main_video_path, outro_path]:
+                if not path or not os.path.exists(path):
+                    continue
+                input_args.extend(['-i', os.path.abspath(path)])
+                video_idx = idx
+                idx += 1
+                filter_parts.append(
+                    f'[{video_idx}:v:0]scale={width}:{height}:force_original_aspect_ratio=decrease,'
+                    f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p[v{part}]'
+                )
+                part_streams = self.probe_media(path) if path != main_video_path else streams
+                has_audio = part_streams is None or any(
+                    stream.get('codec_type') == 'audio' for stream in part_streams
+                )
+                if has_audio:
+                    filter_parts.append(
+                        f'[{video_idx}:a:0]aresample=44100,aformat=sample_fmts=fltp:channel_layouts=stereo[a{part}]'
+                    )
+                else:
+                    # Pad silent parts so every concat segment has audio; Matroska streams carry no duration
+                    duration = next((stream.get('duration') for stream in part_streams
+                                     if stream.get('codec_type') == 'video' and stream.get('duration')), None)
+                    duration = duration or self.probe_duration(path)
+                    if not duration or float(duration) <= 0:
+                        raise Exception(f"Could not determine the duration of silent clip {path}")
+                    input_args.extend(['-f', 'lavfi', '-t', str(duration), '-i', 'anullsrc=r=44100:cl=stereo'])
+                    filter_parts.append(f'[{idx}:a:0]aformat=sample_fmts=fltp:channel_layouts=stereo[a{part}]')
+                    idx += 1
+                concat_inputs.append(f'[v{part}][a{part}]')
+                part += 1
+            filter_complex = ';'.join(filter_parts) + ';' + ''.join(concat_inputs) + f'concat=n={part}:v=1:a=1[outv][outa]'
+            cmd = [
+                'ffmpeg', '-y', *input_args,
+                '-filter_complex', filter_complex,
+                '-map', '[outv]', '-map', '[outa]',
+                *self._video_encoder_args(),
+                '-c:a', 'aac', '-b:a', '128k',
+                '-movflags', '+faststart',
+                final_path
+            ]
+            run_command(cmd)
+            return final_path if os.path.exists(final_path) else None
+        except Exception as e:
+            print(f"Error converting and branding video: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _fit_within(width, height, max_width, max_height):
+        """Scale (width, height) down to fit the box, keeping aspect ratio and even dimensions"""
+        if not width or not height:
+            return max_width, max_height
+        scale = min(1.0, max_width / width, max_height / height)
+        return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+    
+    def expand_batch(self, source):
+        """Expand a playlist URL, a list of URLs or newline-separated URLs into video entries"""
+        if isinstance(source, str):
+            source = [line.strip() for line in source.splitlines()]
+        entries = []
+        seen = set()
+        for url in source:
+            if not url:
+                continue
+            if is_youtube_playlist(url):
+                playlist_entries = self._expand_playlist(url)
+            else:
+                playlist_entries = [{'url': url, 'id': extract_video_id(url), 'title': None}]
+            for entry in playlist_entries:
+                key = entry['id'] or entry['url']
+                if key not in seen:
+                    seen.add(key)
+                    entries.append(entry)
+        return entries
+    
+    @instrumented('extract')
+    def _expand_playlist(self, url):
+        """List playlist entries with a flat extraction (no per-video requests)"""
+        ydl_opts = {
+            **self.ydl_opts_base,
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+            'noplaylist': False,
+            'socket_timeout': 30,
+            'retries': 3,
+        }
+        try:
+            with get_ydl_pool().session(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=False) or {}
+                with self._extraction_count_lock:
+                    YouTubeDownloader.extraction_count += 1
+        except Exception as e:
+            print(f"Error expanding playlist: {str(e)}")
+            return []
+        if not info.get('entries'):
+            # A watch URL that merely carries list= resolves to the single video
+            return [{'url': url, 'id': info.get('id') or extract_video_id(url), 'title': info.get('title')}]
+        entries = []
+        for entry in info['entries']:
+            if not entry:
+                continue
+            video_id = entry.get('id')
+            entry_url = entry.get('url') or entry.get('webpage_url')
+            if video_id and not (entry_url or '').startswith('http'):
+                entry_url = f"https://www.youtube.com/watch?v={video_id}"
+            if entry_url:
+                entries.append({'url': entry_url, 'id': video_id, 'title': entry.get('title')})
+        return entries
+    
+    @instrumented('batch')
+    def download_batch(self, source, output_dir, format_id=None, audio_only=False, audio_format='mp3',
+                       quality='best', max_concurrent_videos=3, concurrent_fragments=4,
+                       progress_callback=None, download_slot=None):
+        """Download every video of a playlist or URL list concurrently.
+        
+        concurrent_fragments only applies to fragmented (DASH/HLS) formats;
+        progressive downloads use one connection either way. download_slot,
+        e.g. JobScheduler.download_slot, is held around each entry so the batch
+        counts against the scheduler's download limit.
+        
+        Returns a dict with the downloaded files, failed URLs, total bytes,
+        elapsed seconds and aggregate throughput in bytes per second.
+        """
+        entries = self.expand_batch(source)
+        progress = BatchProgress(len(entries), progress_callback)
+        
+        def download_entry(index, entry):
+            entry_callback = progress.callback_for(index)
+            with (download_slot or nullcontext)():
+                if audio_only:
+                    path = self.download_audio(entry['url'], output_dir, audio_format, quality,
+                                               entry_callback, concurrent_fragments=concurrent_fragments)
+                else:
+                    path = self.download_video(entry['url'], output_dir, format_id,
+                                               entry_callback, concurrent_fragments=concurrent_fragments)
+            progress.finish(index, path)
+            return path
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrent_videos), thread_name_prefix='batch') as pool:
+            futures = [submit_with_context(pool, download_entry, i, entry) for i, entry in enumerate(entries)]
+            paths = [future.result() for future in futures]
+        
+        summary = progress.summary()
+        summary['files'] = [path for path in paths if path]
+        summary['failed'] = [entry['url'] for entry, path in zip(entries, paths) if not path]
+        return summary
+    
+    def _make_progress_hook(self, progress_callback):
+        """Build a yt-dlp progress hook that forwards simplified progress data"""
+        def progress_hook(d):
+            if progress_callback:
+                progress_data = {}
+                if d['status'] == 'downloading':
+                    total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+                    if total_bytes and 'downloaded_bytes' in d:
+                        percent = (d['downloaded_bytes'] / total_bytes) * 100
+                        progress_data['percent'] = percent
+                    elif '_percent_str' in d:
+                        percent_str = d['_percent_str'].strip('%')
+                        if percent_str.replace('.', '').isdigit():
+                            progress_data['percent'] = float(percent_str)
+                if 'downloaded_bytes' in d:
+                    progress_data['downloaded_bytes'] = d['downloaded_bytes']
+                    progress_data['total_bytes'] = d.get('total_bytes') or d.get('total_bytes_estimate')
+                # yt-dlp reports one file at a time; the key tells merged parts apart
+                progress_data['filename'] = d.get('filename')
+                progress_data['status'] = d['status']
+                progress_callback(progress_data)
+        return progress_hook
+    
+    @instrumented('extract')
+    def _extract_info(self, url, ydl_opts, use_cache=True, fresh_urls=False):
+        """Extract info for a URL once, serving repeat requests from the metadata cache"""
+        video_id = extract_video_id(url)
+        if use_cache and video_id:
+            cached = self.metadata_cache.get(video_id, fresh_urls=fresh_urls)
+            if cached is not None:
+                return cached
+        
+        # Pooled sessions keep extractors, cookies and connections warm between calls
+        with get_ydl_pool().session(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            with self._extraction_count_lock:
+                YouTubeDownloader.extraction_count += 1
+            if not info:
+                return None
+            # Drop per-run selections so the dict can be re-processed with other options
+            info = ydl.sanitize_info(info, remove_private_keys=True)
+        
+        if video_id:
+            self.metadata_cache.put(video_id, info)
+        return info
+    
+    def _download_with_info(self, ydl_opts, info, priority=1.0):
+        """Download from an already extracted info dict and return the final file path.
+        
+        The path comes from yt-dlp's post_hooks, which run after every
+        postprocessor (merge, remux, audio extraction) has moved the file.
+        Raises if yt-dlp reports no file at all.
+        """
+        import yt_dlp
+        final_paths = []
+        # The bandwidth lease covers the transfer only; it is handed back once yt-dlp starts post-processing
+        lease = self.bandwidth.lease(priority, info.get('id'))
+        # yt-dlp's own ffmpeg steps (merge, audio extraction, remux) get spans of their own
+        postprocessor_spans = ExitStack()
+        def postprocessor_hook(d):
+            if d['status'] == 'started':
+                lease.release()
+            stage = YTDLP_POSTPROCESSOR_STAGES.get(d.get('postprocessor'))
+            if stage and d['status'] == 'started':
+                postprocessor_spans.enter_context(span(stage, postprocessor=d['postprocessor']))
+            elif stage and d['status'] == 'finished':
+                postprocessor_spans.close()
+        ydl_opts = {
+            **ydl_opts,
+            'progress_hooks': [*ydl_opts.get('progress_hooks', []), lease.progress_hook],
+            'post_hooks': [*ydl_opts.get('post_hooks', []), final_paths.append],
+            'postprocessor_hooks': [*ydl_opts.get('postprocessor_hooks', []), postprocessor_hook],
+        }
+        with lease, postprocessor_spans, yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # Live for progressive downloads; fragmented ones keep the rate they start with
+            lease.attach(ydl.params)
+            # Only DASH/HLS formats split the rate across fragment workers; known once formats are selected
+            ydl.add_post_processor(_SelectedFormatsHook(
+                lambda formats: lease.set_fragmented(any(is_fragmented(fmt) for fmt in formats))
+            ), when='before_dl')
+            result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+        if final_paths:
+            return os.path.abspath(final_paths[-1])
+        # Already-downloaded files skip the hooks; fall back to what yt-dlp recorded
+        downloads = (result or {}).get('requested_downloads') or []
+        if downloads and downloads[-1].get('filepath') and os.path.exists(downloads[-1]['filepath']):
+            return os.path.abspath(downloads[-1]['filepath'])
+        raise Exception("yt-dlp finished without reporting the downloaded file")
+    
+    @classmethod
+    def get_extraction_count(cls):
+        """Number of yt-dlp extractions performed by this process"""
+        return cls.extraction_count
+    
     def _format_duration(self, duration):
         """Format duration in seconds to HH:MM:SS"""
         if not duration:
@@ -236,73 +971,103 @@ class YouTubeDownloader:
         else:
             return f"{minutes:02d}:{seconds:02d}"
     
-    def _sanitize_filename(self, filename):
-        """Sanitize filename for filesystem compatibility"""
-        # Remove/replace problematic characters
-        filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-        filename = re.sub(r'\s+', ' ', filename)  # Replace multiple spaces with single space
-        filename = filename.strip()
-        
-        # Limit length
-        if len(filename) > 100:
-            filename = filename[:100]
-        
-        return filename
-    
-    def _find_downloaded_file(self, directory, title, extension=None):
-        """Find the downloaded file in the directory"""
-        try:
-            # Look for files with the title
-            for file in os.listdir(directory):
-                if title.lower() in file.lower():
-                    if extension:
-                        if file.lower().endswith(f'.{extension.lower()}'):
-                            return os.path.join(directory, file)
-                    else:
-                        return os.path.join(directory, file)
-            
-            # If specific search fails, return the first file in directory
-            files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
-            if files:
-                return os.path.join(directory, files[0])
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error finding downloaded file: {str(e)}")
-            return None
-    
+    @instrumented('extract')
     def get_available_formats(self, url):
         """Get all available formats for a video"""
         try:
             ydl_opts = {
                 **self.ydl_opts_base,
-                'listformats': True,
                 'noplaylist': True,  # Only single video
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False) or {}
-                return info.get('formats', [])
+            info = self._extract_info(url, ydl_opts) or {}
+            return info.get('formats', [])
                 
         except Exception as e:
             print(f"Error getting formats: {str(e)}")
             return []
 
-def search_youtube(query, max_results=5):
+
+class BatchProgress:
+    """Aggregates per-video progress of a batch into overall progress and throughput"""
+    
+    def __init__(self, total, progress_callback=None, min_interval=0.25):
+        self.total = total
+        self.progress_callback = progress_callback
+        self.min_interval = min_interval
+        self.started = time.time()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+        self._percent = {}
+        self._bytes = {}
+        self._completed = 0
+        self._failed = 0
+    
+    def callback_for(self, index):
+        """Return a progress callback for one entry of the batch"""
+        def callback(progress_data):
+            with self._lock:
+                if 'percent' in progress_data:
+                    self._percent[index] = progress_data['percent']
+                if 'downloaded_bytes' in progress_data:
+                    self._bytes[(index, progress_data.get('filename'))] = progress_data['downloaded_bytes']
+                # Chunk updates from every worker are coalesced to a few reports per second
+                now = time.monotonic()
+                if now - self._last_report < self.min_interval:
+                    return
+                self._last_report = now
+            self._report()
+        return callback
+    
+    def finish(self, index, path):
+        with self._lock:
+            self._percent[index] = 100.0
+            if path:
+                self._completed += 1
+            else:
+                self._failed += 1
+        self._report()
+    
+    def summary(self):
+        with self._lock:
+            elapsed = time.time() - self.started
+            total_bytes = sum(self._bytes.values())
+            percent = sum(self._percent.values()) / self.total if self.total else 100.0
+            return {
+                'total': self.total,
+                'completed': self._completed,
+                'failed_count': self._failed,
+                'percent': percent,
+                'downloaded_bytes': total_bytes,
+                'elapsed': elapsed,
+                'throughput': total_bytes / elapsed if elapsed > 0 else 0.0,
+            }
+    
+    def _report(self):
+        if self.progress_callback:
+            summary = self.summary()
+            summary['status'] = 'downloading'
+            self.progress_callback(summary)
+
+def search_youtube(query, max_results=5, start=1):
     """
     Search YouTube using yt-dlp and return a list of video entries.
+
+    start is the 1-based position of the first result, so later pages can be
+    fetched without processing the entries before them.
     """
-    import yt_dlp
+    end = start + max_results - 1
     ydl_opts = {
         'quiet': True,
         'skip_download': True,
         'extract_flat': True,
         'noplaylist': True,
+        'allowed_extractors': ALLOWED_EXTRACTORS,
     }
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
+        # Every page shares one pooled session; only the requested slice differs
+        with get_ydl_pool().session(ydl_opts, playlist_items=f"{start}-{end}") as ydl:
+            info = ydl.extract_info(f"ytsearch{end}:{query}", download=False)
             if info and isinstance(info, dict):
                 return info.get('entries', [])
             else:
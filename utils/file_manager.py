@@ -1,14 +1,272 @@
 import os
+import errno
+import json
 import tempfile
 import shutil
+import uuid
 from pathlib import Path
 import time
 import threading
+from utils.metrics import span
+
+# ioctl request for FICLONE (copy-on-write clone) on Linux btrfs/xfs
+FICLONE = 0x40049409
+
+# Hidden directory created inside a destination so staging shares its filesystem
+STAGING_DIR_NAME = '.youtube_downloader_staging'
+
+
+def link_or_copy(source_path, destination_path):
+    """Place source at destination as a reflink or hardlink, copying only as a last resort.
+
+    Returns 'reflink', 'hardlink' or 'copy' depending on what was used.
+    """
+    os.makedirs(os.path.dirname(destination_path) or '.', exist_ok=True)
+    if os.path.exists(destination_path):
+        os.remove(destination_path)
+    try:
+        import fcntl
+        with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return 'reflink'
+    except (ImportError, OSError):
+        if os.path.exists(destination_path):
+            os.remove(destination_path)
+    try:
+        os.link(source_path, destination_path)
+        return 'hardlink'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+    # Copy under a temporary name so the destination never holds a partial file
+    partial_path = f"{destination_path}.{uuid.uuid4().hex}.part"
+    shutil.copy2(source_path, partial_path)
+    os.replace(partial_path, destination_path)
+    return 'copy'
+
+
+# Prefixes of directories this app creates in the system temp dir
+TEMP_DIR_PREFIXES = ('youtube_download_', 'youtube_batch_')
+DEFAULT_REGISTRY_PATH = str(Path.home() / ".cache" / "youtube_downloader" / "staging_registry.json")
+# Pins outlive the process that set them, but not a job that is never resumed
+PIN_MAX_AGE = 7 * 24 * 3600
+
+
+class StagingJanitor:
+    """Process-wide cleaner for staging/temp directories.
+
+    Every FileManager registers its directories here instead of running its own
+    thread. The registry is persisted to disk and ``temp_root`` (the system
+    temp dir by default) is scanned on start-up, so directories left behind by
+    a crashed process are reclaimed too. Directories are removed once idle for longer than
+    ``max_age_hours``, and oldest first while the total exceeds
+    ``max_total_bytes``. Pinned directories are skipped; pins are persisted
+    with the registry so they still hold when a restarted process sweeps
+    before resuming its jobs.
+    """
+
+    def __init__(self, registry_path=DEFAULT_REGISTRY_PATH, max_age_hours=24, max_total_bytes=None,
+                 min_idle_seconds=600, interval=3600, temp_root=None):
+        self.registry_path = registry_path
+        self.temp_root = temp_root or tempfile.gettempdir()
+        self.max_age_hours = max_age_hours
+        self.max_total_bytes = max_total_bytes
+        self.min_idle_seconds = min_idle_seconds
+        self.interval = interval
+        self._directories = {}
+        # path -> time pinned
+        self._pinned = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.metrics = {'bytes_reclaimed': 0, 'directories_reclaimed': 0, 'sweeps': 0}
+        self._load_registry()
+        self._scan_temp_root()
+
+    def register(self, path):
+        """Track a directory for cleanup"""
+        with self._lock:
+            self._directories[path] = time.time()
+            self._save_registry()
+
+    def unregister(self, path):
+        with self._lock:
+            self._directories.pop(path, None)
+            self._pinned.pop(path, None)
+            self._save_registry()
+
+    def pin(self, path):
+        """Keep a directory regardless of age, e.g. while a download can still resume into it"""
+        with self._lock:
+            self._pinned[path] = time.time()
+            self._save_registry()
+
+    def unpin(self, path):
+        with self._lock:
+            if self._pinned.pop(path, None) is not None:
+                self._save_registry()
+
+    def sweep(self, max_age_hours=None):
+        """Remove expired directories, then enforce the disk quota; returns bytes reclaimed"""
+        max_age_seconds = (self.max_age_hours if max_age_hours is None else max_age_hours) * 3600
+        now = time.time()
+        with self._lock:
+            candidates = [path for path in self._directories if path not in self._pinned]
+            missing = [path for path in candidates if not os.path.exists(path)]
+            for path in missing:
+                del self._directories[path]
+
+        entries = []
+        for path in candidates:
+            if path in missing:
+                continue
+            last_used, size = self._usage(path)
+            entries.append((last_used, size, path))
+
+        reclaimed = 0
+        remaining = []
+        for last_used, size, path in entries:
+            if now - last_used > max_age_seconds:
+                reclaimed += self._remove(path, size)
+            else:
+                remaining.append((last_used, size, path))
+
+        if self.max_total_bytes is not None:
+            total = sum(size for _, size, _ in remaining)
+            for last_used, size, path in sorted(remaining):
+                if total <= self.max_total_bytes:
+                    break
+                # Never evict a directory a download may still be writing to
+                if now - last_used < self.min_idle_seconds:
+                    continue
+                reclaimed += self._remove(path, size)
+                total -= size
+
+        with self._lock:
+            self.metrics['sweeps'] += 1
+            self._save_registry()
+        return reclaimed
+
+    def get_metrics(self):
+        """Return reclaim counters plus the number and size of live directories"""
+        with self._lock:
+            metrics = dict(self.metrics)
+            paths = list(self._directories)
+        metrics['directories_live'] = len(paths)
+        metrics['bytes_live'] = sum(self._usage(path)[1] for path in paths if os.path.exists(path))
+        return metrics
+
+    def start(self):
+        """Start the single background sweep thread if it is not already running"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='staging-janitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error in cleanup thread: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def _remove(self, path, size):
+        try:
+            shutil.rmtree(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error removing temp directory {path}: {str(e)}")
+            return 0
+        with self._lock:
+            self._directories.pop(path, None)
+            self.metrics['bytes_reclaimed'] += size
+            self.metrics['directories_reclaimed'] += 1
+        return size
+
+    @staticmethod
+    def _usage(path):
+        """Most recent modification time and total size of a directory tree"""
+        last_used = 0
+        size = 0
+        for root, _, files in os.walk(path):
+            try:
+                last_used = max(last_used, os.stat(root).st_mtime)
+            except OSError:
+                continue
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                size += stat.st_size
+                last_used = max(last_used, stat.st_mtime)
+        return last_used, size
+
+    def _load_registry(self):
+        try:
+            with open(self.registry_path) as f:
+                registry = json.load(f)
+            if 'directories' not in registry:
+                # Registries written before pins were persisted map paths to times directly
+                registry = {'directories': registry}
+            self._directories.update(registry['directories'])
+            cutoff = time.time() - PIN_MAX_AGE
+            self._pinned.update(
+                (path, pinned) for path, pinned in registry.get('pinned', {}).items() if pinned > cutoff
+            )
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading staging registry: {str(e)}")
+
+    def _save_registry(self):
+        """Persist the registry atomically; caller holds the lock"""
+        try:
+            os.makedirs(os.path.dirname(self.registry_path), exist_ok=True)
+            tmp_path = f"{self.registry_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'directories': self._directories, 'pinned': self._pinned}, f)
+            os.replace(tmp_path, self.registry_path)
+        except Exception as e:
+            print(f"Error saving staging registry: {str(e)}")
+
+    def _scan_temp_root(self):
+        """Adopt leftover temp directories from earlier runs"""
+        try:
+            for entry in os.scandir(self.temp_root):
+                if entry.is_dir() and entry.name.startswith(TEMP_DIR_PREFIXES):
+                    self._directories.setdefault(entry.path, entry.stat().st_mtime)
+        except OSError as e:
+            print(f"Error scanning {self.temp_root}: {str(e)}")
+
+
+_shared_janitor = None
+_shared_janitor_lock = threading.Lock()
+
+
+def get_janitor():
+    """Return the process-wide StagingJanitor, with a quota from YTD_STAGING_QUOTA_GB if set"""
+    global _shared_janitor
+    with _shared_janitor_lock:
+        if _shared_janitor is None:
+            quota_gb = os.environ.get('YTD_STAGING_QUOTA_GB')
+            _shared_janitor = StagingJanitor(
+                max_total_bytes=int(float(quota_gb) * 1024 ** 3) if quota_gb else None
+            )
+        return _shared_janitor
 
 class FileManager:
-    def __init__(self):
+    def __init__(self, janitor=None):
+        # Directories created by this instance; cleanup is shared process-wide
         self.temp_directories = []
-        self.cleanup_thread = None
+        self.janitor = janitor or get_janitor()
         self.start_cleanup_thread()
     
     def create_temp_directory(self, prefix="youtube_download_"):
@@ -19,45 +277,91 @@ class FileManager:
                 'path': temp_dir,
                 'created': time.time()
             })
+            self.janitor.register(temp_dir)
             return temp_dir
         except Exception as e:
             print(f"Error creating temp directory: {str(e)}")
             return None
     
-    def cleanup_temp_directories(self, max_age_hours=24):
-        """Clean up temporary directories older than max_age_hours"""
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-        
-        directories_to_remove = []
+    def create_staging_directory(self, destination_dir, prefix="youtube_download_"):
+        """Create a work directory on the same filesystem as destination_dir.
         
-        for temp_dir in self.temp_directories:
-            if current_time - temp_dir['created'] > max_age_seconds:
-                try:
-                    if os.path.exists(temp_dir['path']):
-                        shutil.rmtree(temp_dir['path'])
-                    directories_to_remove.append(temp_dir)
-                except Exception as e:
-                    print(f"Error removing temp directory {temp_dir['path']}: {str(e)}")
+        Files downloaded here can be finalised with a rename, so delivering a
+        multi-GB file costs the same as delivering a small one.
+        """
+        try:
+            self.ensure_directory_exists(destination_dir)
+            staging_root = os.path.join(destination_dir, STAGING_DIR_NAME)
+            os.makedirs(staging_root, exist_ok=True)
+            if os.stat(staging_root).st_dev != os.stat(destination_dir).st_dev:
+                # A mount point inside the destination; fall back to the system temp dir
+                return self.create_temp_directory(prefix)
+            temp_dir = tempfile.mkdtemp(prefix=prefix, dir=staging_root)
+            self.temp_directories.append({
+                'path': temp_dir,
+                'created': time.time()
+            })
+            self.janitor.register(temp_dir)
+            return temp_dir
+        except Exception as e:
+            print(f"Error creating staging directory in {destination_dir}: {str(e)}")
+            return self.create_temp_directory(prefix)
+    
+    def remove_staging_directory(self, path):
+        """Delete a staging directory, and the hidden staging root once no other job uses it"""
+        shutil.rmtree(path, ignore_errors=True)
+        self.janitor.unregister(path)
+        self.temp_directories = [d for d in self.temp_directories if d['path'] != path]
+        staging_root = os.path.dirname(os.path.abspath(path))
+        if os.path.basename(staging_root) == STAGING_DIR_NAME:
+            try:
+                os.rmdir(staging_root)
+            except OSError:
+                pass  # Still holds another job's staging directory
+    
+    def finalize_file(self, source_path, destination_path, shared=False):
+        """Deliver a finished file to its destination without copying when possible.
         
-        # Remove cleaned directories from tracking
-        for temp_dir in directories_to_remove:
-            self.temp_directories.remove(temp_dir)
+        Private files are renamed into place with os.replace (atomic on the same
+        filesystem). Shared files, such as cached artifacts that must stay in
+        place, are reflinked or hardlinked. Returns the method used, or None on
+        failure.
+        """
+        with span('finalise') as current:
+            method = self._finalize_file(source_path, destination_path, shared)
+            current.attrs['method'] = method
+            if method:
+                current.add_bytes(self.get_file_size(destination_path))
+            else:
+                current.status = 'failed'
+            return method
+    
+    def _finalize_file(self, source_path, destination_path, shared):
+        try:
+            self.ensure_directory_exists(os.path.dirname(destination_path))
+            if shared:
+                return link_or_copy(source_path, destination_path)
+            try:
+                os.replace(source_path, destination_path)
+                return 'rename'
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+            method = link_or_copy(source_path, destination_path)
+            os.remove(source_path)
+            return method
+        except Exception as e:
+            print(f"Error finalizing {source_path} to {destination_path}: {str(e)}")
+            return None
+    
+    def cleanup_temp_directories(self, max_age_hours=24):
+        """Clean up temporary directories older than max_age_hours"""
+        self.janitor.sweep(max_age_hours)
+        self.temp_directories = [d for d in self.temp_directories if os.path.exists(d['path'])]
     
     def start_cleanup_thread(self):
-        """Start background thread for periodic cleanup"""
-        def cleanup_worker():
-            while True:
-                try:
-                    self.cleanup_temp_directories()
-                    time.sleep(3600)  # Check every hour
-                except Exception as e:
-                    print(f"Error in cleanup thread: {str(e)}")
-                    time.sleep(3600)
-        
-        if not self.cleanup_thread or not self.cleanup_thread.is_alive():
-            self.cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
-            self.cleanup_thread.start()
+        """Make sure the shared background cleanup thread is running"""
+        self.janitor.start()
     
     def get_safe_filename(self, filename, max_length=100):
         """Generate a safe filename for the filesystem"""
@@ -171,6 +475,7 @@ class FileManager:
             try:
                 if os.path.exists(temp_dir['path']):
                     shutil.rmtree(temp_dir['path'])
+                self.janitor.unregister(temp_dir['path'])
             except Exception as e:
                 print(f"Error cleaning up temp directory {temp_dir['path']}: {str(e)}")
         
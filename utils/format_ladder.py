@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+# One selectable video quality; tuple-backed so a ladder costs a few hundred bytes per video
+FormatEntry = namedtuple('FormatEntry', [
+    'label', 'format_id', 'height', 'fps', 'ext', 'vcodec', 'acodec',
+    'filesize', 'estimated_size', 'audio_format_id',
+])
+
+
+class FormatLadder:
+    """Best video format per height, sorted highest first, with audio pairing and size estimates.
+
+    Built once from a yt-dlp format list; the UI keeps this instead of the
+    raw list, so a rerun only reads ``labels`` and looks up the selection.
+    """
+
+    __slots__ = ('video_id', 'entries', 'audio_format_id', '_by_label')
+
+    def __init__(self, video_id, entries, audio_format_id=None):
+        self.video_id = video_id
+        self.entries = tuple(entries)
+        self.audio_format_id = audio_format_id
+        self._by_label = {entry.label: entry for entry in self.entries}
+
+    @classmethod
+    def from_formats(cls, video_id, formats):
+        audio_by_ext = {}
+        for fmt in formats:
+            if fmt.get('vcodec') == 'none' and fmt.get('acodec') not in (None, 'none'):
+                ext = fmt.get('ext')
+                if ext not in audio_by_ext or _bitrate(fmt) > _bitrate(audio_by_ext[ext]):
+                    audio_by_ext[ext] = fmt
+        best_audio = max(audio_by_ext.values(), key=_bitrate) if audio_by_ext else None
+
+        # Group by resolution (height), pick best (largest filesize, then bitrate)
+        best_formats = {}
+        for fmt in formats:
+            if fmt.get('vcodec') != 'none' and fmt.get('height'):
+                height = fmt['height']
+                if height not in best_formats or _rank(fmt) > _rank(best_formats[height]):
+                    best_formats[height] = fmt
+
+        entries = []
+        for height in sorted(best_formats, reverse=True):
+            fmt = best_formats[height]
+            audio = None
+            if fmt.get('acodec') in (None, 'none'):
+                # yt-dlp merges video-only streams with audio; mp4 pairs with m4a without re-muxing
+                audio = audio_by_ext.get('m4a' if fmt.get('ext') == 'mp4' else 'webm') or best_audio
+            filesize = _size(fmt)
+            estimated_size = filesize + _size(audio) if filesize and audio else filesize
+            fps = fmt.get('fps') or 30
+            label = f"{height}p"
+            if fps > 30:
+                label += f" {fps}fps"
+            if estimated_size:
+                label += f" (~{estimated_size / (1024 * 1024):.1f}MB)"
+            label += f" ({(fmt.get('ext') or '').upper()})"
+            entries.append(FormatEntry(
+                label, fmt.get('format_id'), height, fps, fmt.get('ext', ''),
+                fmt.get('vcodec'), fmt.get('acodec') if audio is None else audio.get('acodec'),
+                fmt.get('filesize'), estimated_size, audio.get('format_id') if audio else None,
+            ))
+        return cls(video_id, entries, best_audio.get('format_id') if best_audio else None)
+
+    @property
+    def labels(self):
+        return [entry.label for entry in self.entries]
+
+    def by_label(self, label):
+        return self._by_label.get(label)
+
+    def as_dicts(self):
+        """Plain dicts for JSON output"""
+        return [entry._asdict() for entry in self.entries]
+
+    def best(self):
+        return self.entries[0] if self.entries else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+
+def _size(fmt):
+    if not fmt:
+        return None
+    return fmt.get('filesize') or fmt.get('filesize_approx')
+
+
+def _bitrate(fmt):
+    return fmt.get('abr') or fmt.get('tbr') or 0
+
+
+def _rank(fmt):
+    return (_size(fmt) or 0, fmt.get('tbr') or 0)
+
+
+_ladder_cache = OrderedDict()
+_ladder_cache_lock = threading.Lock()
+LADDER_CACHE_SIZE = 256
+
+
+def get_format_ladder(video_id, formats):
+    """Return the FormatLadder for video_id, building it from formats only on first use"""
+    if video_id:
+        with _ladder_cache_lock:
+            ladder = _ladder_cache.get(video_id)
+            if ladder is not None:
+                _ladder_cache.move_to_end(video_id)
+                return ladder
+    ladder = FormatLadder.from_formats(video_id, formats or [])
+    if video_id:
+        with _ladder_cache_lock:
+            _ladder_cache[video_id] = ladder
+            while len(_ladder_cache) > LADDER_CACHE_SIZE:
+                _ladder_cache.popitem(last=False)
+    return ladder
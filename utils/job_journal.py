@@ -0,0 +1,119 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+DEFAULT_JOURNAL_PATH = str(Path.home() / ".cache" / "youtube_downloader" / "jobs.sqlite3")
+
+# Journal states; only 'pending' and 'running' jobs are resumed after a restart
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+UNFINISHED_STATES = (PENDING, RUNNING)
+
+
+class JobJournal:
+    """Crash-safe record of download jobs in SQLite.
+
+    Each entry holds the URL, the format, the full job spec needed to rebuild
+    the job and the staging path its partial files live in, so a restarted
+    process can resume unfinished jobs from their .part files.
+    """
+
+    def __init__(self, db_path=DEFAULT_JOURNAL_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL + synchronous=NORMAL survives process crashes without an fsync per update
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, url TEXT NOT NULL, format_id TEXT, spec TEXT NOT NULL, '
+            'staging_path TEXT, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+            'result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def record(self, url, spec, staging_path=None, format_id=None):
+        """Add a new pending job and return its journal id"""
+        journal_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (id, url, format_id, spec, staging_path, state, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (journal_id, url, format_id, json.dumps(spec), staging_path, PENDING, now, now)
+            )
+            self._conn.commit()
+        return journal_id
+
+    def mark_running(self, journal_id):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE id = ?',
+                (RUNNING, time.time(), journal_id)
+            )
+            self._conn.commit()
+
+    def mark_finished(self, journal_id, state, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET state = ?, result = ?, error = ?, updated = ? WHERE id = ?',
+                (state, result, error, time.time(), journal_id)
+            )
+            self._conn.commit()
+
+    def get(self, journal_id):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (journal_id,)).fetchone()
+            columns = [c[0] for c in self._conn.execute('SELECT * FROM jobs LIMIT 0').description]
+        return self._to_dict(columns, row) if row else None
+
+    def unfinished(self, max_attempts=5):
+        """Jobs that were pending or running when the process stopped"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT * FROM jobs WHERE state IN (?, ?) AND attempts < ? ORDER BY created',
+                (*UNFINISHED_STATES, max_attempts)
+            )
+            columns = [c[0] for c in cursor.description]
+            rows = cursor.fetchall()
+        return [self._to_dict(columns, row) for row in rows]
+
+    def purge(self, max_age=7 * 24 * 3600):
+        """Drop finished entries older than max_age seconds"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM jobs WHERE state NOT IN (?, ?) AND updated < ?',
+                (*UNFINISHED_STATES, time.time() - max_age)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    @staticmethod
+    def _to_dict(columns, row):
+        entry = dict(zip(columns, row))
+        entry['spec'] = json.loads(entry['spec'])
+        return entry
+
+
+_shared_journal = None
+_shared_journal_lock = threading.Lock()
+
+
+def get_job_journal():
+    """Return the process-wide JobJournal, creating it on first use"""
+    global _shared_journal
+    with _shared_journal_lock:
+        if _shared_journal is None:
+            _shared_journal = JobJournal()
+        return _shared_journal
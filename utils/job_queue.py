@@ -0,0 +1,312 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.progress import ProgressBus, ProgressChannel, format_bytes, format_eta
+from utils.metrics import Trace, activate_trace
+
+# Job states, in the order a successful job passes through them
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+PROCESSING = 'processing'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work functions once the job has been cancelled"""
+
+
+class DownloadJob:
+    """State for one download plus its post-processing steps"""
+
+    def __init__(self, download, post_process=None, finalize=None, description='', on_finish=None,
+                 progress_channel=None, manages_slots=False):
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self.download = download
+        self.manages_slots = manages_slots
+        self.post_process = list(post_process or [])
+        self.finalize = finalize
+        self.on_finish = on_finish
+        self.progress_channel = progress_channel or ProgressChannel()
+        self.trace = Trace(self.id)
+        self.state = QUEUED
+        self.progress = 0.0
+        self.status_message = 'Queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Abort the current stage if the job was cancelled"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def update(self, state=None, progress=None, status_message=None):
+        """Record progress from a worker thread"""
+        with self._lock:
+            if state is not None:
+                self.state = state
+            if progress is not None:
+                self.progress = min(max(progress, 0.0), 100.0)
+            if status_message is not None:
+                self.status_message = status_message
+
+    def progress_callback(self, progress_data):
+        """Progress callback compatible with YouTubeDownloader's download methods.
+
+        Called for every chunk yt-dlp writes; the progress channel drops all but
+        a few updates per second, so the job itself is only touched for those.
+        """
+        self.check_cancelled()
+        event = self.progress_channel.publish(progress_data)
+        if event is None:
+            return
+        if event['status'] == 'finished':
+            self.update(status_message="Processing and finalizing...")
+        elif event['percent']:
+            message = f"Downloading... {event['percent']:.1f}%"
+            if event['speed']:
+                message += f" ({format_bytes(event['speed'])}/s, ETA {format_eta(event['eta'])})"
+            self.update(progress=event['percent'], status_message=message)
+
+    def snapshot(self):
+        """Return a plain dict describing the job, safe to hand to the UI"""
+        latest = self.progress_channel.latest() or {}
+        with self._lock:
+            return {
+                'id': self.id,
+                'description': self.description,
+                'state': self.state,
+                'progress': self.progress,
+                'status': self.status_message,
+                'result': self.result,
+                'error': self.error,
+                'downloaded_bytes': latest.get('downloaded_bytes'),
+                'total_bytes': latest.get('total_bytes'),
+                'speed': latest.get('speed'),
+                'eta': latest.get('eta'),
+                'created': self.created,
+                'started': self.started,
+                'finished': self.finished,
+            }
+
+
+class JobScheduler:
+    """Runs download jobs on bounded worker pools.
+
+    Network downloads and ffmpeg post-processing use separate pools so that
+    CPU-heavy encodes never hold a download slot, and vice versa. At most
+    max_downloads transfers run at once, including the entries of batch jobs.
+    """
+
+    def __init__(self, max_downloads=4, max_post_processing=None, keep_finished=200, progress_bus=None,
+                 trace_dir=None):
+        if max_post_processing is None:
+            max_post_processing = max(1, (os.cpu_count() or 2) // 2)
+        self.max_downloads = max_downloads
+        self.max_post_processing = max_post_processing
+        self.keep_finished = keep_finished
+        self.trace_dir = trace_dir
+        self._download_pool = ThreadPoolExecutor(max_workers=max_downloads, thread_name_prefix='download')
+        self._process_pool = ThreadPoolExecutor(max_workers=max_post_processing, thread_name_prefix='postprocess')
+        # Batch jobs mostly wait on their entries, so they run here and not in a download slot
+        self._batch_pool = ThreadPoolExecutor(max_workers=max_downloads, thread_name_prefix='batch')
+        self._download_slots = threading.BoundedSemaphore(max_downloads)
+        self.progress_bus = progress_bus or ProgressBus()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, download, post_process=None, finalize=None, description='', on_finish=None,
+               manages_slots=False):
+        """Queue a job and return its id.
+
+        download(job) runs on the download pool and returns a file path. Each
+        post_process step is called as step(path) -> path on the processing
+        pool, and finalize(path) -> path runs last to deliver the file.
+        on_finish(snapshot) is called once the job completes, fails or is cancelled.
+        A job that runs several transfers (a batch) passes manages_slots=True and
+        holds download_slot() around each of them instead of one slot throughout.
+        """
+        job = DownloadJob(download, post_process, finalize, description, on_finish,
+                          self.progress_bus.create_channel(), manages_slots)
+        self.progress_bus.register(job.id, job.progress_channel)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_finished()
+        pool = self._batch_pool if manages_slots else self._download_pool
+        job.future = pool.submit(self._run_download, job)
+        return job.id
+
+    def download_slot(self):
+        """Context manager holding one of the max_downloads transfer slots"""
+        return self._download_slots
+
+    def cancel(self, job_id):
+        """Request cancellation; returns False if the job is unknown or already finished"""
+        job = self.get_job(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return False
+        job._cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED, status_message='Cancelled')
+        return True
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_status(self, job_id):
+        """Return a snapshot dict for the job, or None if it is unknown"""
+        job = self.get_job(job_id)
+        return job.snapshot() if job else None
+
+    def get_progress_events(self, job_id, since=0):
+        """Return the job's buffered progress events newer than sequence number since"""
+        return self.progress_bus.events(job_id, since)
+
+    def get_trace(self, job_id):
+        """Return the job's stage spans as a JSON-ready dict, or None if the job is unknown"""
+        job = self.get_job(job_id)
+        return job.trace.to_dict() if job else None
+
+    def list_jobs(self):
+        """Return snapshots of every tracked job, oldest first"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.snapshot() for job in sorted(jobs, key=lambda j: j.created)]
+
+    def get_stats(self):
+        """Return counts of jobs by state along with the pool limits"""
+        counts = {}
+        for job in self.list_jobs():
+            counts[job['state']] = counts.get(job['state'], 0) + 1
+        return {
+            'max_downloads': self.max_downloads,
+            'max_post_processing': self.max_post_processing,
+            'jobs': counts,
+        }
+
+    def shutdown(self, wait=True):
+        # Downloads hand off to the processing pool, so drain them first
+        self._batch_pool.shutdown(wait=wait)
+        self._download_pool.shutdown(wait=wait)
+        self._process_pool.shutdown(wait=wait)
+
+    def _run_download(self, job):
+        job.started = time.time()
+        with activate_trace(job.trace):
+            self._download_stage(job)
+
+    def _download_stage(self, job):
+        try:
+            job.check_cancelled()
+            if job.manages_slots:
+                job.update(state=DOWNLOADING, status_message='Starting download...')
+                path = job.download(job)
+            else:
+                with self._download_slots:
+                    job.check_cancelled()
+                    job.update(state=DOWNLOADING, status_message='Starting download...')
+                    path = job.download(job)
+            job.check_cancelled()
+            if not path:
+                self._finish(job, FAILED, error='Download failed', status_message='Download failed!')
+                return
+            if job.post_process:
+                job.update(state=PROCESSING, status_message='Post-processing...')
+                job.future = self._process_pool.submit(self._run_post_process, job, path)
+            else:
+                self._run_finalize(job, path)
+        except JobCancelled:
+            self._finish(job, CANCELLED, status_message='Cancelled')
+        except Exception as e:
+            print(f"Error in download job {job.id}: {str(e)}")
+            self._finish(job, FAILED, error=str(e), status_message=f"Error: {str(e)}")
+
+    def _run_post_process(self, job, path):
+        with activate_trace(job.trace):
+            self._post_process_stage(job, path)
+
+    def _post_process_stage(self, job, path):
+        try:
+            for step in job.post_process:
+                job.check_cancelled()
+                path = step(path) or path
+            job.check_cancelled()
+            self._run_finalize(job, path)
+        except JobCancelled:
+            self._finish(job, CANCELLED, status_message='Cancelled')
+        except Exception as e:
+            print(f"Error post-processing job {job.id}: {str(e)}")
+            self._finish(job, FAILED, error=str(e), status_message=f"Error: {str(e)}")
+
+    def _run_finalize(self, job, path):
+        if job.finalize:
+            path = job.finalize(path)
+        if not path:
+            self._finish(job, FAILED, error='Could not deliver file', status_message='Download failed!')
+            return
+        job.result = path
+        job.update(progress=100.0)
+        self._finish(job, COMPLETED, status_message='Download completed!')
+
+    def _finish(self, job, state, error=None, status_message=None):
+        job.error = error
+        job.finished = time.time()
+        job.update(state=state, status_message=status_message)
+        if self.trace_dir:
+            try:
+                job.trace.write(self.trace_dir)
+            except OSError as e:
+                print(f"Error writing trace for job {job.id}: {str(e)}")
+        if job.on_finish:
+            try:
+                job.on_finish(job.snapshot())
+            except Exception as e:
+                print(f"Error in on_finish for job {job.id}: {str(e)}")
+
+    def _prune_finished(self):
+        """Forget the oldest finished jobs beyond keep_finished; caller holds the lock"""
+        finished = [j for j in self._jobs.values() if j.state in FINISHED_STATES]
+        if len(finished) <= self.keep_finished:
+            return
+        finished.sort(key=lambda j: j.finished or j.created)
+        for job in finished[:len(finished) - self.keep_finished]:
+            del self._jobs[job.id]
+            self.progress_bus.drop(job.id)
+
+
+_shared_scheduler = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_job_scheduler():
+    """Return the process-wide JobScheduler, sized from YTD_MAX_DOWNLOADS / YTD_MAX_POSTPROCESS.
+
+    Set YTD_TRACE_DIR to write each finished job's trace there as JSON.
+    """
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            max_post = os.environ.get('YTD_MAX_POSTPROCESS')
+            _shared_scheduler = JobScheduler(
+                max_downloads=int(os.environ.get('YTD_MAX_DOWNLOADS', 4)),
+                max_post_processing=int(max_post) if max_post else None,
+                trace_dir=os.environ.get('YTD_TRACE_DIR'),
+            )
+        return _shared_scheduler
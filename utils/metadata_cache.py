@@ -0,0 +1,192 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_CACHE_PATH = str(Path.home() / ".cache" / "youtube_downloader" / "metadata.sqlite3")
+
+
+class MetadataCache:
+    """Two-level cache for yt-dlp info dicts: in-memory LRU in front of SQLite on disk.
+
+    Entries are keyed by video id. Metadata is served for ``ttl`` seconds; the
+    signed format URLs inside it expire much sooner, so callers that are about
+    to download ask for ``fresh_urls`` and get a miss once ``url_ttl`` (or the
+    ``expire=`` stamp YouTube puts in the URLs) has passed.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, ttl=24 * 3600, url_ttl=30 * 60, memory_size=128):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.url_ttl = url_ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        self._conn = None
+        self._open_database()
+
+    def _open_database(self):
+        """Open the SQLite store, falling back to memory-only caching on failure"""
+        try:
+            if self.db_path != ':memory:':
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS metadata ('
+                'video_id TEXT PRIMARY KEY, info TEXT NOT NULL, '
+                'fetched_at REAL NOT NULL, urls_expire_at REAL NOT NULL)'
+            )
+            self._conn.commit()
+        except Exception as e:
+            print(f"Error opening metadata cache {self.db_path}: {str(e)}")
+            self._conn = None
+
+    def get(self, video_id, fresh_urls=False):
+        """Return the cached info dict for video_id, or None on a miss"""
+        if not video_id:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(video_id)
+            source = 'memory_hits'
+            if entry is None:
+                entry = self._load(video_id)
+                source = 'disk_hits'
+
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            info, fetched_at, urls_expire_at = entry
+            if now - fetched_at > self.ttl:
+                self._delete(video_id)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            if fresh_urls and now >= urls_expire_at:
+                self.stats['misses'] += 1
+                return None
+
+            self._remember(video_id, entry)
+            self.stats['hits'] += 1
+            self.stats[source] += 1
+            return info
+
+    def put(self, video_id, info):
+        """Store an info dict for video_id in memory and on disk"""
+        if not video_id or not info:
+            return
+        fetched_at = time.time()
+        entry = (info, fetched_at, self._urls_expire_at(info, fetched_at))
+        with self._lock:
+            self._remember(video_id, entry)
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)',
+                        (video_id, json.dumps(info), entry[1], entry[2])
+                    )
+                    self._conn.commit()
+                except Exception as e:
+                    print(f"Error writing metadata cache: {str(e)}")
+
+    def invalidate(self, video_id):
+        """Drop a single entry from both levels"""
+        with self._lock:
+            self._delete(video_id)
+
+    def clear(self):
+        """Drop every entry from both levels"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM metadata')
+                self._conn.commit()
+
+    def purge_expired(self):
+        """Delete on-disk entries older than the TTL, returning how many were removed"""
+        if self._conn is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM metadata WHERE fetched_at < ?', (cutoff,))
+            self._conn.commit()
+            for video_id in [k for k, v in self._memory.items() if v[1] < cutoff]:
+                del self._memory[video_id]
+            self.stats['expired'] += cursor.rowcount
+            return cursor.rowcount
+
+    def get_stats(self):
+        """Return a snapshot of hit/miss/eviction counters and current sizes"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, video_id, entry):
+        """Insert into the in-memory LRU, evicting the least recently used entries"""
+        self._memory[video_id] = entry
+        self._memory.move_to_end(video_id)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _load(self, video_id):
+        """Read an entry from SQLite"""
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute(
+                'SELECT info, fetched_at, urls_expire_at FROM metadata WHERE video_id = ?',
+                (video_id,)
+            ).fetchone()
+        except Exception as e:
+            print(f"Error reading metadata cache: {str(e)}")
+            return None
+        if row is None:
+            return None
+        return (json.loads(row[0]), row[1], row[2])
+
+    def _delete(self, video_id):
+        """Remove an entry from both levels; caller holds the lock"""
+        self._memory.pop(video_id, None)
+        if self._conn is not None:
+            self._conn.execute('DELETE FROM metadata WHERE video_id = ?', (video_id,))
+            self._conn.commit()
+
+    def _urls_expire_at(self, info, fetched_at):
+        """Earliest moment any signed format URL in info stops working"""
+        expire_at = fetched_at + self.url_ttl
+        for fmt in info.get('formats') or []:
+            url = fmt.get('url') if isinstance(fmt, dict) else None
+            if not url or 'expire' not in url:
+                continue
+            try:
+                expire = parse_qs(urlparse(url).query).get('expire')
+                if expire:
+                    # Leave a minute of slack for the download to start
+                    expire_at = min(expire_at, float(expire[0]) - 60)
+            except ValueError:
+                continue
+        return expire_at
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    """Return the process-wide MetadataCache, creating it on first use"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = MetadataCache()
+        return _shared_cache
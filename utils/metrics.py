@@ -0,0 +1,253 @@
+import os
+import contextvars
+import functools
+import json
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import itertools
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 15, 30, 60, 120, 300, 600)
+
+# Trace of the job running on this thread, and the spans currently open in it
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_open_spans = contextvars.ContextVar('open_spans', default=())
+_span_ids = itertools.count(1)
+# Segment encodes charge CPU to the same open spans from several threads
+_cpu_lock = threading.Lock()
+
+
+class Span:
+    """One timed stage of a job"""
+
+    def __init__(self, stage, parent=None, attrs=None):
+        self.id = next(_span_ids)
+        self.stage = stage
+        self.parent = parent
+        self.attrs = dict(attrs or {})
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.status = 'ok'
+        self.error = None
+        self.bytes = None
+        self.cpu_user = 0.0
+        self.cpu_system = 0.0
+        self.subprocesses = 0
+
+    def add_bytes(self, num_bytes):
+        if num_bytes:
+            self.bytes = (self.bytes or 0) + num_bytes
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'stage': self.stage,
+            'parent_id': self.parent.id if self.parent else None,
+            'started': self.started,
+            'duration': self.duration,
+            'status': self.status,
+            'error': self.error,
+            'bytes': self.bytes,
+            'throughput': self.bytes / self.duration if self.bytes and self.duration else None,
+            'cpu_user': self.cpu_user,
+            'cpu_system': self.cpu_system,
+            'subprocesses': self.subprocesses,
+            **self.attrs,
+        }
+
+
+class Trace:
+    """Spans recorded for one job, exportable as JSON"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        # Exclusive time per stage: a span's duration minus that of the spans nested in it
+        # (clamped, since parallel children can add up to more than their parent)
+        nested = {}
+        for span in spans:
+            if span['parent_id'] is not None:
+                nested[span['parent_id']] = nested.get(span['parent_id'], 0.0) + (span['duration'] or 0.0)
+        totals = {}
+        for span in spans:
+            exclusive = max((span['duration'] or 0.0) - nested.get(span['id'], 0.0), 0.0)
+            totals[span['stage']] = totals.get(span['stage'], 0.0) + exclusive
+        return {'job_id': self.job_id, 'started': self.started, 'stage_seconds': totals, 'spans': spans}
+
+    def write(self, directory):
+        """Write the trace as <directory>/<job id>.json"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.job_id}.json")
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+class MetricsRegistry:
+    """Process-wide stage counters and duration histograms in Prometheus text format"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, span):
+        with self._lock:
+            stats = self._stages.setdefault(span.stage, {
+                'count': {}, 'seconds': 0.0, 'buckets': [0] * len(self.buckets),
+                'bytes': 0, 'cpu': 0.0, 'subprocesses': 0,
+            })
+            stats['count'][span.status] = stats['count'].get(span.status, 0) + 1
+            stats['seconds'] += span.duration
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    stats['buckets'][i] += 1
+            stats['bytes'] += span.bytes or 0
+            stats['cpu'] += span.cpu_user + span.cpu_system
+            stats['subprocesses'] += span.subprocesses
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: {**stats, 'count': dict(stats['count']), 'buckets': list(stats['buckets'])}
+                    for stage, stats in self._stages.items()}
+
+    def render_prometheus(self):
+        lines = [
+            '# HELP ytd_stage_total Completed pipeline stages by status',
+            '# TYPE ytd_stage_total counter',
+        ]
+        stages = self.snapshot()
+        for stage, stats in sorted(stages.items()):
+            for status, count in sorted(stats['count'].items()):
+                lines.append(f'ytd_stage_total{{stage="{stage}",status="{status}"}} {count}')
+        lines += [
+            '# HELP ytd_stage_duration_seconds Wall-clock time per pipeline stage',
+            '# TYPE ytd_stage_duration_seconds histogram',
+        ]
+        for stage, stats in sorted(stages.items()):
+            for bound, count in zip(self.buckets, stats['buckets']):
+                lines.append(f'ytd_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            total = sum(stats['count'].values())
+            lines.append(f'ytd_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {total}')
+            lines.append(f'ytd_stage_duration_seconds_sum{{stage="{stage}"}} {stats["seconds"]:.6f}')
+            lines.append(f'ytd_stage_duration_seconds_count{{stage="{stage}"}} {total}')
+        for name, key, kind, help_text in (
+            ('ytd_stage_bytes_total', 'bytes', 'counter', 'Bytes produced per pipeline stage'),
+            ('ytd_stage_subprocess_cpu_seconds_total', 'cpu', 'counter', 'CPU time of ffmpeg/ffprobe per stage'),
+            ('ytd_stage_subprocesses_total', 'subprocesses', 'counter', 'Subprocesses run per stage'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for stage, stats in sorted(stages.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """Return the process-wide MetricsRegistry"""
+    return _registry
+
+
+@contextmanager
+def activate_trace(trace):
+    """Attribute spans opened in this block (on this thread) to trace"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage, **attrs):
+    """Time a stage; nested spans record their parent"""
+    stack = _open_spans.get()
+    current = Span(stage, stack[-1] if stack else None, attrs)
+    token = _open_spans.set(stack + (current,))
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'error'
+        current.error = str(e)
+        raise
+    finally:
+        _open_spans.reset(token)
+        current.duration = time.perf_counter() - current._start
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(current)
+        _registry.observe(current)
+
+
+def instrumented(stage):
+    """Decorator: run the method inside a span; a None/False result counts as a failure.
+
+    When the result is a file path, its size is recorded as the stage's bytes.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, method=fn.__name__) as current:
+                result = fn(*args, **kwargs)
+                if result is None or result is False:
+                    current.status = 'failed'
+                elif isinstance(result, str) and os.path.isfile(result):
+                    current.add_bytes(os.path.getsize(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def run_command(cmd, check=True):
+    """subprocess.run(cmd) with captured output, charging the child's CPU time to the open spans.
+
+    The child is reaped with os.wait4 so its own rusage is read, which stays
+    accurate when several jobs run ffmpeg at once.
+    """
+    if not hasattr(os, 'wait4'):
+        return subprocess.run(cmd, check=check, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdout=out, stderr=err)
+        try:
+            _, status, usage = os.wait4(proc.pid, 0)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        err.seek(0)
+        result = subprocess.CompletedProcess(cmd, proc.returncode, out.read(), err.read())
+    with _cpu_lock:
+        for open_span in _open_spans.get():
+            open_span.cpu_user += usage.ru_utime
+            open_span.cpu_system += usage.ru_stime
+            open_span.subprocesses += 1
+    if check:
+        result.check_returncode()
+    return result
+
+
+def submit_with_context(pool, fn, *args):
+    """pool.submit that keeps the caller's trace and open spans in the worker thread"""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+
+# Terminal yt-dlp statuses are always recorded, whatever the rate limit
+FINAL_STATUSES = ('finished', 'error')
+
+
+class ProgressChannel:
+    """Thread-safe ring buffer of coalesced progress events for one job.
+
+    Download threads publish every yt-dlp update; at most one event per
+    ``min_interval`` seconds is kept, each enriched with speed, ETA and byte
+    counts. Readers poll ``latest()`` or ``events(since)`` from the UI thread.
+    """
+
+    def __init__(self, capacity=64, min_interval=0.25, smoothing=0.3):
+        self.min_interval = min_interval
+        self.smoothing = smoothing
+        self._events = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._last_emit = 0.0
+        self._latest = None
+        self._filename = None
+        self._sample = None
+        self._speed = None
+        self._done_bytes = 0
+        self._done_total = 0
+        self.dropped = 0
+
+    def publish(self, progress_data):
+        """Offer an update; returns the recorded event, or None if it was coalesced away"""
+        now = time.monotonic()
+        status = progress_data.get('status')
+        with self._lock:
+            if status not in FINAL_STATUSES and now - self._last_emit < self.min_interval:
+                self.dropped += 1
+                return None
+            event = self._build_event(progress_data, now)
+            self._last_emit = now
+            self._seq += 1
+            event['seq'] = self._seq
+            self._events.append(event)
+            self._latest = event
+            return event
+
+    def latest(self):
+        with self._lock:
+            return dict(self._latest) if self._latest else None
+
+    def events(self, since=0):
+        """Return buffered events with a sequence number greater than since"""
+        with self._lock:
+            return [dict(event) for event in self._events if event['seq'] > since]
+
+    def _build_event(self, progress_data, now):
+        """Add cumulative bytes, smoothed speed and ETA; caller holds the lock"""
+        filename = progress_data.get('filename')
+        downloaded = progress_data.get('downloaded_bytes')
+        total = progress_data.get('total_bytes')
+        if filename != self._filename:
+            # yt-dlp restarts its byte counters for every file (video, audio, ...)
+            if self._latest and self._latest.get('file_bytes') is not None:
+                self._done_bytes += self._latest['file_bytes']
+                self._done_total += self._latest.get('file_total') or self._latest['file_bytes']
+            self._filename = filename
+            self._sample = None
+        if downloaded is not None:
+            if self._sample is not None and now > self._sample[1]:
+                rate = max(downloaded - self._sample[0], 0) / (now - self._sample[1])
+                self._speed = rate if self._speed is None else (
+                    self.smoothing * rate + (1 - self.smoothing) * self._speed
+                )
+            self._sample = (downloaded, now)
+        eta = None
+        if self._speed and total and downloaded is not None:
+            eta = max(total - downloaded, 0) / self._speed
+        return {
+            'time': time.time(),
+            'status': progress_data.get('status'),
+            'percent': progress_data.get('percent'),
+            'filename': filename,
+            'file_bytes': downloaded,
+            'file_total': total,
+            'downloaded_bytes': self._done_bytes + (downloaded or 0),
+            'total_bytes': self._done_total + total if total else None,
+            'speed': self._speed,
+            'eta': eta,
+        }
+
+
+class ProgressBus:
+    """Registry of progress channels keyed by job id"""
+
+    def __init__(self, capacity=64, min_interval=0.25):
+        self.capacity = capacity
+        self.min_interval = min_interval
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def create_channel(self):
+        return ProgressChannel(self.capacity, self.min_interval)
+
+    def register(self, job_id, channel):
+        with self._lock:
+            self._channels[job_id] = channel
+
+    def channel(self, job_id):
+        """Return the channel for job_id, creating it on first use"""
+        with self._lock:
+            if job_id not in self._channels:
+                self._channels[job_id] = self.create_channel()
+            return self._channels[job_id]
+
+    def publish(self, job_id, progress_data):
+        return self.channel(job_id).publish(progress_data)
+
+    def latest(self, job_id):
+        with self._lock:
+            channel = self._channels.get(job_id)
+        return channel.latest() if channel else None
+
+    def events(self, job_id, since=0):
+        with self._lock:
+            channel = self._channels.get(job_id)
+        return channel.events(since) if channel else []
+
+    def drop(self, job_id):
+        with self._lock:
+            self._channels.pop(job_id, None)
+
+
+def format_bytes(num_bytes):
+    """Human readable size, e.g. 12.3MB"""
+    if num_bytes is None:
+        return 'N/A'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}TB"
+
+
+def format_eta(seconds):
+    """Format an ETA in seconds as M:SS or H:MM:SS"""
+    if seconds is None:
+        return 'N/A'
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils.downloader import search_youtube
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search query"""
+    return ' '.join((query or '').lower().split())
+
+
+class SearchService:
+    """Paginated YouTube search with a TTL cache and in-flight request coalescing.
+
+    Results are cached per (normalised query, page). Concurrent requests for
+    the same page share one yt-dlp extraction, and after a page is served the
+    next one is fetched in the background so "Next" is usually a cache hit.
+    """
+
+    def __init__(self, search=search_youtube, page_size=5, ttl=10 * 60, max_entries=256,
+                 prefetch=True, max_workers=2):
+        self.search = search
+        self.page_size = page_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefetch = prefetch
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search')
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'prefetches': 0}
+
+    def get_page(self, query, page=0):
+        """Return the results on page (0-based) for query, blocking until they are available"""
+        key = (normalize_query(query), page)
+        if not key[0]:
+            return []
+        future, owner = self._lookup(key)
+        if owner:
+            self._fetch(key, future)
+        results = future.result()
+        if self.prefetch and results and len(results) == self.page_size:
+            self.prefetch_page(query, page + 1)
+        return results
+
+    def prefetch_page(self, query, page):
+        """Start fetching a page in the background unless it is cached or already in flight"""
+        key = (normalize_query(query), page)
+        future, owner = self._lookup(key, count=False)
+        if owner:
+            with self._lock:
+                self.stats['prefetches'] += 1
+            self._executor.submit(self._fetch, key, future)
+        return future
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._cache)
+            stats['in_flight'] = len(self._in_flight)
+        return stats
+
+    def _lookup(self, key, count=True):
+        """Return (future, owner); owner is True when the caller must run the fetch"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                self._cache.move_to_end(key)
+                if count:
+                    self.stats['hits'] += 1
+                future = Future()
+                future.set_result(entry[0])
+                return future, False
+            if key in self._in_flight:
+                if count:
+                    self.stats['coalesced'] += 1
+                return self._in_flight[key], False
+            if count:
+                self.stats['misses'] += 1
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _fetch(self, key, future):
+        query, page = key
+        try:
+            results = self.search(query, max_results=self.page_size, start=page * self.page_size + 1) or []
+        except Exception as e:
+            print(f"Search failed: {e}")
+            results = []
+        with self._lock:
+            self._in_flight.pop(key, None)
+            # Failed searches come back empty; don't pin that for the whole TTL
+            if results:
+                self._cache[key] = (results, time.time())
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        future.set_result(results)
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+
+def get_search_service():
+    """Return the process-wide SearchService, creating it on first use"""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = SearchService()
+        return _shared_service
@@ -0,0 +1,175 @@
+import os
+import io
+import shutil
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow ships with Streamlit; without it originals are stored as-is
+    Image = None
+
+DEFAULT_THUMBNAIL_ROOT = str(Path.home() / ".cache" / "youtube_downloader" / "thumbnails")
+
+# Widths app.py displays thumbnails at
+THUMBNAIL_WIDTHS = (100, 200)
+
+
+def thumbnail_url_for(entry):
+    """Best thumbnail URL for a yt-dlp info dict or flat search entry"""
+    url = entry.get('thumbnail')
+    thumbnails = entry.get('thumbnails')
+    if not url and isinstance(thumbnails, list) and thumbnails:
+        # Use the last thumbnail (usually the largest)
+        url = thumbnails[-1].get('url') if isinstance(thumbnails[-1], dict) else thumbnails[-1]
+    if not url and entry.get('id'):
+        url = f"https://i.ytimg.com/vi/{entry['id']}/hqdefault.jpg"
+    if url and url.startswith("//"):
+        url = "https:" + url
+    return url
+
+
+def fetch_url(url, timeout=10):
+    request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+class ThumbnailCache:
+    """Downloads each video's thumbnail once and keeps resized JPEG variants on disk.
+
+    Variants live at ``root/<video id>/<width>.jpg``. The cache is capped at
+    ``max_bytes``; whole videos are evicted least recently used first.
+    """
+
+    def __init__(self, root=DEFAULT_THUMBNAIL_ROOT, max_bytes=200 * 1024 ** 2, widths=THUMBNAIL_WIDTHS,
+                 fetch=fetch_url, max_workers=4):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.widths = tuple(widths)
+        self.fetch = fetch
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumbnail')
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0, 'evictions': 0}
+
+    def get(self, video_id, url, width):
+        """Return a local path for the thumbnail at width, or None if it cannot be fetched"""
+        if not video_id or not url or os.path.basename(video_id) != video_id or video_id.startswith('.'):
+            return None
+        width = self._nearest_width(width)
+        path = self._variant_path(video_id, width)
+        if os.path.exists(path):
+            self._touch(video_id)
+            with self._lock:
+                self.stats['hits'] += 1
+            return path
+        with self._key_lock(video_id):
+            # Another thread may have stored it while we waited
+            if not os.path.exists(path):
+                with self._lock:
+                    self.stats['misses'] += 1
+                if not self._store(video_id, url):
+                    return None
+                self.evict()
+        return path if os.path.exists(path) else None
+
+    def get_many(self, items, width):
+        """Resolve [(video_id, url), ...] in parallel; returns local paths or None per item"""
+        return list(self._executor.map(lambda item: self.get(item[0], item[1], width), items))
+
+    def evict(self):
+        """Drop least recently used videos until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for video_dir in os.scandir(self.root):
+            if not video_dir.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(video_dir.path) if f.is_file())
+            entries.append((video_dir.stat().st_mtime, size, video_dir.path))
+            total += size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.stats['evictions'] += 1
+        return total
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _store(self, video_id, url):
+        """Fetch the original once and write every width variant"""
+        try:
+            data = self.fetch(url)
+        except Exception as e:
+            print(f"Error fetching thumbnail for {video_id}: {str(e)}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return False
+        video_dir = os.path.join(self.root, video_id)
+        os.makedirs(video_dir, exist_ok=True)
+        for width in self.widths:
+            target = self._variant_path(video_id, width)
+            tmp = f"{target}.part"
+            with open(tmp, 'wb') as f:
+                f.write(self._resize(data, width))
+            os.replace(tmp, target)
+        return True
+
+    def _resize(self, data, width):
+        if Image is None:
+            return data
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image = image.convert('RGB')
+                if image.width > width:
+                    height = max(1, round(image.height * width / image.width))
+                    image = image.resize((width, height), Image.LANCZOS)
+                out = io.BytesIO()
+                image.save(out, 'JPEG', quality=85, optimize=True)
+                return out.getvalue()
+        except Exception as e:
+            print(f"Error resizing thumbnail: {str(e)}")
+            return data
+
+    def _nearest_width(self, width):
+        """Smallest stored width that is at least width, so images are never upscaled"""
+        larger = [w for w in self.widths if w >= width]
+        return min(larger) if larger else max(self.widths)
+
+    def _variant_path(self, video_id, width):
+        return os.path.join(self.root, video_id, f"{width}.jpg")
+
+    def _touch(self, video_id):
+        try:
+            os.utime(os.path.join(self.root, video_id))
+        except OSError:
+            pass
+
+    def _key_lock(self, video_id):
+        with self._lock:
+            if video_id not in self._key_locks:
+                self._key_locks[video_id] = threading.Lock()
+            return self._key_locks[video_id]
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Return the process-wide ThumbnailCache, capped by YTD_THUMBNAIL_MAX_MB (default 200)"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            max_mb = float(os.environ.get('YTD_THUMBNAIL_MAX_MB', 200))
+            _shared_cache = ThumbnailCache(max_bytes=int(max_mb * 1024 ** 2))
+        return _shared_cache
@@ -1,6 +1,17 @@
 import re
+from functools import lru_cache
 from urllib.parse import urlparse, parse_qs
 
+# Every accepted video URL form in one anchored pattern; group 1 is the video ID.
+# watch URLs try ?v= first, then a v= anywhere later in the query.
+YOUTUBE_VIDEO_URL = re.compile(
+    r'^https?://(?:'
+    r'(?:www\.|m\.|music\.)?youtube\.com/watch\?(?:v=|.*v=)'  # Standard, mobile and Music watch URLs
+    r'|(?:www\.)?youtube\.com/shorts/'  # YouTube Shorts URLs
+    r'|youtu\.be/'  # Shortened YouTube URLs
+    r')([a-zA-Z0-9_-]{11})'
+)
+
 def validate_youtube_url(url):
     """
     Validate if the provided URL is a valid YouTube video or shorts URL
@@ -15,44 +26,34 @@ def validate_youtube_url(url):
     if not url:
         return {'valid': False, 'error': 'URL cannot be empty'}
     
-    # Remove whitespace
-    url = url.strip()
+    # Results are memoised; hand out copies so callers can't alter the cache
+    return dict(_validate_stripped(url.strip()))
+
+def validate_many(urls):
+    """
+    Validate a list of URLs
     
-    # YouTube URL patterns
-    youtube_patterns = [
-        # Standard YouTube video URLs
-        r'^https?://(www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]{11})',
-        r'^https?://(www\.)?youtube\.com/watch\?.*v=([a-zA-Z0-9_-]{11})',
-        
-        # YouTube Shorts URLs
-        r'^https?://(www\.)?youtube\.com/shorts/([a-zA-Z0-9_-]{11})',
-        
-        # Shortened YouTube URLs
-        r'^https?://youtu\.be/([a-zA-Z0-9_-]{11})',
-        
-        # Mobile YouTube URLs
-        r'^https?://m\.youtube\.com/watch\?v=([a-zA-Z0-9_-]{11})',
-        r'^https?://m\.youtube\.com/watch\?.*v=([a-zA-Z0-9_-]{11})',
-        
-        # YouTube Music URLs
-        r'^https?://music\.youtube\.com/watch\?v=([a-zA-Z0-9_-]{11})',
-        r'^https?://music\.youtube\.com/watch\?.*v=([a-zA-Z0-9_-]{11})',
-    ]
-    
-    # Check against each pattern
-    for pattern in youtube_patterns:
-        match = re.search(pattern, url)
-        if match:
-            video_id = match.group(2)
-            
-            # Additional validation for video ID
-            if len(video_id) == 11 and re.match(r'^[a-zA-Z0-9_-]{11}$', video_id):
-                return {
-                    'valid': True,
-                    'error': None,
-                    'video_id': video_id,
-                    'url_type': get_url_type(url)
-                }
+    Args:
+        urls (iterable): URLs to validate
+    
+    Returns:
+        list: One validate_youtube_url result per URL, in order
+    """
+    
+    return [validate_youtube_url(url) for url in urls]
+
+@lru_cache(maxsize=4096)
+def _validate_stripped(url):
+    """validate_youtube_url for a non-empty, stripped URL"""
+    
+    match = YOUTUBE_VIDEO_URL.match(url)
+    if match:
+        return {
+            'valid': True,
+            'error': None,
+            'video_id': match.group(1),
+            'url_type': get_url_type(url)
+        }
     
     # If no pattern matches, provide detailed error
     parsed_url = urlparse(url)
@@ -115,11 +116,10 @@ def extract_video_id(url):
         str: The video ID or None if not found
     """
     
-    validation_result = validate_youtube_url(url)
-    if validation_result['valid']:
-        return validation_result['video_id']
-    
-    return None
+    if not url:
+        return None
+    match = YOUTUBE_VIDEO_URL.match(url.strip())
+    return match.group(1) if match else None
 
 def is_youtube_shorts(url):
     """
@@ -163,3 +163,21 @@ def normalize_youtube_url(url):
         return f"https://www.youtube.com/watch?v={video_id}"
     
     return url
+
+def normalize_many(urls):
+    """
+    Normalize a list of YouTube URLs
+    
+    Args:
+        urls (iterable): URLs to normalize
+    
+    Returns:
+        list: Normalized URLs, or the original URL where it is not a video URL
+    """
+    
+    match = YOUTUBE_VIDEO_URL.match
+    normalized = []
+    for url in urls:
+        found = match(url.strip()) if url else None
+        normalized.append(f"https://www.youtube.com/watch?v={found.group(1)}" if found else url)
+    return normalized
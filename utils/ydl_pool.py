@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-call callbacks and download-only settings; they play no part in extraction,
+# so pooled instances are built and keyed without them
+IGNORED_OPTIONS = frozenset((
+    'progress_hooks', 'postprocessor_hooks', 'post_hooks', 'logger',
+    'outtmpl', 'continuedl', 'postprocessors', 'concurrent_fragment_downloads', 'ratelimit', 'throttledratelimit',
+))
+
+
+def extraction_options(ydl_opts):
+    return {name: value for name, value in ydl_opts.items() if name not in IGNORED_OPTIONS}
+
+
+def options_key(ydl_opts):
+    """Hashable identity of the extraction-relevant part of a yt-dlp option dict"""
+    return tuple(sorted((name, repr(value)) for name, value in extraction_options(ydl_opts).items()))
+
+
+class _PooledSession:
+    __slots__ = ('ydl', 'key', 'created', 'last_used', 'uses')
+
+    def __init__(self, ydl, key):
+        self.ydl = ydl
+        self.key = key
+        self.created = self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class YoutubeDLPool:
+    """Reuses YoutubeDL instances between extraction calls.
+
+    An instance keeps its initialised extractors, cookie jar and open HTTPS
+    connections, so repeated info/search calls skip that setup. Instances are
+    pooled per option set and lent to one thread at a time. At most
+    ``max_size`` idle instances are kept; one idle for ``max_idle`` seconds,
+    used ``max_uses`` times or that raised something other than a yt-dlp
+    download error is closed instead of being reused.
+    """
+
+    def __init__(self, max_size=8, max_idle=300, max_uses=500, factory=None):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        # Defaults to yt_dlp.YoutubeDL, imported on first use
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._idle = []
+        self.stats = {'created': 0, 'reused': 0, 'retired': 0}
+
+    @contextmanager
+    def session(self, ydl_opts, **overrides):
+        """Borrow a YoutubeDL for extracting with ydl_opts.
+
+        Hooks and output options are dropped, so this is not for downloads; overrides
+        are params set for this call only, such as playlist_items.
+        """
+        import yt_dlp
+        key = options_key(ydl_opts)
+        pooled = self._acquire(key)
+        if pooled is None:
+            factory = self.factory or yt_dlp.YoutubeDL
+            pooled = _PooledSession(factory(extraction_options(ydl_opts)), key)
+            with self._lock:
+                self.stats['created'] += 1
+        saved = {name: pooled.ydl.params.get(name) for name in overrides}
+        pooled.ydl.params.update(overrides)
+        healthy = True
+        try:
+            yield pooled.ydl
+        except yt_dlp.utils.DownloadError:
+            # Unavailable videos, bad URLs etc.; the session itself is fine
+            raise
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            pooled.ydl.params.update(saved)
+            pooled.uses += 1
+            pooled.last_used = time.monotonic()
+            self._release(pooled, healthy)
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'idle': len(self._idle)}
+
+    def close(self):
+        """Close every idle instance"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._close(pooled)
+
+    def _acquire(self, key):
+        now = time.monotonic()
+        expired = []
+        found = None
+        with self._lock:
+            for pooled in list(self._idle):
+                if now - pooled.last_used > self.max_idle:
+                    self._idle.remove(pooled)
+                    expired.append(pooled)
+                elif found is None and pooled.key == key:
+                    self._idle.remove(pooled)
+                    found = pooled
+            if found is not None:
+                self.stats['reused'] += 1
+        for pooled in expired:
+            self._close(pooled)
+        return found
+
+    def _release(self, pooled, healthy):
+        evicted = None
+        with self._lock:
+            if healthy and pooled.uses < self.max_uses:
+                self._idle.append(pooled)
+                if len(self._idle) > self.max_size:
+                    # Least recently used first
+                    evicted = self._idle.pop(0)
+                pooled = evicted
+        if pooled is not None:
+            self._close(pooled)
+
+    def _close(self, pooled):
+        with self._lock:
+            self.stats['retired'] += 1
+        try:
+            pooled.ydl.close()
+        except Exception as e:
+            print(f"Error closing yt-dlp session: {str(e)}")
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_ydl_pool():
+    """Return the process-wide YoutubeDLPool, holding up to YTD_YDL_POOL_SIZE (default 8) idle sessions"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = YoutubeDLPool(max_size=int(os.environ.get('YTD_YDL_POOL_SIZE', 8)))
+        return _shared_pool